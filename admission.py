@@ -0,0 +1,266 @@
+from collections import OrderedDict, deque
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+from utils import decode_token
+import asyncio
+import math
+import re
+import time
+import os
+
+load_dotenv()
+
+
+def _parse_limits(value: str) -> dict:
+    limits = {}
+    for part in value.split(","):
+        if part.strip():
+            name, limit = part.split("=")
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+# In-flight requests allowed per route group; 0 means unlimited
+ADMISSION_GROUP_LIMITS = _parse_limits(os.getenv("ADMISSION_GROUP_LIMITS", "auth=8,bulk=2,write=32,read=64,default=64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))  # waiting requests per group
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY", "8"))
+ADMISSION_RATE_PER_SECOND = float(os.getenv("ADMISSION_RATE_PER_SECOND", "50"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "100"))
+ADMISSION_MAX_CLIENTS = 10000  # token buckets kept, least recently used dropped first
+
+# First match wins; None matches any method
+ROUTE_GROUPS = [
+    ("exempt", None, re.compile(r"^/metrics$")),
+    ("auth", {"POST"}, re.compile(r"^/api/(login|users/create)$")),
+    ("bulk", None, re.compile(r"^/api/recipes/(import|export)$")),
+    ("write", {"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"^/api/")),
+    ("read", {"GET", "HEAD"}, re.compile(r"^/api/")),
+]
+
+
+def route_group(method: str, path: str) -> str:
+    if method == "OPTIONS":
+        return "exempt"
+    for name, methods, pattern in ROUTE_GROUPS:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name
+    return "default"
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore with a bounded FIFO queue and a wait deadline.
+
+    Futures are created on whichever loop is running at acquire time, so
+    the limiter isn't tied to the loop it was built on.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> str:
+        """Returns "ok", "queue_full" or "timeout"."""
+        if self.limit <= 0 or (self.in_flight < self.limit and not self._waiters):
+            self.in_flight += 1
+            return "ok"
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return "ok"
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                return "timeout"
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next waiter; in_flight stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionController:
+    """Decides whether a request may run, and counts the ones it sheds.
+
+    All state is per worker process and in memory.
+    """
+
+    def __init__(self, group_limits=None, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                 user_concurrency: int = ADMISSION_USER_CONCURRENCY,
+                 rate: float = ADMISSION_RATE_PER_SECOND, burst: int = ADMISSION_BURST):
+        self.group_limits = dict(ADMISSION_GROUP_LIMITS if group_limits is None else group_limits)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_concurrency = user_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.reset()
+
+    def reset(self):
+        self.limiters = {}
+        self.buckets = OrderedDict()   # client key -> TokenBucket
+        self.user_in_flight = {}       # client key -> count
+        self.counters = {}             # group -> {admitted, rate_limited, user_limited, queue_full, timeout}
+
+    def _limiter(self, group: str) -> ConcurrencyLimiter:
+        if group not in self.limiters:
+            limit = self.group_limits.get(group, self.group_limits.get("default", 0))
+            self.limiters[group] = ConcurrencyLimiter(limit, self.max_queue)
+        return self.limiters[group]
+
+    def _count(self, group: str, outcome: str):
+        counters = self.counters.setdefault(
+            group, {"admitted": 0, "rate_limited": 0, "user_limited": 0, "queue_full": 0, "timeout": 0}
+        )
+        counters[outcome] += 1
+
+    def _bucket(self, client: str) -> TokenBucket:
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+            while len(self.buckets) > ADMISSION_MAX_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket
+
+    @staticmethod
+    def client_key(scope) -> str:
+        """The authenticated user id when the token is valid, else the client address."""
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                try:
+                    claims = decode_token(value[7:].decode())
+                except HTTPException:
+                    break
+                return f"user:{claims.get('uid', claims['sub'])}"
+        client = scope.get("client")
+        return f"addr:{client[0] if client else 'unknown'}"
+
+    async def admit(self, group: str, client: str):
+        """Reserve capacity for a request; returns a rejection response or None."""
+        if self.rate > 0:
+            retry_after = self._bucket(client).take()
+            if retry_after:
+                self._count(group, "rate_limited")
+                return _rejection(status.HTTP_429_TOO_MANY_REQUESTS, "Rate limit exceeded", retry_after)
+
+        if self.user_concurrency > 0 and self.user_in_flight.get(client, 0) >= self.user_concurrency:
+            self._count(group, "user_limited")
+            return _rejection(status.HTTP_429_TOO_MANY_REQUESTS, "Too many concurrent requests", 1)
+
+        self.user_in_flight[client] = self.user_in_flight.get(client, 0) + 1
+        try:
+            outcome = await self._limiter(group).acquire(self.queue_timeout)
+        except BaseException:
+            # Cancelled while queued (client gone, server shutting down)
+            self._release_user(client)
+            raise
+        if outcome != "ok":
+            self._release_user(client)
+            self._count(group, outcome)
+            return _rejection(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, retry shortly", 1)
+
+        self._count(group, "admitted")
+        return None
+
+    def _release_user(self, client: str):
+        remaining = self.user_in_flight.get(client, 1) - 1
+        if remaining:
+            self.user_in_flight[client] = remaining
+        else:
+            self.user_in_flight.pop(client, None)
+
+    def release(self, group: str, client: str):
+        self._limiter(group).release()
+        self._release_user(client)
+
+    def stats(self) -> dict:
+        return {
+            group: {
+                **self.counters.get(group, {}),
+                "limit": limiter.limit,
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued,
+            }
+            for group, limiter in self.limiters.items()
+        }
+
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to every HTTP request.
+
+    Capacity is held until the response body has been sent, so streamed
+    exports count against their group for as long as they run.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        group = route_group(scope["method"], scope["path"])
+        if group == "exempt":
+            return await self.app(scope, receive, send)
+
+        client = self.controller.client_key(scope)
+        rejection = await self.controller.admit(group, client)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(group, client)
@@ -0,0 +1,71 @@
+"""recipe search: search_vector column, GIN index, SQLite FTS table, backfill
+
+Revision ID: 3f9c2a1d7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+Databases created by create_all before full-text search existed have
+neither the column nor the index, and their recipes were never indexed.
+Every statement is idempotent, so it is also safe on databases that
+create_all already brought up to date.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a1d7b10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same documents as search.PG_REBUILD / search.rebuild_search_index, frozen
+# here so later changes to search.py don't rewrite this migration
+PG_BACKFILL = """
+    UPDATE recipes SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(cuisine, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(notes, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(description, ' ') FROM instructions WHERE recipe_id = recipes.id), ''
+        )), 'D')
+"""
+
+SQLITE_BACKFILL = """
+    INSERT INTO recipe_search(rowid, title, description, cuisine, notes, instructions)
+    SELECT id, title, coalesce(description, ''), coalesce(cuisine, ''), coalesce(notes, ''),
+        coalesce((SELECT group_concat(description, ' ') FROM instructions WHERE recipe_id = recipes.id), '')
+    FROM recipes
+"""
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_recipes_search_vector ON recipes USING gin (search_vector)")
+        op.execute(PG_BACKFILL)
+        return
+
+    # SQLite: the column exists only for model parity; search uses FTS5
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("recipes")}
+    if "search_vector" not in columns:
+        op.add_column("recipes", sa.Column("search_vector", sa.Text(), nullable=True))
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_search "
+        "USING fts5(title, description, cuisine, notes, instructions)"
+    )
+    op.execute("DELETE FROM recipe_search")
+    op.execute(SQLITE_BACKFILL)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_recipes_search_vector")
+        op.execute("ALTER TABLE recipes DROP COLUMN IF EXISTS search_vector")
+        return
+    op.execute("DROP TABLE IF EXISTS recipe_search")
+    with op.batch_alter_table("recipes") as batch:
+        batch.drop_column("search_vector")
@@ -0,0 +1,36 @@
+"""recipe_images: stored images shown by each recipe
+
+Revision ID: 5d1a7c3e8f42
+Revises: 8b2e4d6a9c31
+Create Date: 2026-10-18 14:00:00.000000
+
+Finished image variants look up the recipes to refresh here. Recipes saved
+before this table existed are not backfilled; `python image_variants.py`
+finds them by scanning their image URLs.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1a7c3e8f42'
+down_revision: Union[str, None] = '8b2e4d6a9c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("recipe_images"):
+        op.create_table(
+            "recipe_images",
+            sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("sha256", sa.String(64), primary_key=True),
+        )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_recipe_images_sha256 ON recipe_images (sha256)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_recipe_images_sha256")
+    op.drop_table("recipe_images")
@@ -0,0 +1,43 @@
+"""recipe facet indexes and the per-user listing index
+
+Revision ID: 8b2e4d6a9c31
+Revises: 3f9c2a1d7b10
+Create Date: 2026-10-18 10:30:00.000000
+
+The facet filters and counts, and the keyset listing of a user's recipes,
+rely on these indexes; create_all only adds them to new databases. Names
+match the ones SQLAlchemy generates for the models.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6a9c31'
+down_revision: Union[str, None] = '3f9c2a1d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_recipes_cooking_time": ("recipes", "cooking_time"),
+    "ix_recipes_total_time": ("recipes", "total_time"),
+    "ix_recipes_difficulty": ("recipes", "difficulty"),
+    "ix_recipes_category": ("recipes", "category"),
+    "ix_recipes_cuisine": ("recipes", "cuisine"),
+    "ix_recipes_calories_per_serving": ("recipes", "calories_per_serving"),
+    "ix_recipes_is_featured": ("recipes", "is_featured"),
+    "ix_recipes_dietary_info": ("recipes", "dietary_info"),
+    "ix_recipes_user_id_id": ("recipes", "user_id, id"),
+    "ix_instructions_recipe_id": ("instructions", "recipe_id"),
+}
+
+
+def upgrade() -> None:
+    for name, (table, columns) in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,335 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import asyncio
+import json
+import math
+import random
+import time
+
+import httpx
+
+# Relative weights of each operation in the default mix
+DEFAULT_MIX = {
+    "list_recipes": 30,
+    "list_summaries": 15,
+    "get_recipe": 25,
+    "search": 8,
+    "facets": 4,
+    "favorites": 5,
+    "toggle_favorite": 5,
+    "create_recipe": 3,
+    "patch_recipe": 3,
+    "login": 2,
+}
+SEARCH_TERMS = ["chicken", "curry", "spicy soup", "pasta", "salad", "garlic", "quick bake", "salmon"]
+PERCENTILES = (50, 95, 99)
+
+
+class BenchConfig(NamedTuple):
+    concurrency: int = 8
+    duration: Optional[float] = 10.0     # seconds; ignored when requests is set
+    requests: Optional[int] = None       # total operations across all virtual users
+    warmup: float = 0.0                  # seconds of traffic left out of the results
+    users: int = 100                     # generated users to log in as (user1..userN)
+    recipes: int = 1000                  # recipe ids to read, 1..N
+    ingredients: int = 100               # ingredient ids used by created recipes
+    email_pattern: str = "user{n}@example.com"
+    password: str = "password123"
+    seed: int = 42
+    mix: Dict[str, int] = DEFAULT_MIX
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latencies and status codes per route, outside the warmup window."""
+
+    def __init__(self, warmup_until: float = 0.0):
+        self.warmup_until = warmup_until
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.started = None
+        self.finished = None
+
+    def record(self, route: str, started: float, elapsed: float, status: int, expected: Iterable[int] = ()):
+        """`expected` lists statuses of 400 and up that are not errors for this call."""
+        if started < self.warmup_until:
+            return
+        if self.started is None or started < self.started:
+            self.started = started
+        self.finished = max(self.finished or 0.0, started + elapsed)
+        self.latencies[route].append(elapsed)
+        self.statuses[route][status] += 1
+        if status >= 400 and status not in expected:
+            self.errors[route] += 1
+
+    def report(self) -> dict:
+        duration = (self.finished - self.started) if self.started is not None else 0.0
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples.sort()
+            statuses = self.statuses[route]
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors[route],
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "throughput_rps": len(samples) / duration if duration else 0.0,
+                "mean_ms": 1000 * sum(samples) / len(samples),
+                **{f"p{pct}_ms": 1000 * percentile(samples, pct) for pct in PERCENTILES},
+                "max_ms": 1000 * samples[-1],
+            }
+        total = sum(route["count"] for route in routes.values())
+        return {
+            "duration_s": duration,
+            "requests": total,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "throughput_rps": total / duration if duration else 0.0,
+            "routes": routes,
+        }
+
+
+class VirtualUser:
+    """One logged-in client replaying the operation mix."""
+
+    def __init__(self, client: httpx.AsyncClient, config: BenchConfig, recorder: Recorder, index: int):
+        self.client = client
+        self.config = config
+        self.recorder = recorder
+        self.rng = random.Random(f"{config.seed}:{index}")
+        self.email = config.email_pattern.format(n=index % max(1, config.users) + 1)
+        # Virtual users that share an account favorite disjoint recipe ids,
+        # so one never gets a 400 for a favorite another just added
+        self.sharers = -(-config.concurrency // max(1, config.users))
+        self.slot = index // max(1, config.users)
+        self.headers = {}
+        self.own_recipes = []
+        self.favorites = set()
+
+    async def request(self, route: str, method: str, url: str, expected: Iterable[int] = (), **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        self.recorder.record(route, started, time.perf_counter() - started, response.status_code, expected)
+        return response
+
+    def recipe_id(self) -> int:
+        return self.rng.randint(1, max(1, self.config.recipes))
+
+    async def login(self):
+        response = await self.request(
+            "POST /api/login", "POST", "/api/login",
+            data={"username": self.email, "password": self.config.password},
+        )
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list_recipes(self):
+        await self.request("GET /api/recipes/", "GET", "/api/recipes/", params={"limit": 20})
+
+    async def list_summaries(self):
+        await self.request("GET /api/recipes/?view=summary", "GET", "/api/recipes/", params={"limit": 50, "view": "summary"})
+
+    async def get_recipe(self):
+        await self.request("GET /api/recipes/{id}", "GET", f"/api/recipes/{self.recipe_id()}")
+
+    async def search(self):
+        await self.request("GET /api/recipes/search", "GET", "/api/recipes/search", params={"q": self.rng.choice(SEARCH_TERMS)})
+
+    async def facets(self):
+        await self.request("GET /api/recipes/facets", "GET", "/api/recipes/facets")
+
+    async def favorites(self):
+        await self.request("GET /api/favorites/", "GET", "/api/favorites/", params={"limit": 20})
+
+    async def toggle_favorite(self):
+        candidates = range(self.slot + 1, max(1, self.config.recipes) + 1, self.sharers)
+        recipe_id = self.rng.choice(candidates) if candidates else self.recipe_id()
+        if recipe_id not in self.favorites and self.favorites and self.rng.random() < 0.5:
+            recipe_id = next(iter(self.favorites))
+        if recipe_id in self.favorites:
+            self.favorites.discard(recipe_id)
+            await self.request("DELETE /api/favorites/{id}", "DELETE", f"/api/favorites/{recipe_id}")
+            return
+        # 400 means the recipe was already a favorite, e.g. one seeded by
+        # datagen; it is unfavorited on a later toggle like any other
+        response = await self.request("POST /api/favorites/{id}", "POST", f"/api/favorites/{recipe_id}", expected={400})
+        if response.status_code in (201, 400):
+            self.favorites.add(recipe_id)
+
+    def recipe_body(self) -> dict:
+        ingredient_ids = self.rng.sample(range(1, self.config.ingredients + 1), min(5, self.config.ingredients))
+        return {
+            "title": f"Benchmark recipe {self.rng.randint(1, 10 ** 9)}",
+            "description": "Written by bench.py",
+            "cooking_time": self.rng.randint(5, 120),
+            "servings": self.rng.choice([2, 4, 6]),
+            "ingredients": [{"ingredient_id": ingredient_id, "quantity": 1} for ingredient_id in ingredient_ids],
+            "instructions": [{"step_number": step, "description": f"Step {step}"} for step in (1, 2, 3)],
+        }
+
+    async def create_recipe(self):
+        response = await self.request("POST /api/recipes/create", "POST", "/api/recipes/create", json=self.recipe_body())
+        if response.status_code == 201:
+            self.own_recipes.append(response.json()["id"])
+
+    async def patch_recipe(self):
+        if not self.own_recipes:
+            return await self.create_recipe()
+        recipe_id = self.rng.choice(self.own_recipes)
+        await self.request(
+            "PATCH /api/recipes/{id}", "PATCH", f"/api/recipes/{recipe_id}",
+            json={"cooking_time": self.rng.randint(5, 120)},
+        )
+
+    async def run(self, operations: List[str], weights: List[int], deadline: Optional[float], budget):
+        await self.login()
+        while (deadline is None or time.perf_counter() < deadline) and budget.take():
+            await getattr(self, self.rng.choices(operations, weights=weights)[0])()
+
+
+class _Budget:
+    """Shared count of operations left; None means unlimited."""
+
+    def __init__(self, remaining: Optional[int]):
+        self.remaining = remaining
+
+    def take(self) -> bool:
+        if self.remaining is None:
+            return True
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+async def run_benchmark(client: httpx.AsyncClient, config: BenchConfig) -> dict:
+    unknown = set(config.mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    operations = [name for name, weight in config.mix.items() if weight > 0]
+    weights = [config.mix[name] for name in operations]
+
+    started = time.perf_counter()
+    recorder = Recorder(warmup_until=started + config.warmup)
+    deadline = None if config.requests is not None else started + config.warmup + config.duration
+    budget = _Budget(config.requests)
+    await asyncio.gather(*(
+        VirtualUser(client, config, recorder, index).run(operations, weights, deadline, budget)
+        for index in range(config.concurrency)
+    ))
+    report = recorder.report()
+    report["config"] = {**config._asdict(), "mix": dict(config.mix)}
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.10, metric: str = "p95_ms") -> List[str]:
+    """Regressions of `report` against `baseline`, as readable lines.
+
+    A route regresses when `metric` grew by more than `threshold` (0.10 is
+    10%). Overall throughput regresses when it fell by more than that.
+    Routes missing from either side are ignored.
+    """
+    regressions = []
+    for route, current in report["routes"].items():
+        previous = baseline["routes"].get(route)
+        if previous is None or not previous.get(metric):
+            continue
+        change = current[metric] / previous[metric] - 1
+        if change > threshold:
+            regressions.append(
+                f"{route}: {metric} {previous[metric]:.1f} -> {current[metric]:.1f} ({change:+.0%})"
+            )
+    if baseline.get("throughput_rps"):
+        change = report["throughput_rps"] / baseline["throughput_rps"] - 1
+        if change < -threshold:
+            regressions.append(
+                f"throughput: {baseline['throughput_rps']:.1f} -> {report['throughput_rps']:.1f} req/s ({change:+.0%})"
+            )
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'route':40} {'count':>7} {'errors':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for route, stats in report["routes"].items():
+        lines.append(
+            f"{route:40} {stats['count']:>7} {stats['errors']:>6} {stats['throughput_rps']:>8.1f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+        )
+    lines.append(
+        f"total: {report['requests']} requests, {report['errors']} errors, "
+        f"{report['throughput_rps']:.1f} req/s over {report['duration_s']:.1f}s (latencies in ms)"
+    )
+    return "\n".join(lines)
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        if part.strip():
+            name, weight = part.split("=")
+            mix[name.strip()] = int(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Replay a mix of API operations and report latency percentiles per route. "
+                    "Expects a dataset from `python seeder.py --users N --recipes N`."
+    )
+    parser.add_argument("--url", help="Benchmark a running server; default runs main.app in-process")
+    parser.add_argument("--concurrency", type=int, default=8, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of measured traffic")
+    parser.add_argument("--requests", type=int, help="Stop after this many operations instead")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of traffic left out of the results")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--ingredients", type=int, default=100)
+    parser.add_argument("--email-pattern", default="user{n}@example.com")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="Operation weights, e.g. get_recipe=50,list_recipes=30,login=1")
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against; exits 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--metric", default="p95_ms", choices=[f"p{pct}_ms" for pct in PERCENTILES] + ["mean_ms"])
+    args = parser.parse_args()
+
+    config = BenchConfig(
+        concurrency=args.concurrency, duration=args.duration, requests=args.requests, warmup=args.warmup,
+        users=args.users, recipes=args.recipes, ingredients=args.ingredients,
+        email_pattern=args.email_pattern, password=args.password, seed=args.seed, mix=args.mix,
+    )
+
+    async def main():
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        else:
+            from main import app
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+        async with client:
+            return await run_benchmark(client, config)
+
+    report = asyncio.run(main())
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as source:
+            regressions = compare(report, json.load(source), args.threshold, args.metric)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} ({args.metric})")
@@ -0,0 +1,155 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from asyncpg import PostgresError
+from models import Recipe, RecipeIngredient, RecipeImage, Instruction
+from recipe_writes import image_urls, recipe_image_rows, recipe_row, resolve_ingredients
+from search import refresh_search_documents
+from pantry import pantry_index
+import schema as schema
+import json
+
+IMPORT_BATCH_SIZE = 500
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class LineError(Exception):
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+
+async def ndjson_lines(chunks, max_line_bytes: int = MAX_LINE_BYTES):
+    """Yield (line_number, line) from a stream of byte chunks.
+
+    Only the current line is buffered, so request size doesn't bound memory.
+    A line longer than `max_line_bytes` is yielded as None and skipped.
+    """
+    buffer = b""
+    line_number = 0
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, None if oversized else line
+            oversized = False
+        if len(buffer) > max_line_bytes:
+            oversized = True
+            buffer = b""
+    if buffer or oversized:
+        yield line_number + 1, None if oversized else buffer
+
+
+def parse_line(line: bytes) -> schema.RecipeCreate:
+    if line is None:
+        raise LineError({"msg": f"Line is longer than {MAX_LINE_BYTES} bytes"})
+    try:
+        recipe = schema.RecipeCreate.model_validate_json(line)
+    except ValidationError as e:
+        raise LineError(*json.loads(e.json(include_url=False)))
+    return recipe
+
+
+async def _insert_rows(db: AsyncSession, model, rows):
+    """Insert child rows: COPY on Postgres, executemany elsewhere."""
+    if not rows:
+        return
+    if db.bind.dialect.name == "postgresql":
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        columns = list(rows[0])
+        await raw.driver_connection.copy_records_to_table(
+            model.__tablename__,
+            records=[tuple(row[column] for column in columns) for row in rows],
+            columns=columns,
+        )
+        return
+    await db.execute(insert(model.__table__), rows)
+
+
+async def _write_batch(db: AsyncSession, batch, user_id: int, report: dict, create_missing_ingredients: bool):
+    """Insert one batch of parsed lines and commit it.
+
+    Lines referencing unknown ingredients, or one ingredient twice, are
+    reported and left out; if the batch still fails in the database every
+    line in it is reported and the import carries on with the next batch.
+    """
+    resolved = await resolve_ingredients(
+        db, [i for _, recipe in batch for i in recipe.ingredients], create_missing_ingredients
+    )
+
+    rows = []
+    for line_number, recipe in batch:
+        missing = resolved.missing(recipe.ingredients)
+        if missing:
+            report["errors"].append({"line": line_number, "errors": [{"msg": f"Ingredients not found: {', '.join(missing)}"}]})
+            continue
+        duplicates = resolved.duplicates(recipe.ingredients)
+        if duplicates:
+            report["errors"].append({"line": line_number, "errors": [{"msg": f"Ingredients listed more than once: {', '.join(duplicates)}"}]})
+            continue
+        rows.append((line_number, recipe))
+    if not rows:
+        return
+
+    try:
+        recipe_rows = [recipe_row(recipe, user_id) for _, recipe in rows]
+        recipe_ids = (await db.scalars(
+            insert(Recipe.__table__).returning(Recipe.__table__.c.id, sort_by_parameter_order=True),
+            recipe_rows
+        )).all()
+        await _insert_rows(db, RecipeIngredient, [
+            {"recipe_id": recipe_id, "ingredient_id": resolved.id_for(i), "quantity": i.quantity, "notes": i.notes}
+            for recipe_id, (_, recipe) in zip(recipe_ids, rows) for i in recipe.ingredients
+        ])
+        await _insert_rows(db, Instruction, [
+            {"recipe_id": recipe_id, "step_number": i.step_number, "description": i.description}
+            for recipe_id, (_, recipe) in zip(recipe_ids, rows) for i in recipe.instructions
+        ])
+        await _insert_rows(db, RecipeImage, [
+            image for recipe_id, row in zip(recipe_ids, recipe_rows) for image in recipe_image_rows(recipe_id, image_urls(row))
+        ])
+        await db.run_sync(refresh_search_documents, recipe_ids)
+        await db.commit()
+    except (SQLAlchemyError, PostgresError) as e:
+        # COPY goes through the asyncpg connection directly, so its errors
+        # arrive unwrapped
+        await db.rollback()
+        error = {"msg": "Database error while importing batch", "error": str(e)}
+        report["errors"].extend({"line": line_number, "errors": [error]} for line_number, _ in rows)
+        return
+
+    for recipe_id, (_, recipe) in zip(recipe_ids, rows):
+        pantry_index.set_recipe(recipe_id, resolved.ids_for(recipe.ingredients))
+    report["imported"] += len(recipe_ids)
+
+
+async def import_recipes(db: AsyncSession, chunks, user_id: int, batch_size: int = IMPORT_BATCH_SIZE,
+                         create_missing_ingredients: bool = False) -> dict:
+    """Import NDJSON recipes (one schema.RecipeCreate per line) for `user_id`.
+
+    Valid lines are written `batch_size` at a time, each batch in its own
+    transaction. Invalid lines are reported by line number and skipped.
+    """
+    report = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+    async for line_number, line in ndjson_lines(chunks):
+        if line is not None and not line.strip():
+            continue
+        try:
+            recipe = parse_line(line)
+        except LineError as e:
+            report["errors"].append({"line": line_number, "errors": e.errors})
+            continue
+        batch.append((line_number, recipe))
+        if len(batch) >= batch_size:
+            await _write_batch(db, batch, user_id, report, create_missing_ingredients)
+            batch = []
+    if batch:
+        await _write_batch(db, batch, user_id, report, create_missing_ingredients)
+
+    report["errors"].sort(key=lambda error: error["line"])
+    report["failed"] = len(report["errors"])
+    return report
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+import threading
+import time
+import os
+
+load_dotenv()
+
+# Cache settings
+RECIPE_CACHE_BACKEND = os.getenv("RECIPE_CACHE_BACKEND", "memory")  # memory, redis or none
+RECIPE_CACHE_TTL_SECONDS = int(os.getenv("RECIPE_CACHE_TTL_SECONDS", "60"))
+RECIPE_CACHE_MAX_BYTES = int(os.getenv("RECIPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class CacheBackend:
+    """Byte store behind RecipeCache. Implementations must be thread safe."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullBackend(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class InMemoryBackend(CacheBackend):
+    """Per-process LRU with TTL expiry and a cap on the total stored bytes."""
+
+    def __init__(self, max_bytes: int = RECIPE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class RedisBackend(CacheBackend):
+    """Shared cache for all workers.
+
+    Takes any client with redis-py's get/set/delete/scan_iter methods, so
+    tests can pass an in-memory fake. Size eviction is left to Redis'
+    own maxmemory policy.
+    """
+
+    def __init__(self, client, prefix: str = "recipe-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str = REDIS_URL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RECIPE_CACHE_BACKEND=redis requires the 'redis' package")
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class CachedRecipe(NamedTuple):
+    etag: str
+    last_modified: str
+    body: bytes
+
+
+class RecipeCache:
+    """Serialized RecipeResponse bodies keyed by recipe id.
+
+    Entries carry the ETag and Last-Modified they were rendered with so
+    hits can answer conditional requests without touching the database.
+    Writes that change a recipe's payload must call `invalidate`.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int = RECIPE_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(recipe_id: int) -> str:
+        return f"recipe:{recipe_id}"
+
+    def get(self, recipe_id: int) -> Optional[CachedRecipe]:
+        value = self.backend.get(self._key(recipe_id))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, last_modified, body = value.split(b"\n", 2)
+        return CachedRecipe(etag.decode(), last_modified.decode(), body)
+
+    def set(self, recipe_id: int, etag: str, last_modified: str, body: bytes):
+        value = b"\n".join([etag.encode(), last_modified.encode(), body])
+        self.backend.set(self._key(recipe_id), value, self.ttl)
+
+    def invalidate(self, *recipe_ids: int):
+        self.backend.delete(*(self._key(recipe_id) for recipe_id in recipe_ids))
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+        if isinstance(self.backend, InMemoryBackend):
+            stats["entries"] = len(self.backend._entries)
+            stats["bytes"] = self.backend.size
+            stats["max_bytes"] = self.backend.max_bytes
+        return stats
+
+
+def create_backend(name: str = RECIPE_CACHE_BACKEND) -> CacheBackend:
+    if name == "redis":
+        return RedisBackend.from_url()
+    if name == "none":
+        return NullBackend()
+    return InMemoryBackend()
+
+
+recipe_cache = RecipeCache(create_backend())
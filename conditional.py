@@ -0,0 +1,122 @@
+from fastapi import Request, Response, status
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from cache import CachedRecipe
+from loaders import load_recipes, recipe_response_options, recipe_summaries, recipe_version, recipe_versions
+from pagination import NEXT_CURSOR_HEADER, paginate, trim_page
+import hashlib
+
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive timestamps; they are stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return any(header in request.headers for header in CONDITIONAL_HEADERS)
+
+
+def validators(versions, *extra):
+    """Build a strong ETag and Last-Modified from recipe version tuples.
+
+    Listings pass their query string and next-page cursor as `extra` parts
+    so different pages never share an ETag.
+    """
+    digest = hashlib.sha256()
+    for version in versions:
+        digest.update(repr(tuple(version)).encode())
+    for part in extra:
+        digest.update(repr(part).encode())
+    etag = f'"{digest.hexdigest()[:32]}"'
+
+    timestamps = [version[1] for version in versions if version[1] is not None]
+    last_modified = _as_utc(max(timestamps)) if timestamps else None
+    return etag, last_modified
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence and uses weak comparison
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def http_date(value: Optional[datetime]) -> str:
+    return format_datetime(value, usegmt=True) if value is not None else ""
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime], headers=None) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(headers or {}))
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def cached_recipe_response(request: Request, cached: CachedRecipe) -> Response:
+    """Answer from a cached serialized recipe, or 304 if the client has it."""
+    last_modified = parsedate_to_datetime(cached.last_modified) if cached.last_modified else None
+    if is_not_modified(request, cached.etag, last_modified):
+        return not_modified_response(cached.etag, last_modified)
+    response = Response(content=cached.body, media_type="application/json")
+    set_validators(response, cached.etag, last_modified)
+    return response
+
+
+async def conditional_recipe_page(request: Request, response: Response, db: AsyncSession, stmt, key_column,
+                                  cursor: Optional[str] = None, skip: int = 0, limit: Optional[int] = None,
+                                  view: str = "full"):
+    """Paginate a Recipe select, answering 304 when the client's copy is current.
+
+    With conditional headers only the id/updated_at/author columns of the
+    page are read first, and relationships are loaded only on a mismatch.
+    Without them the page is loaded in full and the validators are derived
+    from it, so unconditional requests pay no extra query. The summary view
+    selects its handful of columns directly and never loads relationships.
+    """
+    page = dict(cursor=cursor, skip=skip, limit=limit)
+
+    if view == "summary":
+        result = await db.execute(paginate(recipe_summaries(stmt), key_column, **page))
+        summaries = trim_page(result, response, limit)
+        etag, last_modified = validators(summaries, request.url.query, response.headers.get(NEXT_CURSOR_HEADER))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified, response.headers)
+        set_validators(response, etag, last_modified)
+        return summaries
+
+    if has_conditional_headers(request):
+        result = await db.execute(paginate(recipe_versions(stmt), key_column, **page))
+        versions = trim_page(result, response, limit)
+        etag, last_modified = validators(versions, request.url.query, response.headers.get(NEXT_CURSOR_HEADER))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified, response.headers)
+        recipes = await load_recipes(db, [version[0] for version in versions])
+    else:
+        result = await db.scalars(paginate(stmt.options(*recipe_response_options()), key_column, **page))
+        recipes = trim_page(result, response, limit)
+        versions = [recipe_version(recipe) for recipe in recipes]
+        etag, last_modified = validators(versions, request.url.query, response.headers.get(NEXT_CURSOR_HEADER))
+
+    set_validators(response, etag, last_modified)
+    return recipes
@@ -0,0 +1,297 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import NamedTuple
+from models import User, Ingredient, Recipe, RecipeIngredient, Instruction, Favorite, CategoryEnum
+from search import rebuild_search_index
+import csv
+import io
+import multiprocessing
+import random
+import time
+
+# Ids per task. Fixed so that the generated data depends only on the seed,
+# never on how many workers wrote it.
+CHUNK_SIZE = 10000
+GENERATE_BATCH_SIZE = 5000
+DEFAULT_INGREDIENTS = 500
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HISTORY_DAYS = 730
+
+CATEGORY_WEIGHTS = {
+    CategoryEnum.DINNER: 30, CategoryEnum.LUNCH: 20, CategoryEnum.BREAKFAST: 15, CategoryEnum.DESSERT: 15,
+    CategoryEnum.SNACK: 8, CategoryEnum.APPETIZER: 8, CategoryEnum.BEVERAGE: 4,
+}
+CUISINE_WEIGHTS = {
+    "Italian": 18, "American": 16, "Mexican": 12, "Chinese": 10, "Indian": 9, "Japanese": 8,
+    "French": 7, "Thai": 6, "Mediterranean": 6, "Korean": 4, "Greek": 4,
+}
+DIFFICULTY_WEIGHTS = {"easy": 50, "medium": 35, "hard": 15}
+DIETARY_WEIGHTS = {None: 55, "vegetarian": 20, "gluten-free": 10, "vegan": 8, "dairy-free": 7}
+SERVINGS_WEIGHTS = {1: 5, 2: 25, 4: 45, 6: 15, 8: 10}
+
+# Most common first: ingredient popularity follows the same power law as
+# everything else, so low ids are the staples
+BASE_INGREDIENTS = [
+    ("Salt", "grams"), ("Olive Oil", "ml"), ("Garlic", "cloves"), ("Onion", "pieces"), ("Butter", "grams"),
+    ("Black Pepper", "grams"), ("Eggs", "pieces"), ("Flour", "cups"), ("Sugar", "grams"), ("Milk", "ml"),
+    ("Tomatoes", "pieces"), ("Chicken Breast", "grams"), ("Rice", "cups"), ("Pasta", "grams"), ("Cheese", "grams"),
+    ("Lemon", "pieces"), ("Carrots", "pieces"), ("Potatoes", "pieces"), ("Ginger", "grams"), ("Soy Sauce", "ml"),
+    ("Beef", "grams"), ("Spinach", "grams"), ("Basil", "grams"), ("Cumin", "grams"), ("Honey", "ml"),
+    ("Mushrooms", "grams"), ("Bell Pepper", "pieces"), ("Cream", "ml"), ("Salmon", "grams"), ("Chickpeas", "grams"),
+]
+INGREDIENT_MODIFIERS = ["Fresh", "Dried", "Smoked", "Organic", "Roasted", "Ground", "Frozen", "Wild", "Pickled", "Toasted"]
+FIRST_NAMES = ["Alex", "Sam", "Maria", "Wei", "Priya", "John", "Aisha", "Luca", "Yuki", "Omar", "Elena", "Noah"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Patel", "Rossi", "Kim", "Novak", "Silva", "Dubois", "Okafor", "Berg", "Sato"]
+TITLE_ADJECTIVES = ["Classic", "Spicy", "Creamy", "Quick", "Rustic", "Smoky", "Crispy", "Hearty", "Zesty", "Easy"]
+DISHES = ["Curry", "Stew", "Salad", "Soup", "Tacos", "Risotto", "Stir Fry", "Casserole", "Pie", "Bowl", "Skillet", "Bake"]
+STEP_VERBS = ["Chop", "Mix", "Simmer", "Whisk", "Roast", "Fry", "Fold in", "Season", "Bake", "Stir in"]
+
+
+class GeneratorOptions(NamedTuple):
+    seed: int
+    users: int
+    recipes: int
+    ingredients: int
+    batch_size: int
+    password_hash: str
+    images: tuple = ()
+
+
+def power_law_index(rng: random.Random, n: int, alpha: float = 1.2) -> int:
+    """Index in [0, n) from a bounded Pareto distribution: 0 is the most likely."""
+    u = rng.random()
+    x = (1 - u * (1 - (n + 1) ** -alpha)) ** (-1 / alpha)
+    return min(int(x) - 1, n - 1)
+
+
+def scatter(index: int, n: int) -> int:
+    """Spread popular indexes over the id range, so the busiest users and
+    recipes aren't simply the first ones. 2654435761 is prime, so this is a
+    permutation of range(n) for any n it doesn't divide."""
+    return (index * 2654435761) % n
+
+
+def _weighted(rng: random.Random, weights: dict):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _timestamp(rng: random.Random, after: datetime = EPOCH) -> datetime:
+    remaining = max(1.0, (EPOCH + timedelta(days=HISTORY_DAYS) - after).total_seconds())
+    return after + timedelta(seconds=int(rng.random() * remaining))
+
+
+def _rng(options: GeneratorOptions, kind: str, start: int) -> random.Random:
+    return random.Random(f"{options.seed}:{kind}:{start}")
+
+
+def _copy_value(value):
+    return value.name if isinstance(value, CategoryEnum) else value
+
+
+def write_rows(conn, table, rows: list):
+    """Insert dict rows: COPY on Postgres, executemany elsewhere."""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # In CSV format an unquoted empty field is NULL
+            writer.writerow([_copy_value(row[column]) for column in columns])
+        buffer.seek(0)
+        with conn.connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return
+    conn.execute(insert(table), rows)
+
+
+def ingredient_rows(options: GeneratorOptions) -> list:
+    rows = []
+    names = iter(
+        [name for name, _ in BASE_INGREDIENTS]
+        + [f"{modifier} {name}" for modifier in INGREDIENT_MODIFIERS for name, _ in BASE_INGREDIENTS]
+    )
+    units = dict(BASE_INGREDIENTS)
+    for ingredient_id in range(1, options.ingredients + 1):
+        name = next(names, None) or f"Ingredient {ingredient_id}"
+        base = name.split(" ", 1)[-1] if name not in units else name
+        rows.append({"id": ingredient_id, "name": name, "unit": units.get(base, "grams")})
+    return rows
+
+
+def users_chunk(engine: Engine, options: GeneratorOptions, start: int, end: int) -> int:
+    rng = _rng(options, "users", start)
+    with engine.begin() as conn:
+        for batch_start in range(start, end, options.batch_size):
+            rows = []
+            for user_id in range(batch_start, min(batch_start + options.batch_size, end)):
+                rows.append({
+                    "id": user_id,
+                    "email": f"user{user_id}@example.com",
+                    "password": options.password_hash,
+                    "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "created_at": _timestamp(rng),
+                })
+            write_rows(conn, User.__table__, rows)
+    return end - start
+
+
+def recipes_chunk(engine: Engine, options: GeneratorOptions, start: int, end: int) -> int:
+    """Recipes [start, end) with their ingredients and instructions.
+
+    Owners follow a power law, so a few users write most recipes.
+    """
+    rng = _rng(options, "recipes", start)
+    with engine.begin() as conn:
+        for batch_start in range(start, end, options.batch_size):
+            recipes, recipe_ingredients, instructions = [], [], []
+            for recipe_id in range(batch_start, min(batch_start + options.batch_size, end)):
+                ingredient_ids = set()
+                wanted = min(options.ingredients, max(2, round(rng.gauss(8, 3))))
+                while len(ingredient_ids) < wanted:
+                    ingredient_ids.add(power_law_index(rng, options.ingredients) + 1)
+                cooking_time = int(min(480, max(5, rng.lognormvariate(3.2, 0.6))))
+                prep_time = int(min(240, rng.lognormvariate(2.5, 0.6)))
+                created_at = _timestamp(rng)
+                main = rng.choice(BASE_INGREDIENTS)[0]
+                recipes.append({
+                    "id": recipe_id,
+                    "title": f"{rng.choice(TITLE_ADJECTIVES)} {main} {rng.choice(DISHES)}",
+                    "description": f"A {rng.choice(['weeknight', 'weekend', 'family', 'party'])} favourite built around {main.lower()}.",
+                    "cooking_time": cooking_time,
+                    "prep_time": prep_time,
+                    "total_time": cooking_time + prep_time,
+                    "servings": _weighted(rng, SERVINGS_WEIGHTS),
+                    "difficulty": _weighted(rng, DIFFICULTY_WEIGHTS),
+                    "category": _weighted(rng, CATEGORY_WEIGHTS),
+                    "cuisine": _weighted(rng, CUISINE_WEIGHTS),
+                    "featured_image": rng.choice(options.images) if options.images and rng.random() < 0.7 else None,
+                    "calories_per_serving": int(min(1500, max(50, rng.gauss(450, 180)))),
+                    "is_featured": rng.random() < 0.02,
+                    "is_published": rng.random() < 0.95,
+                    "dietary_info": _weighted(rng, DIETARY_WEIGHTS),
+                    "notes": rng.choice(["Tastes better the next day.", "Season to taste.", "Freezes well."]) if rng.random() < 0.3 else None,
+                    "user_id": scatter(power_law_index(rng, options.users), options.users) + 1,
+                    "created_at": created_at,
+                    "updated_at": _timestamp(rng, created_at),
+                })
+                for ingredient_id in sorted(ingredient_ids):
+                    recipe_ingredients.append({
+                        "recipe_id": recipe_id,
+                        "ingredient_id": ingredient_id,
+                        "quantity": round(rng.uniform(0.25, 4), 2),
+                        "notes": None,
+                    })
+                for step in range(1, rng.randint(2, 10) + 1):
+                    instructions.append({
+                        "recipe_id": recipe_id,
+                        "step_number": step,
+                        "description": f"{rng.choice(STEP_VERBS)} for {rng.randint(1, 15)} minutes.",
+                    })
+            write_rows(conn, Recipe.__table__, recipes)
+            write_rows(conn, RecipeIngredient.__table__, recipe_ingredients)
+            write_rows(conn, Instruction.__table__, instructions)
+    return end - start
+
+
+def favorites_chunk(engine: Engine, options: GeneratorOptions, start: int, end: int) -> int:
+    """Favorites of users [start, end).
+
+    Both the number of favorites per user and which recipes get them are
+    power-law skewed: most users keep a few, popular recipes collect most.
+    """
+    rng = _rng(options, "favorites", start)
+    written = 0
+    with engine.begin() as conn:
+        rows = []
+        for user_id in range(start, end):
+            wanted = min(options.recipes, power_law_index(rng, 500, alpha=1.1))
+            recipe_ids = set()
+            while len(recipe_ids) < wanted:
+                recipe_ids.add(scatter(power_law_index(rng, options.recipes), options.recipes) + 1)
+            rows.extend({"user_id": user_id, "recipe_id": recipe_id} for recipe_id in sorted(recipe_ids))
+            if len(rows) >= options.batch_size:
+                write_rows(conn, Favorite.__table__, rows)
+                written += len(rows)
+                rows = []
+        write_rows(conn, Favorite.__table__, rows)
+        written += len(rows)
+    return written
+
+
+_worker_engine = None
+
+
+def _init_worker(url: str):
+    global _worker_engine
+    _worker_engine = create_engine(url)
+
+
+def _run_chunk(task, options: GeneratorOptions, start: int, end: int) -> int:
+    return task(_worker_engine, options, start, end)
+
+
+def _chunks(total: int):
+    return [(start, min(start + CHUNK_SIZE, total + 1)) for start in range(1, total + 1, CHUNK_SIZE)]
+
+
+def generate(engine: Engine, options: GeneratorOptions, workers: int = 0, log=print) -> dict:
+    """Fill an empty database with synthetic users, recipes and favorites.
+
+    Ids are assigned here rather than by the database, so chunks can be
+    written by `workers` processes in any order; workers=0 writes them
+    in this process. Returns the row counts.
+    """
+    if options.recipes and not (options.users and options.ingredients):
+        raise ValueError("Recipes need at least one user and one ingredient")
+    counts = {}
+    with engine.begin() as conn:
+        write_rows(conn, Ingredient.__table__, ingredient_rows(options))
+    counts["ingredients"] = options.ingredients
+
+    executor = None
+    if workers > 0:
+        # spawn: each worker opens its own connections instead of inheriting
+        # the parent's pooled sockets
+        executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(engine.url.render_as_string(hide_password=False),),
+        )
+    try:
+        for name, task, total in (
+            ("users", users_chunk, options.users),
+            ("recipes", recipes_chunk, options.recipes),
+            ("favorites", favorites_chunk, options.users),
+        ):
+            started = time.perf_counter()
+            chunks = _chunks(total)
+            if executor is None:
+                written = sum(task(engine, options, start, end) for start, end in chunks)
+            else:
+                futures = [executor.submit(_run_chunk, task, options, start, end) for start, end in chunks]
+                written = sum(future.result() for future in futures)
+            counts[name] = written
+            log(f"{name}: {written} rows in {time.perf_counter() - started:.1f}s")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    started = time.perf_counter()
+    with Session(engine) as db:
+        if engine.dialect.name == "postgresql":
+            # Explicit ids leave the serial sequences behind
+            for table in ("users", "ingredients", "recipes"):
+                db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+        rebuild_search_index(db)
+        db.commit()
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE"))
+    log(f"search index and statistics in {time.perf_counter() - started:.1f}s")
+    return counts
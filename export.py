@@ -0,0 +1,156 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from datetime import datetime
+from enum import Enum
+from models import Recipe, RecipeIngredient, Ingredient, Instruction
+from schema import ExportFormat
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+RECIPE_COLUMNS = [column for column in Recipe.__table__.columns if column.key != "search_vector"]
+CSV_FIELDS = [column.key for column in RECIPE_COLUMNS] + ["ingredients", "instructions"]
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def recipes_query():
+    # Plain columns rather than ORM entities, so nothing piles up in the
+    # session's identity map while the export runs
+    return select(*RECIPE_COLUMNS).order_by(Recipe.id)
+
+
+def ingredients_query(recipe_ids):
+    return select(
+        RecipeIngredient.recipe_id,
+        RecipeIngredient.ingredient_id,
+        Ingredient.name,
+        Ingredient.unit,
+        RecipeIngredient.quantity,
+        RecipeIngredient.notes,
+    ).join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id)\
+        .where(RecipeIngredient.recipe_id.in_(recipe_ids))\
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id)
+
+
+def instructions_query(recipe_ids):
+    return select(Instruction.recipe_id, Instruction.step_number, Instruction.description)\
+        .where(Instruction.recipe_id.in_(recipe_ids))\
+        .order_by(Instruction.recipe_id, Instruction.step_number)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def export_records(recipe_rows, ingredient_rows, instruction_rows):
+    """Assemble one batch of recipe rows and their child rows into dicts."""
+    ingredients = {}
+    for row in ingredient_rows:
+        recipe_id, *fields = row
+        ingredients.setdefault(recipe_id, []).append(
+            dict(zip(("ingredient_id", "name", "unit", "quantity", "notes"), fields))
+        )
+    instructions = {}
+    for recipe_id, step_number, description in instruction_rows:
+        instructions.setdefault(recipe_id, []).append({"step_number": step_number, "description": description})
+
+    return [
+        {
+            **row._asdict(),
+            "ingredients": ingredients.get(row.id, []),
+            "instructions": instructions.get(row.id, []),
+        }
+        for row in recipe_rows
+    ]
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_FIELDS)
+    return buffer.getvalue()
+
+
+def format_records(records, export_format: ExportFormat) -> str:
+    if export_format is ExportFormat.NDJSON:
+        return "".join(json.dumps(record, default=_json_default) + "\n" for record in records)
+
+    # Nested and list values are written as JSON inside their CSV cell
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([
+            json.dumps(value, default=_json_default) if isinstance(value, (list, dict))
+            else _json_default(value) if isinstance(value, (datetime, Enum))
+            else value
+            for value in (record[field] for field in CSV_FIELDS)
+        ])
+    return buffer.getvalue()
+
+
+async def stream_export(db: AsyncSession, export_format: ExportFormat, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield the whole catalog as text chunks, one chunk per batch of recipes.
+
+    Recipes are read through a server-side cursor and each batch fetches
+    its ingredients and instructions with one query per table, so memory
+    stays flat however many recipes there are.
+    """
+    # The request's session dependency has already been closed by the time
+    # a StreamingResponse runs; the session reconnects on first use and is
+    # closed again here once the body is done.
+    try:
+        if export_format is ExportFormat.CSV:
+            yield csv_header()
+        result = await db.stream(recipes_query().execution_options(yield_per=batch_size))
+        async for recipe_rows in result.partitions():
+            recipe_ids = [row.id for row in recipe_rows]
+            ingredient_rows = (await db.execute(ingredients_query(recipe_ids))).all()
+            instruction_rows = (await db.execute(instructions_query(recipe_ids))).all()
+            yield format_records(export_records(recipe_rows, ingredient_rows, instruction_rows), export_format)
+    finally:
+        await db.close()
+
+
+def write_export(db: Session, export_format: ExportFormat, out, batch_size: int = EXPORT_BATCH_SIZE):
+    """Blocking counterpart of stream_export for offline dumps."""
+    if export_format is ExportFormat.CSV:
+        out.write(csv_header())
+    result = db.execute(recipes_query().execution_options(yield_per=batch_size))
+    for recipe_rows in result.partitions():
+        recipe_ids = [row.id for row in recipe_rows]
+        ingredient_rows = db.execute(ingredients_query(recipe_ids)).all()
+        instruction_rows = db.execute(instructions_query(recipe_ids)).all()
+        out.write(format_records(export_records(recipe_rows, ingredient_rows, instruction_rows), export_format))
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Dump every recipe with its ingredients and instructions.")
+    parser.add_argument("--format", choices=[f.value for f in ExportFormat], default=ExportFormat.NDJSON.value)
+    parser.add_argument("--output", "-o", help="file to write to (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        write_export(db, ExportFormat(args.format), out, args.batch_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        db.close()
@@ -0,0 +1,99 @@
+from fastapi import Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from models import Recipe
+import models
+import schema as schema
+
+FACET_COLUMNS = {
+    "category": Recipe.category,
+    "cuisine": Recipe.cuisine,
+    "difficulty": Recipe.difficulty,
+    "dietary_info": Recipe.dietary_info,
+    "is_featured": Recipe.is_featured,
+}
+
+
+class RecipeFilters:
+    """Facet and range filters shared by the recipe list and facet endpoints."""
+
+    def __init__(
+        self,
+        category: Optional[schema.CategoryEnum] = None,
+        cuisine: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        dietary_info: Optional[str] = None,
+        is_featured: Optional[bool] = None,
+        min_cooking_time: Optional[int] = Query(None, ge=0),
+        max_cooking_time: Optional[int] = Query(None, ge=0),
+        min_total_time: Optional[int] = Query(None, ge=0),
+        max_total_time: Optional[int] = Query(None, ge=0),
+        min_calories: Optional[int] = Query(None, ge=0),
+        max_calories: Optional[int] = Query(None, ge=0),
+    ):
+        self.facets = {
+            "category": models.CategoryEnum(category.value) if category else None,
+            "cuisine": cuisine,
+            "difficulty": difficulty,
+            "dietary_info": dietary_info,
+            "is_featured": is_featured,
+        }
+        self.ranges = [
+            (Recipe.cooking_time, min_cooking_time, max_cooking_time),
+            (Recipe.total_time, min_total_time, max_total_time),
+            (Recipe.calories_per_serving, min_calories, max_calories),
+        ]
+
+    def range_clauses(self):
+        clauses = []
+        for column, low, high in self.ranges:
+            if low is not None:
+                clauses.append(column >= low)
+            if high is not None:
+                clauses.append(column <= high)
+        return clauses
+
+    def clauses(self):
+        return [
+            FACET_COLUMNS[name] == value
+            for name, value in self.facets.items() if value is not None
+        ] + self.range_clauses()
+
+    def apply(self, stmt):
+        return stmt.where(*self.clauses())
+
+
+async def facet_counts(db: AsyncSession, filters: RecipeFilters):
+    """Count recipes per value of every facet in a single grouped query.
+
+    Each facet's counts honour all active filters except its own, so the UI
+    can show how many results picking a different value would give.
+    """
+    rows = await db.execute(
+        select(*FACET_COLUMNS.values(), func.count())
+        .where(*filters.range_clauses())
+        .group_by(*FACET_COLUMNS.values())
+    )
+
+    counts = {name: {} for name in FACET_COLUMNS}
+    for row in rows:
+        values = dict(zip(FACET_COLUMNS, row[:-1]))
+        for name in FACET_COLUMNS:
+            if values[name] is None:
+                continue
+            if any(
+                wanted is not None and values[other] != wanted
+                for other, wanted in filters.facets.items() if other != name
+            ):
+                continue
+            key = values[name].value if isinstance(values[name], models.CategoryEnum) else values[name]
+            counts[name][key] = counts[name].get(key, 0) + row[-1]
+
+    return {
+        name: [
+            {"value": value, "count": count}
+            for value, count in sorted(values.items(), key=lambda item: (-item[1], str(item[0])))
+        ]
+        for name, values in counts.items()
+    }
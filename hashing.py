@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+from utils import BCRYPT_ROUNDS, hash_pass, verify_and_update_password
+from profiler import profiled
+import asyncio
+import os
+
+load_dotenv()
+
+# bcrypt releases the GIL, so threads give real parallelism. Sized apart from
+# the shared threadpool so a login burst can't starve other blocking work.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_RETRY_AFTER = 1  # seconds
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded thread pool.
+
+    At most `max_pending` operations may be running or queued; beyond that
+    requests fail fast with 503 instead of waiting behind the backlog.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, func, *args):
+        # Only touched from the event loop, so no lock is needed
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, retry shortly",
+                headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, profiled(func), *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_pass, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        """Return (valid, new_hash); new_hash is set when the cost changed."""
+        valid, new_hash = await self._run(verify_and_update_password, password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "rounds": BCRYPT_ROUNDS,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: how many logins (bcrypt verifies) per second this
+    # machine sustains at the configured cost
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Measure bcrypt verifies per second.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS)
+    args = parser.parse_args()
+
+    async def benchmark():
+        hasher = PasswordHasher(workers=args.workers, max_pending=args.workers * 2)
+        hashed = hash_pass("benchmark-password")
+        verified = 0
+        deadline = time.perf_counter() + args.seconds
+        start = time.perf_counter()
+
+        async def worker():
+            nonlocal verified
+            while time.perf_counter() < deadline:
+                await hasher.verify_and_update("benchmark-password", hashed)
+                verified += 1
+
+        await asyncio.gather(*(worker() for _ in range(args.workers)))
+        elapsed = time.perf_counter() - start
+        per_second = verified / elapsed
+        cores = min(args.workers, os.cpu_count() or 1)
+        print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={args.workers} cores={cores}")
+        print(f"{verified} logins in {elapsed:.2f}s: {per_second:.1f}/s, {per_second / cores:.1f}/s per core")
+
+    asyncio.run(benchmark())
@@ -0,0 +1,301 @@
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import List, NamedTuple, Optional
+from dotenv import load_dotenv
+from models import Image, ImageReference
+from collections import Counter
+import glob
+import hashlib
+import os
+from uuid import uuid4
+
+load_dotenv()
+
+# Files live at IMAGE_UPLOAD_DIR/<first two hex digits>/<sha256><ext> and are
+# served from IMAGE_URL_PREFIX (see main.py)
+IMAGE_UPLOAD_DIR = os.getenv("IMAGE_UPLOAD_DIR", "uploads/recipes")
+IMAGE_URL_PREFIX = os.getenv("IMAGE_URL_PREFIX", "/uploads/recipes")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+WRITE_CHUNK_BYTES = 256 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # allowance for boundaries and part headers
+
+UPSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+# Leading bytes -> (content type, extension). The client's declared type is
+# not trusted.
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+]
+
+
+class StoredImage(NamedTuple):
+    sha256: str
+    path: str
+    content_type: str
+    size: int
+
+
+def sniff_type(head: bytes):
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    for signature, content_type, extension in SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    return None
+
+
+def image_url(path: str) -> str:
+    return f"{IMAGE_URL_PREFIX}/{path}"
+
+
+def path_sha256(path: str) -> str:
+    """The content hash a stored file is named after."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def variant_path(path: str, width: int) -> str:
+    """Where the WebP variant of `path` resized to `width` pixels is stored."""
+    return f"{os.path.splitext(path)[0]}_w{width}.webp"
+
+
+class _ImageWriter:
+    """Writes an incoming file to a temp file while hashing it.
+
+    Its methods do blocking IO and are called through the threadpool.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.head = b""
+        self.size = 0
+        os.makedirs(IMAGE_UPLOAD_DIR, exist_ok=True)
+        self.temp_path = os.path.join(IMAGE_UPLOAD_DIR, f".upload-{uuid4().hex}")
+        self.file = open(self.temp_path, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image is larger than {self.max_bytes} bytes"
+            )
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self.digest.update(data)
+        self.file.write(data)
+
+    def finish(self) -> StoredImage:
+        """Move the temp file to its content address and describe it."""
+        self.file.close()
+        sniffed = sniff_type(self.head)
+        if sniffed is None:
+            self.discard()
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only JPEG, PNG, GIF and WebP images are accepted"
+            )
+        content_type, extension = sniffed
+        sha256 = self.digest.hexdigest()
+        path = f"{sha256[:2]}/{sha256}{extension}"
+        destination = os.path.join(IMAGE_UPLOAD_DIR, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Same bytes, same name: replacing an existing copy is a no-op rename
+        # and guarantees the file is there for the reference about to be added
+        os.replace(self.temp_path, destination)
+        return StoredImage(sha256, path, content_type, self.size)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+async def receive_image(request: Request, max_bytes: Optional[int] = None) -> StoredImage:
+    """Stream the first file part of a multipart request into the store.
+
+    The body is parsed as it arrives, so only one write chunk is held in
+    memory; hashing and disk writes run in the threadpool. Oversized
+    uploads are refused from Content-Length before anything is read, or as
+    soon as the file grows past the limit.
+    """
+    max_bytes = IMAGE_MAX_BYTES if max_bytes is None else max_bytes
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {max_bytes} bytes"
+        )
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data body with an image file"
+        )
+
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "capturing": False, "found": False}
+    pending = []
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["capturing"] = not state["found"] and b"filename" in disposition
+        state["found"] = state["found"] or state["capturing"]
+
+    def on_part_data(data, start, end):
+        if state["capturing"]:
+            pending.append(data[start:end])
+
+    def on_part_end():
+        state["capturing"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    writer = await run_in_threadpool(_ImageWriter, max_bytes)
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if sum(len(part) for part in pending) >= WRITE_CHUNK_BYTES:
+                data = b"".join(pending)
+                pending.clear()
+                await run_in_threadpool(writer.write, data)
+        parser.finalize()
+        if pending:
+            await run_in_threadpool(writer.write, b"".join(pending))
+        if not state["found"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No file part in the upload"
+            )
+        return await run_in_threadpool(writer.finish)
+    except BaseException:
+        await run_in_threadpool(writer.discard)
+        raise
+
+
+def _image_upsert(dialect_name: str, stored: StoredImage):
+    # Creates the images row on first upload, otherwise bumps its count
+    dialect = UPSERT_DIALECTS[dialect_name]
+    stmt = dialect.insert(Image).values(**stored._asdict(), ref_count=1)
+    return stmt.on_conflict_do_update(
+        index_elements=[Image.sha256],
+        set_={"ref_count": Image.ref_count + 1}
+    ).returning(Image.ref_count)
+
+
+async def add_reference(db: AsyncSession, stored: StoredImage, user_id: Optional[int]) -> int:
+    """Record an upload of `stored`; returns the new reference count."""
+    ref_count = await db.scalar(_image_upsert(db.bind.dialect.name, stored))
+    await db.execute(insert(ImageReference).values(sha256=stored.sha256, user_id=user_id))
+    await db.commit()
+    return ref_count
+
+
+async def remove_reference(db: AsyncSession, sha256: str, user_id: int) -> bool:
+    """Drop one of `user_id`'s references to an image.
+
+    The row and the file go with the last reference. An upload of the same
+    bytes landing between that DELETE and the unlink loses its file; the
+    window is one statement wide and the client can upload again.
+    """
+    reference_id = await db.scalar(
+        select(ImageReference.id)
+        .where(ImageReference.sha256 == sha256, ImageReference.user_id == user_id)
+        .limit(1)
+    )
+    if reference_id is None:
+        return False
+    await db.execute(delete(ImageReference).where(ImageReference.id == reference_id))
+    ref_count = await db.scalar(
+        update(Image).where(Image.sha256 == sha256).values(ref_count=Image.ref_count - 1).returning(Image.ref_count)
+    )
+    path = None
+    if ref_count <= 0:
+        path = await db.scalar(delete(Image).where(Image.sha256 == sha256, Image.ref_count <= 0).returning(Image.path))
+    await db.commit()
+    if path:
+        await run_in_threadpool(_remove_file, path)
+    return True
+
+
+async def remove_user_references(db: AsyncSession, user_id: int) -> List[str]:
+    """Drop every reference `user_id` holds, before the user is deleted.
+
+    Nobody could remove them afterwards, so their images would never lose
+    their last reference. Images left without one have their rows deleted
+    here; their paths are returned for `remove_files` once the caller has
+    committed.
+    """
+    removed = Counter((await db.scalars(
+        delete(ImageReference).where(ImageReference.user_id == user_id).returning(ImageReference.sha256)
+    )).all())
+    if not removed:
+        return []
+    images = Image.__table__
+    await db.execute(
+        update(images).where(images.c.sha256 == bindparam("b_sha256")).values(ref_count=images.c.ref_count - bindparam("b_count")),
+        [{"b_sha256": sha256, "b_count": count} for sha256, count in removed.items()]
+    )
+    return (await db.scalars(
+        delete(Image).where(Image.sha256.in_(removed), Image.ref_count <= 0).returning(Image.path)
+    )).all()
+
+
+async def remove_files(paths: List[str]):
+    for path in paths:
+        await run_in_threadpool(_remove_file, path)
+
+
+def _remove_file(path: str):
+    # The original and any variants generated from it (see image_variants)
+    full_path = os.path.join(IMAGE_UPLOAD_DIR, path)
+    for candidate in [full_path, *glob.glob(glob.escape(os.path.splitext(full_path)[0]) + "_w*.webp")]:
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def store_file(db: Session, source_path: str, user_id: Optional[int] = None) -> StoredImage:
+    """Blocking counterpart of receive_image + add_reference for local files (seeder)."""
+    writer = _ImageWriter(IMAGE_MAX_BYTES)
+    try:
+        with open(source_path, "rb") as source:
+            while chunk := source.read(WRITE_CHUNK_BYTES):
+                writer.write(chunk)
+        stored = writer.finish()
+    except BaseException:
+        writer.discard()
+        raise
+    db.execute(_image_upsert(db.get_bind().dialect.name, stored))
+    db.execute(insert(ImageReference).values(sha256=stored.sha256, user_id=user_id))
+    db.commit()
+    return stored
@@ -0,0 +1,254 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from dotenv import load_dotenv
+import image_store
+import importlib.util
+import multiprocessing
+import threading
+import os
+
+load_dotenv()
+
+# Resized WebP copies of uploaded images, written next to the original as
+# <sha256>_w<width>.webp (see image_store.variant_path). Requires Pillow;
+# without it uploads work as before and responses carry no srcset.
+IMAGE_VARIANT_WIDTHS = sorted(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if width.strip())
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))  # 0 disables generation
+KNOWN_VARIANTS_MAX_ENTRIES = 50000
+# Covers clock skew and SQLite's one-second timestamps when comparing a
+# recipe's updated_at with the time its variants were last looked up
+VARIANT_PROBE_SLACK = timedelta(seconds=1)
+
+
+def render_variants(upload_dir: str, path: str, widths: List[int], quality: int) -> List[int]:
+    """Write the variants of one stored image; returns the widths available.
+
+    Runs in a worker process. Widths at or above the original's are skipped
+    rather than upscaled, and existing variants are left alone, so running
+    it twice for the same image is cheap.
+    """
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        raise RuntimeError("Image variants require the 'Pillow' package")
+
+    source = os.path.join(upload_dir, path)
+    available = []
+    with PILImage.open(source) as image:
+        original_width, original_height = image.size
+        wanted = [width for width in widths if width < original_width]
+        if not wanted:
+            return available
+        # Lets the JPEG decoder scale down by a power of two while reading,
+        # which is most of the work for large photos
+        image.draft("RGB", (max(wanted), original_height * max(wanted) // original_width))
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        frame = image.convert("RGBA" if has_alpha else "RGB")
+
+    for width in wanted:
+        destination = os.path.join(upload_dir, image_store.variant_path(path, width))
+        if not os.path.exists(destination):
+            height = max(1, round(original_height * width / original_width))
+            temp_path = f"{destination}.{os.getpid()}.tmp"
+            frame.resize((width, height), PILImage.LANCZOS).save(temp_path, "WEBP", quality=quality, method=4)
+            os.replace(temp_path, destination)
+        available.append(width)
+    return available
+
+
+class VariantGenerator:
+    """Schedules render_variants on a process pool, off the request path.
+
+    The pool is started on first use. Paths already queued are not queued
+    again; everything here is per worker process. Once variants of a path
+    exist they are recorded for srcset, and listeners are called with the
+    path and widths from the pool's callback thread.
+    """
+
+    def __init__(self, workers: int = IMAGE_VARIANT_WORKERS, widths: Iterable[int] = IMAGE_VARIANT_WIDTHS,
+                 quality: int = IMAGE_VARIANT_QUALITY):
+        self.workers = workers
+        self.widths = list(widths)
+        self.quality = quality
+        self.available = importlib.util.find_spec("PIL") is not None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._pending = set()
+        self._listeners = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.available and self.workers > 0 and bool(self.widths)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process has threads (threadpool,
+            # bcrypt pool) that a forked child would inherit mid-flight
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def add_listener(self, callback: Callable[[str, List[int]], None]):
+        self._listeners.append(callback)
+
+    def schedule(self, path: str) -> bool:
+        """Queue variant generation for a stored image; False if nothing was queued."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if path in self._pending:
+                return False
+            self._pending.add(path)
+            self.submitted += 1
+        future = self._pool().submit(render_variants, image_store.IMAGE_UPLOAD_DIR, path, self.widths, self.quality)
+        future.add_done_callback(partial(self._done, path))
+        return True
+
+    def schedule_urls(self, urls: Iterable[Optional[str]]) -> int:
+        """Queue variants for every URL that points into the image store."""
+        return sum(self.schedule(path) for path in filter(None, map(store_path, urls)))
+
+    def _done(self, path: str, future):
+        with self._lock:
+            self._pending.discard(path)
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+                return
+        widths = future.result()
+        if widths:
+            record_variants(path, widths)
+            for callback in self._listeners:
+                callback(path, widths)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "available": self.available,
+                "workers": self.workers,
+                "widths": self.widths,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "pending": len(self._pending),
+            }
+
+
+variant_generator = VariantGenerator()
+
+# Full image path -> (variant widths, when they were established), filled by
+# the generator and by srcset's lookups so serializing a recipe doesn't stat
+# files. Other workers and the backfill script render variants too; they bump
+# the updated_at of recipes showing the image, which prompts a new lookup.
+_known_variants: Dict[str, Tuple[Tuple[int, ...], datetime]] = {}
+
+
+def _remember(full_path: str, widths) -> Tuple[int, ...]:
+    if len(_known_variants) >= KNOWN_VARIANTS_MAX_ENTRIES:
+        _known_variants.clear()
+    widths = tuple(sorted(widths))
+    _known_variants[full_path] = (widths, datetime.now(timezone.utc))
+    return widths
+
+
+def record_variants(path: str, widths: Iterable[int]):
+    """Note the widths rendered for the stored image at `path`."""
+    _remember(os.path.join(image_store.IMAGE_UPLOAD_DIR, path), widths)
+
+
+def known_widths(path: str, as_of: Optional[datetime] = None) -> Tuple[int, ...]:
+    """Variant widths of the stored image at `path`.
+
+    Looked up on disk the first time, and again only when `as_of` (the
+    updated_at of the recipe showing the image) is newer than that lookup.
+    """
+    full_path = os.path.join(image_store.IMAGE_UPLOAD_DIR, path)
+    known = _known_variants.get(full_path)
+    if known is not None:
+        widths, checked_at = known
+        if as_of is None:
+            return widths
+        if as_of.tzinfo is None:
+            # SQLite hands back naive timestamps; they are stored in UTC
+            as_of = as_of.replace(tzinfo=timezone.utc)
+        if as_of < checked_at - VARIANT_PROBE_SLACK:
+            return widths
+    return _remember(full_path, [
+        width for width in IMAGE_VARIANT_WIDTHS
+        if os.path.exists(os.path.join(image_store.IMAGE_UPLOAD_DIR, image_store.variant_path(path, width)))
+    ])
+
+
+def store_path(url: Optional[str]) -> Optional[str]:
+    """The image_store path behind an absolute or relative image URL, if any."""
+    if not url:
+        return None
+    prefix = image_store.IMAGE_URL_PREFIX.rstrip("/") + "/"
+    path = urlsplit(url).path
+    return path[len(prefix):] if path.startswith(prefix) else None
+
+
+def srcset(url: Optional[str], as_of: Optional[datetime] = None) -> Optional[Dict[str, str]]:
+    """Map of "<width>w" -> URL for the variants of `url` known so far.
+
+    Variant URLs keep the scheme and host of `url`. Returns None for images
+    outside the store or without variants; clients then use `url` itself.
+    `as_of` is the updated_at of the recipe being serialized (see known_widths).
+    """
+    path = store_path(url)
+    if path is None:
+        return None
+    split = urlsplit(url)
+    prefix = image_store.IMAGE_URL_PREFIX.rstrip("/")
+    variants = {}
+    for width in known_widths(path, as_of):
+        variant = image_store.variant_path(path, width)
+        variants[f"{width}w"] = urlunsplit(split._replace(path=f"{prefix}/{variant}", query="", fragment=""))
+    return variants or None
+
+
+if __name__ == "__main__":
+    # Backfill: generate variants for every image already in the store
+    import argparse
+    from concurrent.futures import as_completed
+    from cache import recipe_cache
+    from database import engine
+    from recipe_writes import touch_image_recipes
+
+    parser = argparse.ArgumentParser(description="Generate resized WebP variants for stored images.")
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    upload_dir = image_store.IMAGE_UPLOAD_DIR
+    paths = []
+    for directory, _, files in os.walk(upload_dir):
+        for name in files:
+            if name.startswith(".") or "_w" in name or name.endswith(".tmp"):
+                continue
+            paths.append(os.path.relpath(os.path.join(directory, name), upload_dir))
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = {
+            executor.submit(render_variants, upload_dir, path, IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_QUALITY): path
+            for path in paths
+        }
+        failed = 0
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                failed += 1
+                print(f"{futures[future]}: {future.exception()}")
+            elif future.result():
+                recipe_cache.invalidate(*touch_image_recipes(engine, futures[future], scan_urls=True))
+    print(f"Processed {len(paths)} images, {failed} failed")
@@ -0,0 +1,73 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from models import Recipe, RecipeIngredient, User
+
+
+def recipe_response_options():
+    """Loader options for everything schema.RecipeResponse serializes.
+
+    Many-to-one relationships are joined into the main query, collections
+    are fetched with one extra SELECT ... IN per relationship, so a page of
+    recipes costs a constant number of queries regardless of its size.
+    """
+    return (
+        joinedload(Recipe.user),
+        selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient),
+        selectinload(Recipe.instructions),
+    )
+
+
+async def load_recipe(db: AsyncSession, recipe_id: int):
+    """Load one recipe for RecipeResponse, overwriting any stale copy in the session."""
+    return await db.scalar(
+        select(Recipe)
+        .options(*recipe_response_options())
+        .where(Recipe.id == recipe_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def load_recipes(db: AsyncSession, recipe_ids):
+    """Load recipes for RecipeResponse by id, keeping the order of `recipe_ids`.
+
+    Ids that no longer exist are skipped.
+    """
+    if not recipe_ids:
+        return []
+    recipes = await db.scalars(
+        select(Recipe)
+        .options(*recipe_response_options())
+        .where(Recipe.id.in_(recipe_ids))
+    )
+    recipes_by_id = {recipe.id: recipe for recipe in recipes}
+    return [recipes_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes_by_id]
+
+
+def recipe_versions(stmt):
+    """Narrow a Recipe select to the columns that version its RecipeResponse."""
+    return stmt.join(User, User.id == Recipe.user_id)\
+        .with_only_columns(Recipe.id, Recipe.updated_at, User.email, User.name)
+
+
+def recipe_version(recipe):
+    return (recipe.id, recipe.updated_at, recipe.user.email, recipe.user.name)
+
+
+def recipe_summaries(stmt):
+    """Narrow a Recipe select to the columns of schema.RecipeSummary.
+
+    id and updated_at lead so the rows double as version tuples.
+    """
+    return stmt.join(User, User.id == Recipe.user_id)\
+        .with_only_columns(
+            Recipe.id,
+            Recipe.updated_at,
+            Recipe.title,
+            Recipe.featured_image,
+            Recipe.cooking_time,
+            Recipe.prep_time,
+            Recipe.total_time,
+            Recipe.category,
+            User.name.label("author_name"),
+        )
@@ -1,10 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
 from database import engine
-from router import users, auth, recipes, ingredients, favorites
-from models import User, Recipe, Ingredient, RecipeIngredient, Instruction, Favorite
+from router import users, auth, recipes, ingredients, favorites, internal, images, metrics
+from models import User, Recipe, Ingredient, RecipeIngredient, Instruction, Favorite, Image, ImageReference, RecipeImage
 from fastapi.middleware.cors import CORSMiddleware
+from admission import AdmissionMiddleware, admission_controller
+from query_counter import QueryCounterMiddleware
+from metrics import METRICS_DIR, MetricsMiddleware, remove_stale
+from profiler import ProfilerMiddleware
+from image_store import IMAGE_UPLOAD_DIR, IMAGE_URL_PREFIX
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Counters of workers from earlier runs would otherwise stay in the sums
+    if METRICS_DIR:
+        remove_stale(METRICS_DIR)
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # Create all tables
 User.metadata.create_all(bind=engine)
@@ -13,6 +27,17 @@ Ingredient.metadata.create_all(bind=engine)
 RecipeIngredient.metadata.create_all(bind=engine)
 Instruction.metadata.create_all(bind=engine)
 Favorite.metadata.create_all(bind=engine)
+Image.metadata.create_all(bind=engine)
+ImageReference.metadata.create_all(bind=engine)
+RecipeImage.metadata.create_all(bind=engine)
+
+# Statement count and DB time per request (X-DB-Queries, Server-Timing),
+# innermost so shed requests aren't counted
+app.add_middleware(QueryCounterMiddleware)
+
+# Admission control: per route group and per user in-flight limits plus a
+# rate limit. Added before CORS so rejections still carry CORS headers.
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
 
 # CORS configuration
 app.add_middleware(
@@ -21,14 +46,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "Retry-After", "X-DB-Queries", "Server-Timing"],
 )
 
+# On-demand profiling of single requests (X-Profile header or sample rate),
+# off unless PROFILING_ENABLED is set
+app.add_middleware(ProfilerMiddleware)
+
+# Request counts, status codes and latency by route template, outermost so
+# shed requests and CORS preflights are counted too (exported at /metrics)
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+
 # Mount all routers under /api prefix
 app.include_router(users.router, prefix="/api")
 app.include_router(recipes.router, prefix="/api")
 app.include_router(ingredients.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(favorites.router, prefix="/api")
+app.include_router(internal.router, prefix="/api")
+app.include_router(images.router, prefix="/api")
+app.include_router(metrics.router)
+
+# Uploaded images; names are content hashes, so they never change
+app.mount(IMAGE_URL_PREFIX, StaticFiles(directory=IMAGE_UPLOAD_DIR, check_dir=False), name="uploads")
 
 @app.get("/")
 async def root():
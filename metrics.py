@@ -0,0 +1,267 @@
+from collections import defaultdict
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from dotenv import load_dotenv
+from pool_metrics import Histogram, pool_stats
+from cache import recipe_cache
+from token_cache import token_cache
+from admission import route_group
+import copy
+import glob
+import json
+import threading
+import time
+import os
+
+load_dotenv()
+
+# With several uvicorn workers each keeps its own numbers; pointing them all
+# at one METRICS_DIR lets whichever worker is scraped report the sum. Files
+# of exited workers are removed when a worker starts (remove_stale).
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _labels_key(labels: dict) -> str:
+    return json.dumps(labels, sort_keys=True)
+
+
+class MetricsRegistry:
+    """Request metrics of this worker, plus pool and cache stats sampled on export."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)   # (method, route, status) -> count
+            self.latency = {}                  # (method, route) -> Histogram
+            self.in_flight = defaultdict(int)  # admission route group -> count
+            self.last_flush = 0.0
+
+    def start(self, group: str):
+        with self._lock:
+            self.in_flight[group] += 1
+
+    def finish(self, group: str, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            self.in_flight[group] -= 1
+            self.requests[(method, route, status)] += 1
+            histogram = self.latency.get((method, route))
+            if histogram is None:
+                histogram = self.latency[(method, route)] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        """Metric families as {name: {type, help, samples: [[labels, value]]}}.
+
+        Histogram values are Histogram.snapshot() dicts (cumulative buckets),
+        which add up across workers bucket by bucket.
+        """
+        families = {}
+
+        def add(name, kind, help_text, labels, value):
+            family = families.setdefault(name, {"type": kind, "help": help_text, "samples": []})
+            family["samples"].append([labels, value])
+
+        with self._lock:
+            requests = list(self.requests.items())
+            latency = list(self.latency.items())
+            in_flight = list(self.in_flight.items())
+        for (method, route, status), count in requests:
+            add("http_requests_total", "counter", "Requests handled, by route template and status.",
+                {"method": method, "route": route, "status": str(status)}, count)
+        for (method, route), histogram in latency:
+            add("http_request_duration_seconds", "histogram", "Time from request to the end of the response body.",
+                {"method": method, "route": route}, histogram.snapshot())
+        for group, count in in_flight:
+            add("http_requests_in_flight", "gauge", "Requests being handled, by admission route group.",
+                {"group": group}, count)
+
+        for pool, stats in pool_stats().items():
+            labels = {"pool": pool}
+            for key, kind in (("checked_out", "gauge"), ("overflow", "gauge"), ("connects", "counter"),
+                              ("checkouts", "counter"), ("invalidations", "counter"),
+                              ("overflow_events", "counter"), ("timeouts", "counter")):
+                if stats[key] is not None:
+                    name = f"db_pool_{key}" + ("_total" if kind == "counter" else "")
+                    add(name, kind, f"Connection pool {key.replace('_', ' ')}.", labels, stats[key])
+            add("db_pool_wait_seconds", "histogram", "Time spent waiting for a pooled connection.",
+                labels, stats["wait_seconds"])
+
+        for cache, stats in (("recipe", recipe_cache.stats()), ("token", token_cache.stats())):
+            add("cache_hits_total", "counter", "Cache lookups that found an entry.", {"cache": cache}, stats["hits"])
+            add("cache_misses_total", "counter", "Cache lookups that found nothing.", {"cache": cache}, stats["misses"])
+        return families
+
+    def flush(self, directory: str):
+        """Write this worker's snapshot where other workers can read it."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as out:
+            json.dump({"pid": os.getpid(), "families": self.snapshot()}, out)
+        os.replace(temp_path, path)
+        self.last_flush = time.monotonic()
+
+
+registry = MetricsRegistry()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale(directory: str):
+    """Delete the snapshots of workers that are no longer running.
+
+    Called at startup, so totals from earlier runs don't carry over while
+    the files of sibling workers already serving are kept.
+    """
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        pid = name.split(".", 1)[0]
+        if pid.isdigit() and not _alive(int(pid)):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass  # removed by a sibling starting at the same time
+
+
+def merge(snapshots) -> dict:
+    """Add up worker snapshots: `snapshots` is a list of (alive, families).
+
+    Counters and histograms of exited workers still count toward the
+    totals; their gauges are dropped.
+    """
+    merged = {}
+    for alive, families in snapshots:
+        for name, family in families.items():
+            if family["type"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {"type": family["type"], "help": family["help"], "samples": {}})
+            for labels, value in family["samples"]:
+                key = _labels_key(labels)
+                if key not in target["samples"]:
+                    target["samples"][key] = [labels, copy.deepcopy(value)]
+                elif family["type"] == "histogram":
+                    current = target["samples"][key][1]
+                    for bound, count in value["buckets"].items():
+                        current["buckets"][bound] = current["buckets"].get(bound, 0) + count
+                    current["count"] += value["count"]
+                    current["sum"] += value["sum"]
+                else:
+                    target["samples"][key][1] += value
+    return {name: {**family, "samples": list(family["samples"].values())} for name, family in merged.items()}
+
+
+def collect() -> dict:
+    """Metric families for /metrics: this worker's, or every worker's summed."""
+    if not METRICS_DIR:
+        return registry.snapshot()
+    registry.flush(METRICS_DIR)
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path) as source:
+                data = json.load(source)
+        except (OSError, ValueError):
+            continue  # removed or replaced while listing
+        snapshots.append((_alive(data["pid"]), data["families"]))
+    return merge(snapshots)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict, extra: dict = None) -> str:
+    labels = {**labels, **(extra or {})}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render(families: dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in family["samples"]:
+            if family["type"] == "histogram":
+                for bound, count in value["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    # Derived from the summed counters, so it is right across workers too
+    hits = {labels["cache"]: value for labels, value in families.get("cache_hits_total", {}).get("samples", [])}
+    misses = {labels["cache"]: value for labels, value in families.get("cache_misses_total", {}).get("samples", [])}
+    if hits:
+        lines.append("# HELP cache_hit_ratio Share of cache lookups that found an entry.")
+        lines.append("# TYPE cache_hit_ratio gauge")
+        for cache, count in sorted(hits.items()):
+            lookups = count + misses.get(cache, 0)
+            lines.append(f'cache_hit_ratio{{cache="{cache}"}} {count / lookups if lookups else 0.0}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request by route template.
+
+    Labels use the matched route's path (/api/recipes/{recipe_id}), so the
+    number of series stays bounded however many ids are requested. Added
+    outermost, so requests shed by admission control are included.
+    """
+
+    def __init__(self, app, routes=(), metrics: MetricsRegistry = registry):
+        self.app = app
+        self.routes = routes
+        self.metrics = metrics
+
+    def _route(self, scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            # Not routed, e.g. rejected by a middleware first
+            for candidate in self.routes:
+                if candidate.matches(scope)[0] == Match.FULL:
+                    route = candidate
+                    break
+        return getattr(route, "path", UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        group = route_group(scope["method"], scope["path"])
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.start(group)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.finish(group, scope["method"], self._route(scope), status, time.perf_counter() - started)
+        if METRICS_DIR and time.monotonic() - self.metrics.last_flush >= METRICS_FLUSH_SECONDS:
+            # Claimed before the write so concurrent requests don't all flush
+            self.metrics.last_flush = time.monotonic()
+            await run_in_threadpool(self.metrics.flush, METRICS_DIR)
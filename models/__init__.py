@@ -5,6 +5,7 @@ from .recipe_ingredient import RecipeIngredient
 from .instruction import Instruction
 from .favorite import Favorite
 from .recipe import CategoryEnum
+from .image import Image, ImageReference, RecipeImage
 
 __all__ = [
     'User',
@@ -13,5 +14,8 @@ __all__ = [
     'RecipeIngredient',
     'Instruction',
     'Favorite',
-    'CategoryEnum'
+    'CategoryEnum',
+    'Image',
+    'ImageReference',
+    'RecipeImage'
 ] 
\ No newline at end of file
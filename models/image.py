@@ -0,0 +1,35 @@
+from database import Base
+from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, func
+
+class Image(Base):
+    """An uploaded file, stored once under its SHA-256 (see image_store)."""
+    __tablename__ = "images"
+
+    sha256 = Column(String(64), primary_key=True, nullable=False)
+    path = Column(String, nullable=False)          # relative to IMAGE_UPLOAD_DIR
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)         # in bytes
+    ref_count = Column(Integer, nullable=False, default=0)  # rows in image_references
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+class ImageReference(Base):
+    """One upload of an image; the file is deleted with its last reference."""
+    __tablename__ = "image_references"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    sha256 = Column(String(64), ForeignKey("images.sha256", ondelete="CASCADE"), nullable=False, index=True)
+    # NULL for files added by scripts (seeder). Deleting a user drops its references first
+    # (image_store.remove_user_references); SET NULL keeps ref_count honest if one slips through
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+class RecipeImage(Base):
+    """A stored image shown by a recipe, as featured or additional image.
+
+    Kept by the recipe write paths so finished variants can find the
+    recipes to refresh without scanning image URLs.
+    """
+    __tablename__ = "recipe_images"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    sha256 = Column(String(64), primary_key=True, index=True)
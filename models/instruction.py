@@ -6,7 +6,8 @@ class Instruction(Base):
     __tablename__ = "instructions"
 
     id = Column(Integer, primary_key=True, nullable=False)
-    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False)
+    # Indexed for loading a recipe's steps and for the search document's subquery
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False, index=True)
     step_number = Column(Integer, nullable=False)
     description = Column(Text, nullable=False)
 
@@ -1,7 +1,8 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Text, Boolean, Enum, ARRAY
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import text
+from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Text, Boolean, Enum, ARRAY, JSON, Index, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func
 import enum
 
 class CategoryEnum(enum.Enum):
@@ -19,24 +20,26 @@ class Recipe(Base):
     id = Column(Integer, primary_key=True, nullable=False)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    cooking_time = Column(Integer, nullable=False)  # in minutes
+    cooking_time = Column(Integer, nullable=False, index=True)  # in minutes
     prep_time = Column(Integer, nullable=True)      # in minutes
-    total_time = Column(Integer, nullable=True)     # in minutes
+    total_time = Column(Integer, nullable=True, index=True)  # in minutes
     servings = Column(Integer, nullable=False)
-    difficulty = Column(String, nullable=True)      # e.g., "easy", "medium", "hard"
-    category = Column(Enum(CategoryEnum), nullable=True)
-    cuisine = Column(String, nullable=True)         # e.g., "Italian", "Japanese", "Mexican"
+    difficulty = Column(String, nullable=True, index=True)  # e.g., "easy", "medium", "hard"
+    category = Column(Enum(CategoryEnum), nullable=True, index=True)
+    cuisine = Column(String, nullable=True, index=True)  # e.g., "Italian", "Japanese", "Mexican"
     featured_image = Column(String, nullable=True)  # URL to main recipe image
-    additional_images = Column(ARRAY(String), nullable=True)  # Array of image URLs
-    calories_per_serving = Column(Integer, nullable=True)
-    is_featured = Column(Boolean, default=False)    # For highlighting special recipes
+    additional_images = Column(ARRAY(String).with_variant(JSON(), "sqlite"), nullable=True)  # Array of image URLs
+    calories_per_serving = Column(Integer, nullable=True, index=True)
+    is_featured = Column(Boolean, default=False, index=True)  # For highlighting special recipes
     is_published = Column(Boolean, default=True)    # For draft/published status
-    dietary_info = Column(String, nullable=True)    # e.g., "vegetarian", "vegan", "gluten-free"
+    dietary_info = Column(String, nullable=True, index=True)  # e.g., "vegetarian", "vegan", "gluten-free"
     notes = Column(Text, nullable=True)            # Additional chef's notes or tips
     source = Column(String, nullable=True)         # Original recipe source if adapted
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
-    updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), onupdate=text('now()'))
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Full-text document maintained by search.refresh_search_document (Postgres only)
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True))
 
     # Relationships
     user = relationship("User", back_populates="recipes")
@@ -46,4 +49,26 @@ class Recipe(Base):
         "User",
         secondary="favorites",
         back_populates="favorite_recipes"
-    ) 
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        # Serves keyset pagination of a user's recipes (/recipes/my-recipes)
+        Index('ix_recipes_user_id_id', 'user_id', 'id'),
+        Index('ix_recipes_search_vector', 'search_vector', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+
+# SQLite stand-in for search_vector, used by the test database
+event.listen(
+    Recipe.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_search "
+        "USING fts5(title, description, cuisine, notes, instructions)"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    Recipe.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS recipe_search").execute_if(dialect="sqlite"),
+) 
\ No newline at end of file
@@ -0,0 +1,61 @@
+from fastapi import HTTPException, Response, status
+from typing import Optional
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_LIMIT = 1000
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def paginate(stmt, key_column, cursor: Optional[str] = None,
+             skip: int = 0, limit: Optional[int] = None):
+    """Restrict a select to one page ordered by `key_column`.
+
+    With a cursor the page starts right after the last seen key (keyset
+    pagination, served straight from the index); without one the legacy
+    skip/limit offset is used. One extra row is fetched so `trim_page`
+    can tell whether another page follows.
+    """
+    stmt = stmt.order_by(key_column)
+    if cursor is not None:
+        stmt = stmt.where(key_column > decode_cursor(cursor))
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    if limit is not None:
+        # limit=0 asks for an empty page, so no look-ahead row either
+        stmt = stmt.limit(limit + 1 if limit > 0 else 0)
+    return stmt
+
+
+def trim_page(items, response: Response, limit: Optional[int] = None):
+    """Drop the look-ahead row fetched by `paginate`.
+
+    When more rows remain, the cursor for the next page is returned in the
+    X-Next-Cursor header so list bodies keep their existing shape for old
+    clients.
+    """
+    items = list(items)
+    if limit is not None and limit > 0 and len(items) > limit:
+        items = items[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
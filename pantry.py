@@ -0,0 +1,106 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import nsmallest
+from sqlalchemy.orm import Session
+from models import RecipeIngredient
+import threading
+import time
+import os
+
+# Each worker process keeps its own index, so writes handled by other workers
+# are only picked up on the next full rebuild.
+PANTRY_INDEX_MAX_AGE = int(os.getenv("PANTRY_INDEX_MAX_AGE_SECONDS", "300"))
+
+
+class PantryIndex:
+    """In-memory inverted index of ingredient id -> sorted recipe ids.
+
+    Built from recipe_ingredients on first use and kept current by the
+    recipe write paths, so matching a pantry never touches the database.
+    """
+
+    def __init__(self, max_age: int = PANTRY_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._postings = {}       # ingredient_id -> array of recipe ids, sorted
+        self._recipes = {}        # recipe_id -> array of ingredient ids
+        self._loaded_at = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def load(self, db: Session):
+        postings = {}
+        recipes = {}
+        rows = db.query(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id)\
+            .order_by(RecipeIngredient.recipe_id)\
+            .yield_per(10000)
+        for recipe_id, ingredient_id in rows:
+            postings.setdefault(ingredient_id, array('i')).append(recipe_id)
+            recipes.setdefault(recipe_id, array('i')).append(ingredient_id)
+        with self._lock:
+            self._postings = postings
+            self._recipes = recipes
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded or time.monotonic() - self._loaded_at > self.max_age:
+            self.load(db)
+
+    def set_recipe(self, recipe_id: int, ingredient_ids):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(recipe_id)
+            ingredient_ids = array('i', sorted(set(ingredient_ids)))
+            if not ingredient_ids:
+                return
+            self._recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                insort(self._postings.setdefault(ingredient_id, array('i')), recipe_id)
+
+    def remove_recipe(self, recipe_id: int):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(recipe_id)
+
+    def _remove(self, recipe_id: int):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings.get(ingredient_id)
+            if posting is None:
+                continue
+            position = bisect_left(posting, recipe_id)
+            if position < len(posting) and posting[position] == recipe_id:
+                del posting[position]
+
+    def match(self, pantry, max_missing=None, limit: int = 20):
+        """Rank recipes by how much of them the pantry covers.
+
+        Returns (recipe_id, missing ingredient ids) pairs, fully makeable
+        recipes first, then by fewest missing ingredients.
+        """
+        pantry = set(pantry)
+        with self._lock:
+            hits = Counter()
+            for ingredient_id in pantry:
+                hits.update(self._postings.get(ingredient_id, ()))
+
+            ranked = []
+            for recipe_id, matched in hits.items():
+                missing = len(self._recipes[recipe_id]) - matched
+                if max_missing is None or missing <= max_missing:
+                    ranked.append((missing, recipe_id))
+
+            return [
+                (recipe_id, [i for i in self._recipes[recipe_id] if i not in pantry])
+                for _, recipe_id in nsmallest(limit, ranked)
+            ]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,160 @@
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import threading
+import time
+
+# Seconds; chosen around the default 30s pool_timeout
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+LIFETIME_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 3600.0, 14400.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.connects = 0
+        self.closes = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_time = Histogram(WAIT_BUCKETS)
+        self.connection_lifetime = Histogram(LIFETIME_BUCKETS)
+
+
+class _TimedCheckoutMixin:
+    """Times how long checkouts wait for a free connection.
+
+    SQLAlchemy has no event for the start of a checkout, so the pool's
+    `_do_get` is wrapped instead.
+    """
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        if self.metrics is not None:
+            self.metrics.wait_time.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+pool_registry = {}
+
+
+def instrument_pool(engine, name: str) -> PoolMetrics:
+    """Attach counters to `engine`'s pool and register them under `name`."""
+    pool = engine.pool
+    metrics = PoolMetrics(name)
+    pool.metrics = metrics
+    pool_registry[name] = engine
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+        connection_record.info["connected_at"] = time.monotonic()
+        overflow = getattr(engine.pool, "overflow", None)
+        if overflow is not None and overflow() > 0:
+            metrics.overflow_events += 1
+
+    @event.listens_for(pool, "close")
+    def on_close(dbapi_connection, connection_record):
+        metrics.closes += 1
+        connected_at = connection_record.info.pop("connected_at", None)
+        if connected_at is not None:
+            metrics.connection_lifetime.observe(time.monotonic() - connected_at)
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    return metrics
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, engine in pool_registry.items():
+        pool = engine.pool
+        metrics = pool.metrics
+        stats[name] = {
+            "pool": type(pool).__name__,
+            "config": {
+                "pool_size": pool.size() if hasattr(pool, "size") else None,
+                "max_overflow": getattr(pool, "_max_overflow", None),
+                "timeout": pool.timeout() if hasattr(pool, "timeout") else None,
+                "recycle": pool._recycle,
+                "pre_ping": pool._pre_ping,
+            },
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "connects": metrics.connects,
+            "closes": metrics.closes,
+            "checkouts": metrics.checkouts,
+            "checkins": metrics.checkins,
+            "invalidations": metrics.invalidations,
+            "overflow_events": metrics.overflow_events,
+            "timeouts": metrics.timeouts,
+            "wait_seconds": metrics.wait_time.snapshot(),
+            "connection_lifetime_seconds": metrics.connection_lifetime.snapshot(),
+        }
+    return stats
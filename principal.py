@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from database import get_async_db
+from models import User
+from utils import credentials_exception, decode_token, oauth2_scheme
+import threading
+import time
+import os
+
+load_dotenv()
+
+# Each worker keeps its own cache; user updates handled by another worker
+# are seen here once the entry expires.
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+class Principal(NamedTuple):
+    """The authenticated user, as needed by routes and UserResponse."""
+    id: int
+    email: str
+    name: Optional[str]
+    created_at: datetime
+
+
+class PrincipalCache:
+    """Small LRU of user id -> Principal with a TTL."""
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user id -> (expires_at, principal)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal: Principal):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """Resolve the bearer token to its user once per request.
+
+    Tokens carry the user id in a "uid" claim, so a cache hit costs no
+    query. Tokens issued before the claim existed fall back to the email
+    in "sub".
+    """
+    payload = decode_token(token)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+        where = User.id == user_id
+    else:
+        where = User.email == payload["sub"]
+
+    row = (await db.execute(select(User.id, User.email, User.name, User.created_at).where(where))).first()
+    if row is None:
+        # The user was deleted after the token was issued
+        raise credentials_exception()
+    principal = Principal(*row)
+    principal_cache.set(principal)
+    return principal
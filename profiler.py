@@ -0,0 +1,354 @@
+from collections import Counter
+from contextvars import ContextVar
+from functools import partial
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from dotenv import load_dotenv
+import hmac
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import os
+
+load_dotenv()
+
+# Off unless enabled. A request is profiled when it sends
+# X-Profile: <PROFILING_TOKEN>, or at random with PROFILING_SAMPLE_RATE.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "30"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "100"))
+
+PROFILE_KINDS = ("wall", "cpu")
+PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_SITE_PACKAGES = "site-packages" + os.sep
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+
+def _thread_cpu_clock(ident: int):
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None  # not available on this platform: wall time only
+
+
+def _cpu_time(clock) -> float:
+    try:
+        return time.clock_gettime(clock)
+    except OSError:
+        return 0.0  # the thread has exited
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    if _SITE_PACKAGES in filename:
+        filename = filename.rpartition(_SITE_PACKAGES)[2]
+    elif filename.startswith(_ROOT):
+        filename = filename[len(_ROOT):]
+    # ';' separates frames in the collapsed format
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _walk(frame, stop) -> tuple:
+    """Frames from `frame` outward, up to and including `stop`; (frames, reached)."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        if frame is stop:
+            return frames, True
+        frame = frame.f_back
+    return frames, False
+
+
+def _await_chain(coro) -> list:
+    """Labels of a suspended coroutine and everything it is awaiting, outermost first."""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            labels.append(f"<await {type(coro).__name__}>")
+            break
+        labels.append(_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) if hasattr(coro, "cr_frame") else getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+def _run_attached(profile, func, *args):
+    ident = threading.get_ident()
+    profile.attach(ident)
+    try:
+        return func(*args)
+    finally:
+        profile.detach(ident)
+
+
+class RequestProfile:
+    """Samples the stacks of one request from a background thread.
+
+    Each tick records where the request is: the event loop's stack while
+    its coroutine runs (including SQLAlchemy's greenlets), the stacks of
+    threads working for it (see `profiled`) or, while it waits, the chain
+    of awaits it is suspended in. Wall time goes to whichever of these was
+    seen; CPU time is the sampled thread's CPU clock since the last tick.
+    """
+
+    def __init__(self, interval: float, max_seconds: float):
+        self.id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.coro = None
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.wall = Counter()  # collapsed stack -> microseconds
+        self.cpu = Counter()
+        self.samples = 0
+        self.loop_thread = threading.get_ident()
+        # While SQLAlchemy runs sync ORM code in a child greenlet, the loop
+        # thread's stack starts there; the rest is in this greenlet's frame
+        self.loop_greenlet = greenlet.getcurrent() if greenlet is not None else None
+        self.threads = {}  # ident -> CPU clock of threads attached to this request
+        self._cpu_seen = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def attach(self, ident: int):
+        clock = _thread_cpu_clock(ident)
+        self._cpu_seen[ident] = _cpu_time(clock) if clock is not None else 0.0
+        self.threads[ident] = clock
+
+    def detach(self, ident: int):
+        self.threads.pop(ident, None)
+
+    def start(self, coro):
+        """Start sampling; `coro` is the request's not yet awaited coroutine."""
+        self.coro = coro
+        self.started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        loop_clock = _thread_cpu_clock(self.loop_thread)
+        self._cpu_seen[self.loop_thread] = _cpu_time(loop_clock) if loop_clock is not None else 0.0
+        last = time.perf_counter()
+        deadline = last + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            now = time.perf_counter()
+            self._sample(int((now - last) * 1e6), loop_clock)
+            last = now
+
+    def _cpu_delta(self, ident: int, clock) -> int:
+        if clock is None:
+            return 0
+        now = _cpu_time(clock)
+        delta = now - self._cpu_seen.get(ident, now)
+        self._cpu_seen[ident] = now
+        return int(delta * 1e6)
+
+    def _record(self, stack: list, wall_us: int, cpu_us: int):
+        key = ";".join(stack)
+        self.wall[key] += wall_us
+        if cpu_us > 0:
+            self.cpu[key] += cpu_us
+
+    def _sample(self, elapsed_us: int, loop_clock):
+        self.samples += 1
+        frames = sys._current_frames()
+        loop_cpu = self._cpu_delta(self.loop_thread, loop_clock)
+        root = self.coro.cr_frame
+        if root is None:
+            return  # finished between ticks
+
+        if self.coro.cr_running:
+            stack, reached = _walk(frames.get(self.loop_thread), root)
+            if not reached and self.loop_greenlet is not None:
+                outer, reached = _walk(self.loop_greenlet.gr_frame, root)
+                stack += outer
+            if reached:
+                self._record([_label(frame.f_code) for frame in reversed(stack)], elapsed_us, loop_cpu)
+            return
+
+        waiting = _await_chain(self.coro)
+        threads = list(self.threads.items())
+        if threads and waiting[-1].startswith("<await"):
+            waiting = waiting[:-1]  # the thread's stack says more than the future
+        for ident, clock in threads:
+            stack, _ = _walk(frames.get(ident), None)
+            labels = []
+            for frame in stack:
+                if frame.f_code is _run_attached.__code__:
+                    break
+                labels.append(_label(frame.f_code))
+            self._record(waiting + labels[::-1], elapsed_us, self._cpu_delta(ident, clock))
+        if not threads:
+            self._record(waiting, elapsed_us, 0)
+
+    def save(self, directory: str, metadata: dict):
+        os.makedirs(directory, exist_ok=True)
+        for kind in PROFILE_KINDS:
+            with open(os.path.join(directory, f"{self.id}.{kind}.folded"), "w") as out:
+                out.write(self.folded(kind))
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as out:
+            json.dump(metadata, out)
+
+    def folded(self, kind: str) -> str:
+        """Collapsed stacks ("frame;frame;frame weight"), weights in microseconds.
+
+        Readable by flamegraph.pl, inferno and speedscope.
+        """
+        stacks = self.wall if kind == "wall" else self.cpu
+        return "".join(f"{stack} {weight}\n" for stack, weight in sorted(stacks.items()))
+
+
+# The profile of the request being handled, if any
+active_profile: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+
+def profiled(func):
+    """Wrap `func` before handing it to a thread so its stacks count toward
+    the profile of the current request. Returns `func` itself when nothing
+    is being profiled."""
+    profile = active_profile.get()
+    if profile is None:
+        return func
+    return partial(_run_attached, profile, func)
+
+
+def _prune(directory: str, keep: int):
+    profiles = sorted(
+        (name for name in os.listdir(directory) if name.endswith(".json")),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+    )
+    for name in profiles[:max(0, len(profiles) - keep)]:
+        profile_id = name[:-len(".json")]
+        for suffix in (".json",) + tuple(f".{kind}.folded" for kind in PROFILE_KINDS):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(directory: str = PROFILING_DIR) -> list:
+    """Metadata of saved profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as source:
+                    profiles.append(json.load(source))
+            except (OSError, ValueError):
+                continue  # pruned while listing
+    return sorted(profiles, key=lambda profile: profile["id"], reverse=True)
+
+
+def read_profile(profile_id: str, kind: str, directory: str = PROFILING_DIR) -> Optional[str]:
+    if not PROFILE_ID.match(profile_id) or kind not in PROFILE_KINDS:
+        return None
+    try:
+        with open(os.path.join(directory, f"{profile_id}.{kind}.folded")) as source:
+            return source.read()
+    except FileNotFoundError:
+        return None
+
+
+class ProfilerMiddleware:
+    """Profiles single requests on demand.
+
+    Triggered by `X-Profile: <token>` or at random with `sample_rate`. The
+    profile is saved under `directory` and its id returned as X-Profile-Id;
+    with `X-Profile-Response: wall` (or `cpu`) as well, a token-triggered
+    request gets the collapsed stacks as its body instead, with the
+    original status in X-Profiled-Status. One request per worker is
+    profiled at a time. Untriggered requests pay for a header lookup and,
+    with a sample rate, one random number.
+    """
+
+    def __init__(self, app, enabled: bool = PROFILING_ENABLED, token: str = PROFILING_TOKEN,
+                 sample_rate: float = PROFILING_SAMPLE_RATE, interval_ms: float = PROFILING_INTERVAL_MS,
+                 max_seconds: float = PROFILING_MAX_SECONDS, directory: str = PROFILING_DIR,
+                 max_profiles: int = PROFILING_MAX_PROFILES):
+        self.app = app
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._busy = False
+
+    def _triggered(self, scope) -> tuple:
+        """(trigger, kind of profile to return in the body) or (None, None)."""
+        if self.token:
+            headers = Headers(scope=scope)
+            supplied = headers.get("x-profile")
+            if supplied is not None and hmac.compare_digest(supplied.encode(), self.token.encode()):
+                kind = headers.get("x-profile-response")
+                return "header", kind if kind in PROFILE_KINDS else None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled", None
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or self._busy:
+            return await self.app(scope, receive, send)
+        trigger, respond_with = self._triggered(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        status = 500
+        profile = RequestProfile(self.interval, self.max_seconds)
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            if respond_with is None:
+                await send(message)
+
+        self._busy = True
+        token = active_profile.set(profile)
+        coro = self.app(scope, receive, send_with_profile_id)
+        profile.start(coro)
+        try:
+            await coro
+        finally:
+            profile.stop()
+            active_profile.reset(token)
+            self._busy = False
+            metadata = {
+                "id": profile.id, "method": scope["method"], "path": scope["path"], "status": status,
+                "trigger": trigger, "duration_ms": round(profile.duration * 1000, 1), "samples": profile.samples,
+            }
+            await run_in_threadpool(self._save, profile, metadata)
+
+        if respond_with is not None:
+            body = profile.folded(respond_with).encode()
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-id", profile.id.encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+
+    def _save(self, profile: RequestProfile, metadata: dict):
+        profile.save(self.directory, metadata)
+        _prune(self.directory, self.max_profiles)
@@ -0,0 +1,124 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from dotenv import load_dotenv
+import logging
+import re
+import time
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Warn when one statement shape runs more than this many times in a request
+DB_QUERY_REPEAT_THRESHOLD = int(os.getenv("DB_QUERY_REPEAT_THRESHOLD", "10"))
+DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "true").lower() in ("1", "true", "yes")
+
+# A parenthesised list of bind placeholders in any paramstyle: (?, ?),
+# (%(id_1)s, %(id_2)s), ($1, $2). Collapsed so IN lists and multi-row
+# VALUES of any length share a shape.
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\([^)]*\)s|\$\d+|:\w+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _WHITESPACE.sub(" ", _PLACEHOLDER_LIST.sub("(?)", statement)).strip()
+
+
+class QueryStats:
+    """Statements run and time spent in the database during one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # seconds
+        self.shapes = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int):
+        """(shape, count) for shapes run more than `threshold` times, most first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+# The stats of the request being handled. Copied into threadpool calls and
+# child tasks, which then add to the same object.
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries():
+    """Collect the statements run inside the block, on any instrumented engine."""
+    stats = QueryStats()
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, started = conn.info["query_started"].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the stack on this (pooled) connection stays paired
+    conn = context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started and started[-1][0] is context.execution_context:
+        started.pop()
+
+
+def instrument_queries(engine):
+    """Count statements on `engine` (a sync Engine or AsyncEngine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class QueryCounterMiddleware:
+    """Reports each request's statements as X-DB-Queries and Server-Timing.
+
+    The headers reflect the statements run before the response started, so
+    a streamed body's queries are not in them; the repeat warning, logged
+    when the request finishes, covers everything.
+    """
+
+    def __init__(self, app, repeat_threshold: int = DB_QUERY_REPEAT_THRESHOLD, headers: bool = DB_QUERY_HEADERS):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.headers:
+                headers = MutableHeaders(scope=message)
+                headers.append("X-DB-Queries", str(stats.count))
+                headers.append("Server-Timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+            await send(message)
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send_with_headers)
+
+        for shape, count in stats.repeated(self.repeat_threshold):
+            logger.warning(
+                "Possible N+1: %s %s ran the same statement %d times: %s",
+                scope["method"], scope["path"], count, shape[:300]
+            )
@@ -0,0 +1,258 @@
+from sqlalchemy import Text, bindparam, cast, delete, func, insert, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from models import Recipe, RecipeIngredient, RecipeImage, Instruction, Ingredient, CategoryEnum
+from image_store import path_sha256
+from image_variants import store_path
+import schema as schema
+
+UPSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+# Changes to any of these mean the search document has to be rebuilt
+SEARCH_FIELDS = {"title", "description", "cuisine", "notes", "instructions"}
+# Changes to these may point at images whose variants still need rendering
+IMAGE_FIELDS = {"featured_image", "additional_images"}
+
+
+def recipe_row(recipe, user_id: Optional[int] = None, exclude_unset: bool = False) -> dict:
+    """Column values for a recipes row from a RecipeCreate or RecipeUpdate."""
+    # mode="json" turns HttpUrl fields into plain strings
+    row = recipe.model_dump(mode="json", exclude={'ingredients', 'instructions'}, exclude_unset=exclude_unset)
+    if row.get('category'):
+        row['category'] = CategoryEnum(row['category'])
+    if user_id is not None:
+        row['user_id'] = user_id
+    return row
+
+
+def image_urls(row: dict) -> list:
+    """Every image URL in a recipe row or update values."""
+    return [row.get("featured_image"), *(row.get("additional_images") or [])]
+
+
+def recipe_image_rows(recipe_id: int, urls) -> list:
+    """recipe_images rows for the stored images among `urls`."""
+    hashes = {path_sha256(path) for path in filter(None, map(store_path, urls))}
+    return [{"recipe_id": recipe_id, "sha256": sha256} for sha256 in sorted(hashes)]
+
+
+async def set_recipe_images(db: AsyncSession, recipe_id: int, urls, replace: bool = False):
+    if replace:
+        await db.execute(delete(RecipeImage).where(RecipeImage.recipe_id == recipe_id))
+    rows = recipe_image_rows(recipe_id, urls)
+    if rows:
+        await db.execute(insert(RecipeImage), rows)
+
+
+def touch_image_recipes(bind: Engine, path: str, scan_urls: bool = False) -> list:
+    """Bump updated_at of every recipe showing the stored image at `path`.
+
+    Their srcset changes once the image's variants exist, so the ETags,
+    Last-Modified and cached bodies derived from updated_at must change
+    too. Recipes are found through recipe_images; `scan_urls` also matches
+    the image URLs of recipes written before that table was kept, which
+    reads the whole table. Returns the ids of the recipes touched.
+    """
+    shown = Recipe.id.in_(select(RecipeImage.recipe_id).where(RecipeImage.sha256 == path_sha256(path)))
+    if scan_urls:
+        pattern = f"%/{path}%"
+        shown = or_(shown, Recipe.featured_image.like(pattern), cast(Recipe.additional_images, Text).like(pattern))
+    stmt = update(Recipe)\
+        .where(shown)\
+        .values(updated_at=func.now())\
+        .returning(Recipe.id)
+    with bind.begin() as conn:
+        return list(conn.scalars(stmt))
+
+
+class ResolvedIngredients:
+    """Ingredient references from a request mapped to ingredient ids."""
+
+    def __init__(self, ids=(), names=None):
+        self.ids = set(ids)          # referenced ids that exist
+        self.names = names or {}     # referenced name -> id
+
+    def id_for(self, item: schema.RecipeIngredientCreate) -> Optional[int]:
+        if item.ingredient_id is not None:
+            return item.ingredient_id if item.ingredient_id in self.ids else None
+        return self.names.get(item.name)
+
+    def ids_for(self, items):
+        return [self.id_for(item) for item in items]
+
+    def missing(self, items):
+        """Describe every reference in `items` that didn't resolve."""
+        missing_ids = sorted({item.ingredient_id for item in items
+                              if item.ingredient_id is not None and item.ingredient_id not in self.ids})
+        missing_names = sorted({item.name for item in items
+                                if item.ingredient_id is None and item.name not in self.names})
+        return [f"id {ingredient_id}" for ingredient_id in missing_ids] + \
+            [f"name {name!r}" for name in missing_names]
+
+    def duplicates(self, items):
+        """Describe every reference in `items` that resolves to an ingredient
+        listed earlier, e.g. the same one by id and by name."""
+        first = {}
+        repeated = []
+        for item, ingredient_id in zip(items, self.ids_for(items)):
+            if ingredient_id is None:
+                continue
+            reference = f"id {item.ingredient_id}" if item.ingredient_id is not None else f"name {item.name!r}"
+            if ingredient_id in first:
+                repeated.append(f"{reference} repeats {first[ingredient_id]}")
+            else:
+                first[ingredient_id] = reference
+        return repeated
+
+
+async def resolve_ingredients(db: AsyncSession, items, create_missing: bool = False) -> ResolvedIngredients:
+    """Look up every ingredient referenced by `items` in one query per kind.
+
+    Ids are checked with a single IN query. Names are looked up the same
+    way, or with `create_missing` upserted on ingredients.name so unknown
+    ones are created and existing ones returned in the same statement.
+    """
+    ids = {item.ingredient_id for item in items if item.ingredient_id is not None}
+    names = {item.name: item.unit for item in items if item.ingredient_id is None}
+
+    known_ids = set()
+    if ids:
+        known_ids = set(await db.scalars(select(Ingredient.id).where(Ingredient.id.in_(ids))))
+
+    known_names = {}
+    if names and create_missing:
+        dialect = UPSERT_DIALECTS[db.bind.dialect.name]
+        stmt = dialect.insert(Ingredient).values([
+            {"name": name, "unit": unit} for name, unit in sorted(names.items())
+        ])
+        # A no-op update instead of DO NOTHING so existing rows are returned too
+        stmt = stmt.on_conflict_do_update(index_elements=[Ingredient.name], set_={"name": stmt.excluded.name})
+        known_names = dict((await db.execute(stmt.returning(Ingredient.name, Ingredient.id))).all())
+    elif names:
+        known_names = dict((await db.execute(
+            select(Ingredient.name, Ingredient.id).where(Ingredient.name.in_(names))
+        )).all())
+
+    return ResolvedIngredients(known_ids, known_names)
+
+
+async def insert_children(db: AsyncSession, recipe_id: int, recipe: schema.RecipeCreate, resolved: ResolvedIngredients):
+    """Insert a recipe's ingredient and instruction rows, one executemany each."""
+    # Core table inserts: ORM bulk inserts leave out None values and split the
+    # executemany wherever rows differ in which keys are set
+    if recipe.ingredients:
+        await db.execute(insert(RecipeIngredient.__table__), [
+            {"recipe_id": recipe_id, "ingredient_id": ingredient_id, "quantity": item.quantity, "notes": item.notes}
+            for item, ingredient_id in zip(recipe.ingredients, resolved.ids_for(recipe.ingredients))
+        ])
+    if recipe.instructions:
+        await db.execute(insert(Instruction.__table__), [
+            {"recipe_id": recipe_id, **item.model_dump()} for item in recipe.instructions
+        ])
+
+
+async def _sync_ingredients(db: AsyncSession, recipe_id: int, items, resolved: ResolvedIngredients) -> bool:
+    table = RecipeIngredient.__table__
+    if resolved.duplicates(items):
+        # Callers reject these first; a dict would keep only the last one
+        raise ValueError("Ingredients listed more than once")
+    desired = {
+        ingredient_id: (item.quantity, item.notes)
+        for item, ingredient_id in zip(items, resolved.ids_for(items))
+    }
+    existing = {
+        ingredient_id: (quantity, notes)
+        for ingredient_id, quantity, notes in await db.execute(
+            select(table.c.ingredient_id, table.c.quantity, table.c.notes).where(table.c.recipe_id == recipe_id)
+        )
+    }
+
+    removed = existing.keys() - desired.keys()
+    added = [
+        {"recipe_id": recipe_id, "ingredient_id": ingredient_id, "quantity": quantity, "notes": notes}
+        for ingredient_id, (quantity, notes) in desired.items() if ingredient_id not in existing
+    ]
+    modified = [
+        {"b_ingredient_id": ingredient_id, "b_quantity": quantity, "b_notes": notes}
+        for ingredient_id, (quantity, notes) in desired.items()
+        if ingredient_id in existing and existing[ingredient_id] != (quantity, notes)
+    ]
+
+    if removed:
+        await db.execute(delete(table).where(table.c.recipe_id == recipe_id, table.c.ingredient_id.in_(removed)))
+    if added:
+        await db.execute(insert(table), added)
+    if modified:
+        await db.execute(
+            update(table)
+            .where(table.c.recipe_id == recipe_id, table.c.ingredient_id == bindparam("b_ingredient_id"))
+            .values(quantity=bindparam("b_quantity"), notes=bindparam("b_notes")),
+            modified
+        )
+    return bool(removed or added or modified)
+
+
+async def _sync_instructions(db: AsyncSession, recipe_id: int, items) -> bool:
+    # Instructions are matched on step_number, so unchanged steps keep their rows
+    table = Instruction.__table__
+    desired = {item.step_number: item.description for item in items}
+    kept = {}
+    removed = []
+    for row in await db.execute(
+        select(table.c.id, table.c.step_number, table.c.description)
+        .where(table.c.recipe_id == recipe_id)
+        .order_by(table.c.step_number, table.c.id)
+    ):
+        if row.step_number in desired and row.step_number not in kept:
+            kept[row.step_number] = row
+        else:
+            removed.append(row.id)
+
+    added = [
+        {"recipe_id": recipe_id, "step_number": step_number, "description": description}
+        for step_number, description in desired.items() if step_number not in kept
+    ]
+    modified = [
+        {"b_id": row.id, "b_description": desired[step_number]}
+        for step_number, row in kept.items() if row.description != desired[step_number]
+    ]
+
+    if removed:
+        await db.execute(delete(table).where(table.c.id.in_(removed)))
+    if added:
+        await db.execute(insert(table), added)
+    if modified:
+        await db.execute(
+            update(table).where(table.c.id == bindparam("b_id")).values(description=bindparam("b_description")),
+            modified
+        )
+    return bool(removed or added or modified)
+
+
+async def update_recipe_diff(db: AsyncSession, recipe: Recipe, values: dict, ingredients=None,
+                             instructions=None, resolved: Optional[ResolvedIngredients] = None) -> set:
+    """Bring `recipe` in line with an update, writing only what differs.
+
+    `values` maps columns to their new values; `ingredients` or
+    `instructions` of None leave those children alone. Returns the names of
+    the columns that changed plus "ingredients"/"instructions" when those
+    did. updated_at is bumped only when the returned set isn't empty.
+    """
+    changed = {key for key, value in values.items() if getattr(recipe, key) != value}
+    if ingredients is not None and await _sync_ingredients(db, recipe.id, ingredients, resolved):
+        changed.add("ingredients")
+    if instructions is not None and await _sync_instructions(db, recipe.id, instructions):
+        changed.add("instructions")
+
+    if changed & IMAGE_FIELDS:
+        current = {field: getattr(recipe, field) for field in IMAGE_FIELDS}
+        await set_recipe_images(db, recipe.id, image_urls({**current, **values}), replace=True)
+    if changed:
+        await db.execute(
+            update(Recipe.__table__)
+            .where(Recipe.__table__.c.id == recipe.id)
+            .values(**{key: values[key] for key in changed if key in values}, updated_at=func.now())
+        )
+    return changed
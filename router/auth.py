@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User
-from utils import verify_password, create_access_token
+from utils import create_access_token
+from hashing import password_hasher
 import schema as schema
 
 router = APIRouter(tags=['Authentication'])
 
 @router.post('/login', response_model=schema.Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # Find user by email
-    user = db.query(User).filter(User.email == user_credentials.username).first()
+    user = await db.scalar(select(User).where(User.email == user_credentials.username))
     
     if not user:
         raise HTTPException(
@@ -19,17 +21,24 @@ def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session =
             detail="Invalid Credentials"
         )
     
-    # Verify password
-    if not verify_password(user_credentials.password, user.password):
+    # Verify password on the bcrypt pool (CPU bound, kept off the event loop)
+    valid, new_hash = await password_hasher.verify_and_update(user_credentials.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid Credentials"
         )
     
-    # Create access token with both email and name
+    # The configured bcrypt cost changed since this hash was made
+    if new_hash:
+        await db.execute(update(User).where(User.id == user.id).values(password=new_hash))
+        await db.commit()
+    
+    # Create access token with email, name and id
     access_token = create_access_token(data={
         "sub": user.email,
-        "name": user.name  # Add the user's name to the token
+        "name": user.name,  # Add the user's name to the token
+        "uid": user.id  # Lets get_current_principal skip the email lookup
     })
     
-    return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
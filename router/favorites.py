@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
-from models import Favorite, Recipe, User
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from database import get_async_db
+from models import Favorite, Recipe
 import schema as schema
-from utils import get_current_user
+from principal import Principal, get_current_principal
+from conditional import conditional_recipe_page
+from pagination import MAX_PAGE_LIMIT
 
 router = APIRouter(
     prefix="/favorites",
@@ -12,16 +15,13 @@ router = APIRouter(
 )
 
 @router.post("/{recipe_id}", status_code=status.HTTP_201_CREATED)
-def add_favorite(
+async def add_favorite(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    # Get user
-    user = db.query(User).filter(User.email == current_user_email).first()
-    
     # Check if recipe exists
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+    recipe = await db.get(Recipe, recipe_id)
     if not recipe:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -29,10 +29,10 @@ def add_favorite(
         )
     
     # Check if already favorited
-    existing_favorite = db.query(Favorite).filter(
-        Favorite.user_id == user.id,
+    existing_favorite = await db.scalar(select(Favorite).where(
+        Favorite.user_id == current_user.id,
         Favorite.recipe_id == recipe_id
-    ).first()
+    ))
     
     if existing_favorite:
         raise HTTPException(
@@ -41,38 +41,45 @@ def add_favorite(
         )
     
     # Create favorite
-    favorite = Favorite(user_id=user.id, recipe_id=recipe_id)
+    favorite = Favorite(user_id=current_user.id, recipe_id=recipe_id)
     db.add(favorite)
     try:
-        db.commit()
+        await db.commit()
         return {"message": "Recipe added to favorites"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not add to favorites"
         )
 
-@router.get("/", response_model=List[schema.RecipeResponse])
-def get_favorites(
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+@router.get("/", response_model=Union[List[schema.RecipeResponse], List[schema.RecipeSummary]])
+async def get_favorites(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=0, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    view: schema.RecipeView = schema.RecipeView.FULL
 ):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    return user.favorite_recipes
+    # Keyed on favorites.recipe_id so the (user_id, recipe_id) unique index serves the page
+    stmt = select(Recipe)\
+        .join(Favorite, Favorite.recipe_id == Recipe.id)\
+        .where(Favorite.user_id == current_user.id)
+    return await conditional_recipe_page(request, response, db, stmt, Favorite.recipe_id, cursor=cursor, skip=skip, limit=limit, view=view)
 
 @router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_favorite(
+async def remove_favorite(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    
-    favorite = db.query(Favorite).filter(
-        Favorite.user_id == user.id,
+    favorite = await db.scalar(select(Favorite).where(
+        Favorite.user_id == current_user.id,
         Favorite.recipe_id == recipe_id
-    ).first()
+    ))
     
     if not favorite:
         raise HTTPException(
@@ -80,5 +87,5 @@ def remove_favorite(
             detail="Recipe not found in favorites"
         )
     
-    db.delete(favorite)
-    db.commit() 
\ No newline at end of file
+    await db.delete(favorite)
+    await db.commit() 
\ No newline at end of file
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+import schema as schema
+from principal import Principal, get_current_principal
+from image_store import add_reference, receive_image, remove_reference
+from image_variants import variant_generator
+
+router = APIRouter(
+    prefix="/images",
+    tags=['Images']
+)
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED, response_model=schema.ImageResponse)
+async def upload_image(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    # The multipart body is read straight off the request stream rather than
+    # through UploadFile, so the file is never spooled twice
+    stored = await receive_image(request)
+    ref_count = await add_reference(db, stored, current_user.id)
+    # Thumbnails are rendered in the background; recipes show them once ready
+    variant_generator.schedule(stored.path)
+    return schema.ImageResponse(
+        sha256=stored.sha256,
+        # Absolute, so it can go straight into a recipe's featured_image
+        url=str(request.url_for("uploads", path=stored.path)),
+        content_type=stored.content_type,
+        size=stored.size,
+        ref_count=ref_count
+    )
+
+@router.delete("/{sha256}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_image(
+    sha256: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    if not await remove_reference(db, sha256, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Image {sha256} not found"
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
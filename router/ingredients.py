@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database import get_async_db
 from models import Ingredient
 import schema as schema
 from utils import get_current_user
+from pagination import MAX_PAGE_LIMIT, paginate, trim_page
 
 router = APIRouter(
     prefix="/ingredients",
@@ -12,18 +14,18 @@ router = APIRouter(
 )
 
 @router.post("/create", status_code=status.HTTP_201_CREATED, response_model=schema.IngredientResponse)
-def create_ingredient(
+async def create_ingredient(
     ingredient: schema.IngredientCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: str = Depends(get_current_user)
 ):
     new_ingredient = Ingredient(**ingredient.dict())
     db.add(new_ingredient)
     try:
-        db.commit()
-        db.refresh(new_ingredient)
+        await db.commit()
+        await db.refresh(new_ingredient)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ingredient already exists"
@@ -31,20 +33,22 @@ def create_ingredient(
     return new_ingredient
 
 @router.get("/", response_model=List[schema.IngredientResponse])
-def get_ingredients(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100
+async def get_ingredients(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None
 ):
-    ingredients = db.query(Ingredient).offset(skip).limit(limit).all()
-    return ingredients
+    ingredients = await db.scalars(paginate(select(Ingredient), Ingredient.id, cursor=cursor, skip=skip, limit=limit))
+    return trim_page(ingredients, response, limit)
 
 @router.get("/{ingredient_id}", response_model=schema.IngredientResponse)
-def get_ingredient(
+async def get_ingredient(
     ingredient_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    ingredient = db.query(Ingredient).filter(Ingredient.id == ingredient_id).first()
+    ingredient = await db.get(Ingredient, ingredient_id)
     if not ingredient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
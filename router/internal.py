@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from dotenv import load_dotenv
+from cache import recipe_cache
+from pool_metrics import pool_stats
+from hashing import password_hasher
+from token_cache import token_cache
+from admission import admission_controller
+from image_variants import variant_generator
+from profiler import list_profiles, read_profile
+import profiler
+import hmac
+import os
+
+load_dotenv()
+
+# Stats endpoints answer only to requests carrying this in X-Internal-Token;
+# while it is unset they don't exist (404)
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+
+router = APIRouter(
+    prefix="/internal",
+    tags=['Internal']
+)
+
+def check_token(supplied: Optional[str], token: str):
+    # 404 rather than 401/403, so the endpoints don't advertise themselves
+    if not token or supplied is None or not hmac.compare_digest(supplied.encode(), token.encode()):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    check_token(x_internal_token, INTERNAL_TOKEN)
+
+def require_profiling_token(x_profile: Optional[str] = Header(None)):
+    # The same header and token that trigger a profile
+    check_token(x_profile, profiler.PROFILING_TOKEN)
+
+@router.get("/cache", dependencies=[Depends(require_internal_token)])
+def get_cache_stats():
+    return recipe_cache.stats()
+
+@router.get("/pool", dependencies=[Depends(require_internal_token)])
+def get_pool_stats():
+    return pool_stats()
+
+@router.get("/hashing", dependencies=[Depends(require_internal_token)])
+def get_hashing_stats():
+    return password_hasher.stats()
+
+@router.get("/tokens", dependencies=[Depends(require_internal_token)])
+def get_token_cache_stats():
+    return token_cache.stats()
+
+@router.get("/admission", dependencies=[Depends(require_internal_token)])
+def get_admission_stats():
+    return admission_controller.stats()
+
+@router.get("/images", dependencies=[Depends(require_internal_token)])
+def get_image_variant_stats():
+    return variant_generator.stats()
+
+@router.get("/profiles", dependencies=[Depends(require_profiling_token)])
+def get_profiles():
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}/{kind}", response_class=PlainTextResponse,
+            dependencies=[Depends(require_profiling_token)])
+def get_profile(profile_id: str, kind: str):
+    """Collapsed stacks of a saved profile; kind is wall or cpu."""
+    folded = read_profile(profile_id, kind)
+    if folded is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(folded)
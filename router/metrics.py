@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import collect, render
+
+router = APIRouter(
+    tags=['Metrics']
+)
+
+# Plain def: with METRICS_DIR set, collecting reads every worker's file
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(render(collect()), media_type="text/plain; version=0.0.4; charset=utf-8")
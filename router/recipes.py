@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from database import get_db
-from models import Recipe, RecipeIngredient, Instruction, User, Ingredient
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from database import engine, get_async_db
+from models import Recipe
 import schema as schema
-from utils import get_current_user
-import shutil
-import os
-from uuid import uuid4
+from principal import Principal, get_current_principal
+from loaders import load_recipe, load_recipes, recipe_version, recipe_versions
+from conditional import cached_recipe_response, conditional_recipe_page, has_conditional_headers, http_date, is_not_modified, not_modified_response, validators
+from cache import CachedRecipe, recipe_cache
+from search import refresh_search_document, remove_search_document, search_recipe_ids
+from pantry import pantry_index
+from facets import RecipeFilters, facet_counts
+from recipe_writes import IMAGE_FIELDS, SEARCH_FIELDS, image_urls, insert_children, recipe_row, resolve_ingredients, set_recipe_images, touch_image_recipes, update_recipe_diff
+from bulk_import import IMPORT_BATCH_SIZE, import_recipes
+from export import EXPORT_BATCH_SIZE, MEDIA_TYPES, stream_export
+from pagination import MAX_PAGE_LIMIT
+from image_variants import variant_generator
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import ValidationError
 
@@ -16,76 +26,53 @@ router = APIRouter(
     tags=['Recipes']
 )
 
+def variants_ready(path: str, widths: List[int]):
+    # Responses rendered while the variants were pending carry a null srcset
+    recipe_cache.invalidate(*touch_image_recipes(engine, path))
+
+variant_generator.add_listener(variants_ready)
+
 @router.post("/create", status_code=status.HTTP_201_CREATED, response_model=schema.RecipeResponse)
 async def create_recipe(
     recipe: schema.RecipeCreate,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+    create_missing_ingredients: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     try:
-        # Get user_id from email
-        user = db.query(User).filter(User.email == current_user_email).first()
-        if not user:
+        # Verify every referenced ingredient up front, reporting all missing ones
+        resolved = await resolve_ingredients(db, recipe.ingredients, create_missing_ingredients)
+        missing = resolved.missing(recipe.ingredients)
+        if missing:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                detail=f"Ingredients not found: {', '.join(missing)}"
             )
-        
-        # Convert recipe data to dict and handle HttpUrl fields
-        recipe_data = recipe.dict(exclude={'ingredients', 'instructions'})
-        
-        # Convert HttpUrl to string for featured_image
-        if recipe_data.get('featured_image'):
-            recipe_data['featured_image'] = str(recipe_data['featured_image'])
-        
-        # Convert HttpUrl list to string list for additional_images
-        if recipe_data.get('additional_images'):
-            recipe_data['additional_images'] = [str(url) for url in recipe_data['additional_images']]
-        
-        # Create recipe
-        db_recipe = Recipe(
-            **recipe_data,
-            user_id=user.id
-        )
-        db.add(db_recipe)
-        db.flush()  # This gets us the recipe.id
-        
-        # Add ingredients through the join table
-        for ingredient_data in recipe.ingredients:
-            # Verify ingredient exists
-            ingredient = db.query(Ingredient).filter(Ingredient.id == ingredient_data.ingredient_id).first()
-            if not ingredient:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Ingredient with id {ingredient_data.ingredient_id} not found"
-                )
-            
-            # Create recipe_ingredient association
-            recipe_ingredient = RecipeIngredient(
-                recipe_id=db_recipe.id,
-                ingredient_id=ingredient_data.ingredient_id,
-                quantity=ingredient_data.quantity,
-                notes=ingredient_data.notes
+        # Checked on resolved ids: an id and a name can be the same ingredient
+        duplicates = resolved.duplicates(recipe.ingredients)
+        if duplicates:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Ingredients listed more than once: {', '.join(duplicates)}"
             )
-            db.add(recipe_ingredient)
         
-        # Add instructions
-        for instruction_data in recipe.instructions:
-            instruction = Instruction(
-                recipe_id=db_recipe.id,
-                **instruction_data.dict()
-            )
-            db.add(instruction)
+        # Create recipe, then its ingredients and instructions in bulk
+        row = recipe_row(recipe, current_user.id)
+        recipe_id = await db.scalar(insert(Recipe).values(**row).returning(Recipe.id))
+        await insert_children(db, recipe_id, recipe, resolved)
+        await set_recipe_images(db, recipe_id, image_urls(row))
         
-        db.commit()
-        db.refresh(db_recipe)
-        return db_recipe
+        await db.run_sync(refresh_search_document, recipe_id)
+        await db.commit()
+        pantry_index.set_recipe(recipe_id, resolved.ids_for(recipe.ingredients))
+        variant_generator.schedule_urls(image_urls(row))
+        return await load_recipe(db, recipe_id)
 
     except HTTPException as he:
-        db.rollback()
+        await db.rollback()
         raise he
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={
@@ -94,7 +81,7 @@ async def create_recipe(
             }
         )
     except ValidationError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail={
@@ -103,7 +90,7 @@ async def create_recipe(
             }
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail={
@@ -112,54 +99,136 @@ async def create_recipe(
             }
         )
 
-@router.get("/", response_model=List[schema.RecipeResponse])
-def get_recipes(
-    db: Session = Depends(get_db),
+@router.post("/import", response_model=schema.ImportReport)
+async def import_recipes_ndjson(
+    request: Request,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    create_missing_ingredients: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Bulk-create recipes from an NDJSON body, one RecipeCreate per line.
+
+    The body is streamed and written in batches; lines that fail are listed
+    in the report and don't stop the rest of the import.
+    """
+    return await import_recipes(db, request.stream(), current_user.id, batch_size, create_missing_ingredients)
+
+@router.get("/", response_model=Union[List[schema.RecipeResponse], List[schema.RecipeSummary]])
+async def get_recipes(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=0, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    view: schema.RecipeView = schema.RecipeView.FULL,
+    filters: RecipeFilters = Depends()
+):
+    stmt = filters.apply(select(Recipe))
+    return await conditional_recipe_page(request, response, db, stmt, Recipe.id, cursor=cursor, skip=skip, limit=limit, view=view)
+
+@router.get("/export")
+async def export_recipes(
+    format: schema.ExportFormat = schema.ExportFormat.NDJSON,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream every recipe with its ingredients and instructions as NDJSON or CSV."""
+    return StreamingResponse(
+        stream_export(db, format, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="recipes.{format.value}"'}
+    )
+
+@router.get("/facets", response_model=schema.RecipeFacets)
+async def get_recipe_facets(
+    db: AsyncSession = Depends(get_async_db),
+    filters: RecipeFilters = Depends()
+):
+    return await facet_counts(db, filters)
+
+@router.get("/search", response_model=List[schema.RecipeResponse])
+async def search_recipes(
+    q: str,
+    db: AsyncSession = Depends(get_async_db),
     skip: int = 0,
     limit: int = 10
 ):
-    recipes = db.query(Recipe).offset(skip).limit(limit).all()
-    return recipes
+    # load_recipes keeps the ranking order from the search index
+    recipe_ids = await db.run_sync(search_recipe_ids, q, skip, limit)
+    return await load_recipes(db, recipe_ids)
 
-@router.get("/my-recipes", response_model=List[schema.RecipeResponse])
-def get_user_recipes(
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+@router.get("/what-can-i-cook", response_model=List[schema.PantryMatch])
+async def what_can_i_cook(
+    ingredient_ids: List[int] = Query(...),
+    max_missing: Optional[int] = None,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    recipes = db.query(Recipe).filter(Recipe.user_id == user.id).all()
-    return recipes
+    await db.run_sync(pantry_index.ensure_loaded)
+    matches = pantry_index.match(ingredient_ids, max_missing=max_missing, limit=limit)
+    recipes = await load_recipes(db, [recipe_id for recipe_id, _ in matches])
+    recipes_by_id = {recipe.id: recipe for recipe in recipes}
+    return [
+        {"recipe": recipes_by_id[recipe_id], "missing_count": len(missing), "missing_ingredient_ids": missing}
+        for recipe_id, missing in matches if recipe_id in recipes_by_id
+    ]
+
+@router.get("/my-recipes", response_model=Union[List[schema.RecipeResponse], List[schema.RecipeSummary]])
+async def get_user_recipes(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=0, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    view: schema.RecipeView = schema.RecipeView.FULL
+):
+    stmt = select(Recipe).where(Recipe.user_id == current_user.id)
+    return await conditional_recipe_page(request, response, db, stmt, Recipe.id, cursor=cursor, skip=skip, limit=limit, view=view)
 
 @router.get("/{recipe_id}", response_model=schema.RecipeResponse)
-def get_recipe(
+async def get_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
+    cached = recipe_cache.get(recipe_id)
+    if cached:
+        return cached_recipe_response(request, cached)
+
+    # Check the client's cached copy before loading any relationships
+    if has_conditional_headers(request):
+        version = (await db.execute(recipe_versions(select(Recipe).where(Recipe.id == recipe_id)))).first()
+        if version:
+            etag, last_modified = validators([version])
+            if is_not_modified(request, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
     # Load recipe with relationships (ingredients and instructions)
-    recipe = db.query(Recipe)\
-        .filter(Recipe.id == recipe_id)\
-        .first()
+    recipe = await load_recipe(db, recipe_id)
     
     if not recipe:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Recipe with id {recipe_id} not found"
         )
-    return recipe
 
-@router.put("/{recipe_id}", response_model=schema.RecipeResponse)
-def update_recipe(
-    recipe_id: int,
-    recipe_update: schema.RecipeCreate,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
-):
-    # Get user
-    user = db.query(User).filter(User.email == current_user_email).first()
-    
+    etag, last_modified = validators([recipe_version(recipe)])
+    cached = CachedRecipe(
+        etag,
+        http_date(last_modified),
+        schema.RecipeResponse.model_validate(recipe, from_attributes=True).model_dump_json().encode()
+    )
+    recipe_cache.set(recipe_id, *cached)
+    return cached_recipe_response(request, cached)
+
+async def _update_recipe(db: AsyncSession, recipe_id: int, user_id: int, values: dict,
+                         ingredients=None, instructions=None, create_missing_ingredients: bool = False):
     # Check recipe exists and belongs to user
-    recipe_query = db.query(Recipe).filter(Recipe.id == recipe_id)
-    recipe = recipe_query.first()
+    recipe = await db.get(Recipe, recipe_id)
     
     if not recipe:
         raise HTTPException(
@@ -167,50 +236,79 @@ def update_recipe(
             detail=f"Recipe with id {recipe_id} not found"
         )
     
-    if recipe.user_id != user.id:
+    if recipe.user_id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to perform requested action"
         )
     
-    # Update recipe basic info
-    recipe_query.update(recipe_update.dict(exclude={'ingredients', 'instructions'}))
-    
-    # Delete existing ingredients and instructions
-    db.query(RecipeIngredient).filter(RecipeIngredient.recipe_id == recipe_id).delete()
-    db.query(Instruction).filter(Instruction.recipe_id == recipe_id).delete()
-    
-    # Add new ingredients
-    for ingredient_data in recipe_update.ingredients:
-        recipe_ingredient = RecipeIngredient(
-            recipe_id=recipe_id,
-            **ingredient_data.dict()
-        )
-        db.add(recipe_ingredient)
+    resolved = None
+    if ingredients is not None:
+        resolved = await resolve_ingredients(db, ingredients, create_missing_ingredients)
+        missing = resolved.missing(ingredients)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Ingredients not found: {', '.join(missing)}"
+            )
+        duplicates = resolved.duplicates(ingredients)
+        if duplicates:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Ingredients listed more than once: {', '.join(duplicates)}"
+            )
     
-    # Add new instructions
-    for instruction_data in recipe_update.instructions:
-        instruction = Instruction(
-            recipe_id=recipe_id,
-            **instruction_data.dict()
-        )
-        db.add(instruction)
+    # Only rows that differ are written; an unchanged save leaves updated_at,
+    # the cache and the indexes alone
+    changed = await update_recipe_diff(db, recipe, values, ingredients, instructions, resolved)
+    if not changed:
+        await db.rollback()
+        return await load_recipe(db, recipe_id)
     
-    db.commit()
-    return recipe_query.first()
+    if changed & SEARCH_FIELDS:
+        await db.run_sync(refresh_search_document, recipe_id)
+    await db.commit()
+    recipe_cache.invalidate(recipe_id)
+    if "ingredients" in changed:
+        pantry_index.set_recipe(recipe_id, resolved.ids_for(ingredients))
+    if changed & IMAGE_FIELDS:
+        variant_generator.schedule_urls(image_urls(values))
+    return await load_recipe(db, recipe_id)
+
+@router.put("/{recipe_id}", response_model=schema.RecipeResponse)
+async def update_recipe(
+    recipe_id: int,
+    recipe_update: schema.RecipeCreate,
+    create_missing_ingredients: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    return await _update_recipe(
+        db, recipe_id, current_user.id, recipe_row(recipe_update),
+        recipe_update.ingredients, recipe_update.instructions, create_missing_ingredients
+    )
+
+@router.patch("/{recipe_id}", response_model=schema.RecipeResponse)
+async def patch_recipe(
+    recipe_id: int,
+    recipe_update: schema.RecipeUpdate,
+    create_missing_ingredients: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    return await _update_recipe(
+        db, recipe_id, current_user.id, recipe_row(recipe_update, exclude_unset=True),
+        recipe_update.ingredients, recipe_update.instructions, create_missing_ingredients
+    )
 
 @router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_recipe(
+async def delete_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    # Get user
-    user = db.query(User).filter(User.email == current_user_email).first()
-    
     # Check recipe exists and belongs to user
-    recipe_query = db.query(Recipe).filter(Recipe.id == recipe_id)
-    recipe = recipe_query.first()
+    recipe = await db.get(Recipe, recipe_id)
     
     if not recipe:
         raise HTTPException(
@@ -218,27 +316,14 @@ def delete_recipe(
             detail=f"Recipe with id {recipe_id} not found"
         )
     
-    if recipe.user_id != user.id:
+    if recipe.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to perform requested action"
         )
     
-    recipe_query.delete(synchronize_session=False)
-    db.commit() 
-
-async def save_image(image: UploadFile) -> str:
-    # Create uploads directory if it doesn't exist
-    UPLOAD_DIR = "uploads/recipes"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(image.filename)[1].lower()
-    unique_filename = f"{uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-    
-    return file_path 
\ No newline at end of file
+    await db.execute(delete(Recipe).where(Recipe.id == recipe_id).execution_options(synchronize_session=False))
+    await db.run_sync(remove_search_document, recipe_id)
+    await db.commit()
+    recipe_cache.invalidate(recipe_id)
+    pantry_index.remove_recipe(recipe_id)
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
+from database import get_async_db
 import schema as schema
-from models import User
-from utils import hash_pass, get_current_user
+from models import User, Recipe
+from cache import recipe_cache
+from pantry import pantry_index
+from search import remove_search_documents
+from image_store import remove_files, remove_user_references
+from hashing import password_hasher
+from utils import revoke_user_tokens
+from principal import Principal, get_current_principal, principal_cache
 
 router = APIRouter(
     prefix="/users",
@@ -12,66 +19,81 @@ router = APIRouter(
 )
 
 @router.post("/create", status_code=status.HTTP_201_CREATED, response_model=schema.UserResponse)
-def create_user(user: schema.UserCreate, db: Session = Depends(get_db)):
-    # Hash the password
-    hashed_password = hash_pass(user.password)
+async def create_user(user: schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # Hash the password on the bcrypt pool (CPU bound, kept off the event loop)
+    hashed_password = await password_hasher.hash(user.password)
     user.password = hashed_password
     
     # Create new user
     new_user = User(**user.dict())
     db.add(new_user)
     try:
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
                           detail="Email already registered")
     return new_user
 
 @router.get("/", response_model=List[schema.UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+async def get_users(db: AsyncSession = Depends(get_async_db)):
+    users = await db.scalars(select(User))
+    return users.all()
 
 @router.get("/me", response_model=schema.UserResponse)
-def get_current_user_info(current_user_email: str = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    return user
+async def get_current_user_info(current_user: Principal = Depends(get_current_principal)):
+    return current_user
 
 @router.get("/{id}", response_model=schema.UserResponse)
-def get_user(id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == id).first()
+async def get_user(id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                           detail=f"User with id: {id} does not exist")
     return user
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(id: int, db: Session = Depends(get_db)):
-    user_query = db.query(User).filter(User.id == id)
-    user = user_query.first()
+async def delete_user(id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, id)
     
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                           detail=f"User with id: {id} does not exist")
     
-    user_query.delete(synchronize_session=False)
-    db.commit()
+    # The user's recipes go with it by cascade; the indexes outside the
+    # recipes table have to be told
+    recipe_ids = (await db.scalars(select(Recipe.id).where(Recipe.user_id == id))).all()
+    unreferenced = await remove_user_references(db, id)
+    await db.execute(delete(User).where(User.id == id).execution_options(synchronize_session=False))
+    await db.run_sync(remove_search_documents, recipe_ids)
+    await db.commit()
+    await remove_files(unreferenced)
+    principal_cache.invalidate(id)
+    revoke_user_tokens(id)
+    recipe_cache.invalidate(*recipe_ids)
+    for recipe_id in recipe_ids:
+        pantry_index.remove_recipe(recipe_id)
 
 @router.put("/{id}", response_model=schema.UserResponse)
-def update_user(id: int, updated_user: schema.UserCreate, db: Session = Depends(get_db)):
-    user_query = db.query(User).filter(User.id == id)
-    user = user_query.first()
+async def update_user(id: int, updated_user: schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, id)
     
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                           detail=f"User with id: {id} does not exist")
     
     update_data = updated_user.dict()
-    update_data["password"] = hash_pass(update_data["password"])
+    password_unchanged, _ = await password_hasher.verify_and_update(update_data["password"], user.password)
+    update_data["password"] = await password_hasher.hash(update_data["password"])
     
-    user_query.update(update_data, synchronize_session=False)
-    db.commit()
+    await db.execute(update(User).where(User.id == id).values(**update_data).execution_options(synchronize_session=False))
+    await db.commit()
+    principal_cache.invalidate(id)
+    if not password_unchanged:
+        revoke_user_tokens(id)
+    # Recipes embed their author, so cached bodies are stale now
+    recipe_cache.invalidate(*(await db.scalars(select(Recipe.id).where(Recipe.user_id == id))).all())
     
-    return user_query.first() 
\ No newline at end of file
+    await db.refresh(user)
+    return user
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, HttpUrl, constr
+from pydantic import BaseModel, HttpUrl, computed_field, constr, model_validator
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from enum import Enum
+from image_variants import srcset
 
 
 class PostBase(BaseModel):
@@ -70,7 +71,19 @@ class RecipeIngredientBase(BaseModel):
 
 
 class RecipeIngredientCreate(RecipeIngredientBase):
-    pass
+    # Reference an existing ingredient by id, or by name; the unit is only
+    # used when the ingredient gets created (create_missing_ingredients)
+    ingredient_id: Optional[int] = None
+    name: Optional[str] = None
+    unit: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_reference(self):
+        if self.ingredient_id is None and not self.name:
+            raise ValueError("Either ingredient_id or name is required")
+        if self.ingredient_id is None and not self.unit:
+            raise ValueError("unit is required when referencing an ingredient by name")
+        return self
 
 
 class RecipeIngredientResponse(RecipeIngredientBase):
@@ -126,6 +139,17 @@ class RecipeBase(BaseModel):
     source: Optional[str] = None
 
 
+def check_unique_children(ingredients, instructions):
+    if ingredients is not None:
+        references = [i.ingredient_id if i.ingredient_id is not None else i.name for i in ingredients]
+        if len(set(references)) != len(references):
+            raise ValueError("Ingredients must not repeat")
+    if instructions is not None:
+        steps = [i.step_number for i in instructions]
+        if len(set(steps)) != len(steps):
+            raise ValueError("Instruction step numbers must be unique")
+
+
 class RecipeCreate(BaseModel):
     title: str
     description: str
@@ -134,13 +158,73 @@ class RecipeCreate(BaseModel):
     total_time: Optional[int] = None
     servings: int
     difficulty: Optional[str] = None
-    category: Optional[str] = None
+    category: Optional[CategoryEnum] = None
     cuisine: Optional[str] = None
     ingredients: List[RecipeIngredientCreate]
     instructions: List[InstructionCreate]
     featured_image: Optional[HttpUrl] = None
     additional_images: Optional[List[HttpUrl]] = None
 
+    @model_validator(mode="after")
+    def check_children(self):
+        check_unique_children(self.ingredients, self.instructions)
+        return self
+
+
+class RecipeUpdate(BaseModel):
+    """Partial recipe for PATCH; only the fields sent are changed."""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    cooking_time: Optional[int] = None
+    prep_time: Optional[int] = None
+    total_time: Optional[int] = None
+    servings: Optional[int] = None
+    difficulty: Optional[str] = None
+    category: Optional[CategoryEnum] = None
+    cuisine: Optional[str] = None
+    ingredients: Optional[List[RecipeIngredientCreate]] = None
+    instructions: Optional[List[InstructionCreate]] = None
+    featured_image: Optional[HttpUrl] = None
+    additional_images: Optional[List[HttpUrl]] = None
+
+    @model_validator(mode="after")
+    def check_children(self):
+        for field in ("title", "cooking_time", "servings", "ingredients", "instructions"):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f"{field} cannot be null")
+        check_unique_children(self.ingredients, self.instructions)
+        return self
+
+
+class RecipeView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class RecipeSummary(BaseModel):
+    id: int
+    title: str
+    featured_image: Optional[str] = None
+    cooking_time: int
+    prep_time: Optional[int] = None
+    total_time: Optional[int] = None
+    category: Optional[CategoryEnum] = None
+    author_name: Optional[str] = None
+    updated_at: datetime
+
+    @computed_field
+    @property
+    def featured_image_srcset(self) -> Optional[Dict[str, str]]:
+        return srcset(self.featured_image, self.updated_at)
+
+    class Config:
+        from_attributes = True
+
 
 class RecipeResponse(RecipeBase):
     id: int
@@ -151,5 +235,56 @@ class RecipeResponse(RecipeBase):
     instructions: List[InstructionResponse]
     user: UserResponse
 
+    # Resized WebP variants that exist so far, as {"320w": url, ...}
+    @computed_field
+    @property
+    def featured_image_srcset(self) -> Optional[Dict[str, str]]:
+        return srcset(self.featured_image, self.updated_at)
+
+    @computed_field
+    @property
+    def additional_images_srcset(self) -> Optional[List[Optional[Dict[str, str]]]]:
+        if self.additional_images is None:
+            return None
+        return [srcset(url, self.updated_at) for url in self.additional_images]
+
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class PantryMatch(BaseModel):
+    recipe: RecipeResponse
+    missing_count: int
+    missing_ingredient_ids: List[int]
+
+
+class FacetCount(BaseModel):
+    value: Union[bool, str]
+    count: int
+
+
+class RecipeFacets(BaseModel):
+    category: List[FacetCount]
+    cuisine: List[FacetCount]
+    difficulty: List[FacetCount]
+    dietary_info: List[FacetCount]
+    is_featured: List[FacetCount]
+
+
+class ImportLineError(BaseModel):
+    line: int
+    errors: List[dict]
+
+
+class ImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportLineError]
+
+
+class ImageResponse(BaseModel):
+    sha256: str
+    url: str
+    content_type: str
+    size: int
+    ref_count: int
@@ -0,0 +1,107 @@
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+import re
+
+# Postgres keeps a weighted tsvector on recipes.search_vector (GIN indexed).
+# Instruction text lives in another table, so the vector is refreshed by the
+# write paths instead of being a generated column.
+PG_REFRESH = text("""
+    UPDATE recipes SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(cuisine, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(notes, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(description, ' ') FROM instructions WHERE recipe_id = recipes.id), ''
+        )), 'D')
+    WHERE id IN :recipe_ids
+""").bindparams(bindparam("recipe_ids", expanding=True))
+
+PG_REBUILD = text(PG_REFRESH.text.replace("WHERE id IN :recipe_ids", ""))
+
+PG_SEARCH = text("""
+    SELECT id FROM recipes, websearch_to_tsquery('english', :q) AS query
+    WHERE search_vector @@ query
+    ORDER BY ts_rank_cd(search_vector, query) DESC, id
+    LIMIT :limit OFFSET :skip
+""")
+
+# SQLite has no tsvector; the recipe_search FTS5 table (see models/recipe.py)
+# keyed by recipe id stands in for it.
+SQLITE_SELECT_DOCUMENT = """
+    SELECT id, title, coalesce(description, ''), coalesce(cuisine, ''), coalesce(notes, ''),
+        coalesce((SELECT group_concat(description, ' ') FROM instructions WHERE recipe_id = recipes.id), '')
+    FROM recipes
+"""
+
+SQLITE_INSERT = "INSERT INTO recipe_search(rowid, title, description, cuisine, notes, instructions)"
+
+SQLITE_SEARCH = text("""
+    SELECT rowid FROM recipe_search
+    WHERE recipe_search MATCH :q
+    ORDER BY bm25(recipe_search, 10.0, 4.0, 4.0, 2.0, 1.0), rowid
+    LIMIT :limit OFFSET :skip
+""")
+
+
+SQLITE_REFRESH = text(f"{SQLITE_INSERT} {SQLITE_SELECT_DOCUMENT} WHERE id IN :recipe_ids")\
+    .bindparams(bindparam("recipe_ids", expanding=True))
+
+SQLITE_REMOVE = text("DELETE FROM recipe_search WHERE rowid IN :recipe_ids")\
+    .bindparams(bindparam("recipe_ids", expanding=True))
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def refresh_search_document(db: Session, recipe_id: int):
+    """Re-index one recipe. Call after its row and instructions are flushed."""
+    refresh_search_documents(db, [recipe_id])
+
+
+def refresh_search_documents(db: Session, recipe_ids):
+    """Re-index a batch of recipes with one statement per table."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if _is_postgres(db):
+        db.execute(PG_REFRESH, {"recipe_ids": recipe_ids})
+        return
+    db.execute(SQLITE_REMOVE, {"recipe_ids": recipe_ids})
+    db.execute(SQLITE_REFRESH, {"recipe_ids": recipe_ids})
+
+
+def remove_search_document(db: Session, recipe_id: int):
+    remove_search_documents(db, [recipe_id])
+
+
+def remove_search_documents(db: Session, recipe_ids):
+    """Drop deleted recipes from the index. Needed on SQLite only: the FTS5
+    table has no foreign key, so cascading deletes don't reach it."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids and not _is_postgres(db):
+        db.execute(SQLITE_REMOVE, {"recipe_ids": recipe_ids})
+
+
+def rebuild_search_index(db: Session):
+    if _is_postgres(db):
+        db.execute(PG_REBUILD)
+        return
+    db.execute(text("DELETE FROM recipe_search"))
+    db.execute(text(f"{SQLITE_INSERT} {SQLITE_SELECT_DOCUMENT}"))
+
+
+def search_recipe_ids(db: Session, q: str, skip: int = 0, limit: int = 10) -> list[int]:
+    """Return recipe ids matching `q`, best match first."""
+    if _is_postgres(db):
+        rows = db.execute(PG_SEARCH, {"q": q, "skip": skip, "limit": limit})
+        return [row[0] for row in rows]
+
+    # Quote each word so user input can't inject FTS5 query syntax
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"' for term in terms)
+    rows = db.execute(SQLITE_SEARCH, {"q": match, "skip": skip, "limit": limit})
+    return [row[0] for row in rows]
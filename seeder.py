@@ -2,10 +2,12 @@ from sqlalchemy.orm import Session
 from database import engine, Base, SessionLocal
 from models import User, Ingredient, Recipe, RecipeIngredient, Instruction, CategoryEnum
 from utils import hash_pass, copy_sample_image
+from search import rebuild_search_index
 import shutil
 import os
 from pathlib import Path
 import json
+import time
 
 def reset_database():
     print("Dropping all tables...")
@@ -86,13 +88,13 @@ def seed_ingredients(db: Session):
     db.commit()
     print("Ingredients seeded successfully")
 
-def setup_sample_images():
-    """Return default image URLs for seeding"""
+def setup_sample_images(db: Session):
+    """Store the bundled sample images and return their URLs for seeding"""
     return {
-        "placeholder": "https://unsplash.com/photos/four-assorted-dishes-on-wooden-surface-I2uJU-5ZIGI",
-        "food": "https://unsplash.com/photos/grilled-fish-cooked-vegetables-and-fork-on-plate-bpPTlXWTOvg",
-        "breakfast": "https://unsplash.com/photos/round-white-ceramic-plate-filled-with-waffle-hrlvr2ZlUNk",
-        "dinner": "https://unsplash.com/photos/white-and-green-ceramic-plates-on-brown-wooden-dining-table-fb0_wj2MZk4"
+        "placeholder": copy_sample_image("pancake-stack.jpg", db),
+        "food": copy_sample_image("pancake-syrup.jpg", db),
+        "breakfast": copy_sample_image("pancake.jpg", db),
+        "dinner": copy_sample_image("pasta-marinara.jpg", db)
     }
 
 def seed_recipes(db: Session, users: list[User]):
@@ -101,7 +103,7 @@ def seed_recipes(db: Session, users: list[User]):
         return
 
     # Get placeholder images
-    images = setup_sample_images()
+    images = setup_sample_images(db)
     
     recipes = {
         # John Doe - Simple home cooking
@@ -323,23 +325,55 @@ def seed_recipes(db: Session, users: list[User]):
                 instruction = Instruction(recipe_id=recipe.id, **inst_data)
                 db.add(instruction)
     
+    db.flush()
+    rebuild_search_index(db)
     db.commit()
     print("Recipes seeded successfully")
 
 if __name__ == "__main__":
+    import argparse
+    from datagen import DEFAULT_INGREDIENTS, GENERATE_BATCH_SIZE, GeneratorOptions, generate
+
+    parser = argparse.ArgumentParser(
+        description="Reset the database and seed it: the sample data by default, "
+                    "or a synthetic dataset of the given size."
+    )
+    parser.add_argument("--users", type=int, help="Generate this many users (generator mode)")
+    parser.add_argument("--recipes", type=int, help="Generate this many recipes (generator mode)")
+    parser.add_argument("--ingredients", type=int, default=DEFAULT_INGREDIENTS)
+    parser.add_argument("--seed", type=int, default=42, help="Same seed, same dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Writer processes; 0 writes in this process")
+    parser.add_argument("--batch-size", type=int, default=GENERATE_BATCH_SIZE)
+    parser.add_argument("--password", default="password123", help="Password of every generated user")
+    args = parser.parse_args()
+
     print("Starting database reset and seeding...")
     reset_database()
-    setup_sample_images()
     
     # Use a single database session for all operations
     db = SessionLocal()
     try:
-        users = seed_users(db)
-        seed_ingredients(db)
-        seed_recipes(db, users)
+        if args.users is not None or args.recipes is not None:
+            # One bcrypt hash shared by every generated user
+            options = GeneratorOptions(
+                seed=args.seed,
+                users=args.users or 0,
+                recipes=args.recipes or 0,
+                ingredients=args.ingredients,
+                batch_size=args.batch_size,
+                password_hash=hash_pass(args.password),
+                images=tuple(setup_sample_images(db).values()),
+            )
+            started = time.perf_counter()
+            generate(engine, options, workers=args.workers)
+            print(f"Generated dataset in {time.perf_counter() - started:.1f}s")
+        else:
+            users = seed_users(db)
+            seed_ingredients(db)
+            seed_recipes(db, users)
         print("Seeding completed!")
     except Exception as e:
         print(f"Error during seeding: {e}")
         db.rollback()
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
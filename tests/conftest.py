@@ -1,10 +1,25 @@
+import os
 import pytest
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+
+# Read when the app is imported below
+os.environ["INTERNAL_TOKEN"] = "test-internal-token"
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
+from sqlalchemy.pool import NullPool
+from database import Base, get_async_db
 from main import app
 from utils import hash_pass
+from search import rebuild_search_index
+from pantry import pantry_index
+from cache import recipe_cache
+from principal import principal_cache
+from token_cache import token_cache
+from admission import admission_controller
+from query_counter import instrument_queries, statement_shape
+from metrics import registry as metrics_registry
 
 # Use SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -14,10 +29,24 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The app talks to the same file through aiosqlite. NullPool because
+# TestClient may run each request on a fresh event loop.
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+instrument_queries(async_engine.sync_engine)
+
 @pytest.fixture
 def session():
     # Create the database
     Base.metadata.create_all(bind=engine)
+    pantry_index.clear()
+    recipe_cache.clear()
+    principal_cache.clear()
+    token_cache.clear()
+    admission_controller.reset()
+    metrics_registry.reset()
     db = TestingSessionLocal()
     try:
         yield db
@@ -28,15 +57,46 @@ def session():
 
 @pytest.fixture
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     yield TestClient(app)
 
+@pytest.fixture
+def app_bind():
+    # Engine behind the app's sessions, for listening to the SQL it emits
+    return async_engine.sync_engine
+
+@pytest.fixture
+def internal_headers():
+    return {"X-Internal-Token": os.environ["INTERNAL_TOKEN"]}
+
+@pytest.fixture
+def max_queries(app_bind):
+    """Fail if the block runs more than `limit` statements in the app.
+
+        with max_queries(3) as statements:
+            client.get("/api/recipes/1")
+    """
+    @contextmanager
+    def check(limit: int):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(app_bind, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(app_bind, "before_cursor_execute", before_cursor_execute)
+        assert len(statements) <= limit, f"{len(statements)} statements, expected at most {limit}:\n" + "\n".join(
+            statement_shape(statement) for statement in statements
+        )
+    return check
+
 @pytest.fixture
 def test_user(client):
     user_data = {
@@ -44,13 +104,13 @@ def test_user(client):
         "password": "password123",
         "name": "Test User"
     }
-    response = client.post("/users/create", json=user_data)
+    response = client.post("/api/users/create", json=user_data)
     assert response.status_code == 201
     return user_data
 
 @pytest.fixture
 def test_user_token(client, test_user):
-    response = client.post("/login", data={
+    response = client.post("/api/login", data={
         "username": test_user["email"],
         "password": test_user["password"]
     })
@@ -63,4 +123,38 @@ def authorized_client(client, test_user_token):
         **client.headers,
         "Authorization": f"Bearer {test_user_token}"
     }
-    return client 
\ No newline at end of file
+    return client 
+
+@pytest.fixture
+def sample_recipes(session):
+    from models import User, Ingredient, Recipe, RecipeIngredient, Instruction
+
+    user = User(email="chef@example.com", password=hash_pass("password123"), name="Chef")
+    ingredients = [Ingredient(name=f"Ingredient {i}", unit="grams") for i in range(3)]
+    session.add(user)
+    session.add_all(ingredients)
+    session.flush()
+
+    recipes = []
+    for i in range(12):
+        recipe = Recipe(
+            title=f"Recipe {i}",
+            description="Sample recipe",
+            cooking_time=10 + i,
+            servings=2,
+            user_id=user.id,
+            ingredients=[
+                RecipeIngredient(ingredient_id=ingredient.id, quantity=1)
+                for ingredient in ingredients
+            ],
+            instructions=[
+                Instruction(step_number=step, description=f"Step {step}")
+                for step in (1, 2)
+            ],
+        )
+        recipes.append(recipe)
+    session.add_all(recipes)
+    session.flush()
+    rebuild_search_index(session)
+    session.commit()
+    return recipes
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from admission import ConcurrencyLimiter, TokenBucket, admission_controller, route_group
+
+def test_route_groups():
+    assert route_group("POST", "/api/login") == "auth"
+    assert route_group("GET", "/api/recipes/export") == "bulk"
+    assert route_group("PATCH", "/api/recipes/3") == "write"
+    assert route_group("GET", "/api/recipes/") == "read"
+    assert route_group("GET", "/api/internal/pool") == "read"
+    assert route_group("GET", "/metrics") == "exempt"
+    assert route_group("GET", "/") == "default"
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+
+def test_concurrency_limiter_queues_until_deadline():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1)
+        assert await limiter.acquire(1) == "ok"
+        waiting = asyncio.ensure_future(limiter.acquire(1))
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert await limiter.acquire(1) == "queue_full"
+        limiter.release()
+        assert await waiting == "ok"
+        assert limiter.in_flight == 1
+        assert await asyncio.ensure_future(limiter.acquire(0.01)) == "timeout"
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def rate_limited(monkeypatch):
+    monkeypatch.setattr(admission_controller, "rate", 1)
+    monkeypatch.setattr(admission_controller, "burst", 2)
+    admission_controller.reset()
+    yield admission_controller
+    admission_controller.reset()
+
+def test_rate_limit_sheds_with_retry_after(client, rate_limited, internal_headers):
+    assert client.get("/api/recipes/").status_code == 200
+    assert client.get("/api/recipes/").status_code == 200
+    response = client.get("/api/recipes/")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    # Internal endpoints are limited like any other client request
+    assert client.get("/api/internal/admission", headers=internal_headers).status_code == 429
+    stats = admission_controller.stats()
+    assert stats["read"]["admitted"] == 2
+    assert stats["read"]["rate_limited"] == 2
+    assert stats["read"]["in_flight"] == 0
+
+def test_group_limit_returns_503_when_queue_is_full(client, monkeypatch):
+    monkeypatch.setattr(admission_controller, "group_limits", {"read": 1})
+    monkeypatch.setattr(admission_controller, "max_queue", 0)
+    admission_controller.reset()
+    admission_controller._limiter("read").in_flight = 1  # a request already running
+
+    response = client.get("/api/recipes/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert admission_controller.stats()["read"]["queue_full"] == 1
+    admission_controller.reset()
+
+def test_per_user_concurrency_limit():
+    from admission import AdmissionController
+
+    async def scenario():
+        controller = AdmissionController(group_limits={}, user_concurrency=1, rate=0)
+        assert await controller.admit("read", "user:1") is None
+        rejected = await controller.admit("write", "user:1")
+        assert rejected.status_code == 429
+        assert await controller.admit("read", "user:2") is None
+        controller.release("read", "user:1")
+        assert await controller.admit("write", "user:1") is None
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["write"]["user_limited"] == 1
+    assert stats["write"]["admitted"] == 1
+
+def test_cancelled_admission_releases_user_slot():
+    from admission import AdmissionController
+
+    async def scenario():
+        controller = AdmissionController(group_limits={"read": 1}, user_concurrency=2, rate=0)
+        assert await controller.admit("read", "user:1") is None
+        queued = asyncio.ensure_future(controller.admit("read", "user:2"))
+        await asyncio.sleep(0)
+        assert controller.user_in_flight == {"user:1": 1, "user:2": 1}
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        controller.release("read", "user:1")
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.user_in_flight == {}
+    assert controller.stats()["read"]["in_flight"] == 0
@@ -1,6 +1,7 @@
 import pytest
 from jose import jwt
 from decouple import config
+import utils
 
 # Get these from environment variables or use defaults
 SECRET_KEY = config('SECRET_KEY', default="your-secret-key-for-testing")
@@ -51,4 +52,54 @@ def test_login_nonexistent_user(client):
         "username": "nonexistent@example.com",
         "password": "password123"
     })
-    assert response.status_code == 403 
\ No newline at end of file
+    assert response.status_code == 403 
+
+def test_login_token_carries_user_id(client, test_user):
+    response = client.post("/api/login", data={
+        "username": test_user["email"],
+        "password": test_user["password"]
+    })
+    # Signed with the app's key, not the legacy SECRET_KEY above
+    payload = jwt.decode(response.json()["access_token"], utils.SECRET_KEY, algorithms=[utils.ALGORITHM])
+    me = client.get("/api/users/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+    assert payload["uid"] == me.json()["id"]
+
+def test_principal_resolved_from_cache(authorized_client, max_queries):
+    assert authorized_client.get("/api/users/me").status_code == 200
+    with max_queries(10) as statements:
+        response = authorized_client.get("/api/users/me")
+        favorites = authorized_client.get("/api/favorites/")
+    assert response.json()["email"] == "test@example.com"
+    assert favorites.status_code == 200
+    assert not any("FROM users" in statement and "JOIN" not in statement for statement in statements)
+
+def test_principal_cache_invalidated_on_user_update(authorized_client):
+    me = authorized_client.get("/api/users/me").json()
+    response = authorized_client.put(f"/api/users/{me['id']}", json={
+        "email": "test@example.com",
+        "password": "password123",
+        "name": "Renamed User"
+    })
+    assert response.status_code == 200
+    assert authorized_client.get("/api/users/me").json()["name"] == "Renamed User"
+
+    assert authorized_client.delete(f"/api/users/{me['id']}").status_code == 204
+    assert authorized_client.get("/api/users/me").status_code == 401
+
+def test_token_claims_served_from_cache(authorized_client, internal_headers):
+    for _ in range(3):
+        assert authorized_client.get("/api/users/me").status_code == 200
+    stats = authorized_client.get("/api/internal/tokens", headers=internal_headers).json()
+    assert stats["entries"] == 1
+    assert stats["hits"] >= 2
+    assert stats["hit_ratio"] > 0
+
+def test_password_change_revokes_tokens(authorized_client, client, test_user):
+    me = authorized_client.get("/api/users/me").json()
+    response = authorized_client.put(f"/api/users/{me['id']}", json={**test_user, "password": "new-password"})
+    assert response.status_code == 200
+    assert authorized_client.get("/api/users/me").status_code == 401
+
+    response = client.post("/api/login", data={"username": test_user["email"], "password": "new-password"})
+    token = response.json()["access_token"]
+    assert client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
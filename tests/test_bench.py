@@ -0,0 +1,57 @@
+import asyncio
+import httpx
+from bench import BenchConfig, Recorder, compare, percentile, run_benchmark
+from main import app
+
+def test_percentile_is_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7.0], 99) == 7
+    assert percentile([], 50) == 0
+
+def test_expected_statuses_are_not_errors():
+    recorder = Recorder()
+    recorder.record("POST /api/favorites/{id}", 1.0, 0.01, 201)
+    recorder.record("POST /api/favorites/{id}", 2.0, 0.01, 400, expected={400})
+    recorder.record("POST /api/favorites/{id}", 3.0, 0.01, 404, expected={400})
+    route = recorder.report()["routes"]["POST /api/favorites/{id}"]
+    assert route["statuses"] == {"201": 1, "400": 1, "404": 1}
+    assert route["errors"] == 1
+
+def test_compare_flags_routes_over_threshold():
+    baseline = {"throughput_rps": 100.0, "routes": {
+        "GET /a": {"p95_ms": 10.0}, "GET /b": {"p95_ms": 10.0}, "GET /gone": {"p95_ms": 1.0},
+    }}
+    report = {"throughput_rps": 95.0, "routes": {
+        "GET /a": {"p95_ms": 10.5}, "GET /b": {"p95_ms": 12.0}, "GET /new": {"p95_ms": 50.0},
+    }}
+    regressions = compare(report, baseline, threshold=0.10)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("GET /b: p95_ms 10.0 -> 12.0")
+    assert compare({**report, "throughput_rps": 80.0}, baseline, threshold=0.10)[-1].startswith("throughput")
+
+def test_benchmark_runs_in_process(client, session, sample_recipes):
+    from models import Favorite
+
+    # Like a datagen database: some favorites exist before the run
+    chef_id = sample_recipes[0].user_id
+    session.add_all([Favorite(user_id=chef_id, recipe_id=recipe.id) for recipe in sample_recipes[::2]])
+    session.commit()
+    config = BenchConfig(
+        concurrency=2, requests=40, users=1, recipes=12, ingredients=3,
+        email_pattern="chef@example.com",
+        mix={"list_recipes": 2, "get_recipe": 2, "search": 1, "toggle_favorite": 1, "create_recipe": 1, "patch_recipe": 1},
+    )
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as bench_client:
+            return await run_benchmark(bench_client, config)
+
+    report = asyncio.run(scenario())
+    assert report["requests"] == 40 + 2  # plus one login per virtual user
+    assert report["errors"] == 0
+    assert "GET /api/recipes/{id}" in report["routes"]
+    route = report["routes"]["GET /api/recipes/{id}"]
+    assert route["p50_ms"] <= route["p95_ms"] <= route["p99_ms"] <= route["max_ms"]
@@ -0,0 +1,85 @@
+import time
+from cache import InMemoryBackend, RedisBackend, RecipeCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip("*"))]
+
+
+def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryBackend(max_bytes=10)
+    backend.set("a", b"1234", ttl=60)
+    backend.set("b", b"1234", ttl=60)
+    assert backend.get("a") == b"1234"
+    backend.set("c", b"1234", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1234"
+    assert backend.size == 8
+
+def test_in_memory_backend_expires_entries():
+    backend = InMemoryBackend()
+    backend.set("a", b"value", ttl=0)
+    assert backend.get("a") is None
+    assert backend.size == 0
+
+def test_recipe_cache_with_redis_backend():
+    cache = RecipeCache(RedisBackend(FakeRedis()), ttl=60)
+    assert cache.get(1) is None
+    cache.set(1, '"etag"', "Sat, 01 Jan 2000 00:00:00 GMT", b'{"id":1}')
+    assert cache.get(1).body == b'{"id":1}'
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+def test_get_recipe_served_from_cache(client, session, sample_recipes, internal_headers):
+    recipe_id = sample_recipes[0].id
+    first = client.get(f"/api/recipes/{recipe_id}")
+    second = client.get(f"/api/recipes/{recipe_id}")
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert first.headers["ETag"] == second.headers["ETag"]
+
+    response = client.get(f"/api/recipes/{recipe_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+
+    stats = client.get("/api/internal/cache", headers=internal_headers).json()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+def test_update_recipe_invalidates_cache(authorized_client, session):
+    from models import Ingredient
+
+    session.add(Ingredient(name="Flour", unit="cups"))
+    session.commit()
+    recipe_data = {
+        "title": "Bread",
+        "description": "Plain loaf",
+        "cooking_time": 40,
+        "servings": 4,
+        "ingredients": [{"ingredient_id": 1, "quantity": 3}],
+        "instructions": [{"step_number": 1, "description": "Bake"}]
+    }
+    recipe_id = authorized_client.post("/api/recipes/create", json=recipe_data).json()["id"]
+    assert authorized_client.get(f"/api/recipes/{recipe_id}").json()["title"] == "Bread"
+
+    response = authorized_client.put(f"/api/recipes/{recipe_id}", json={**recipe_data, "title": "Rye Bread"})
+    assert response.status_code == 200
+    assert authorized_client.get(f"/api/recipes/{recipe_id}").json()["title"] == "Rye Bread"
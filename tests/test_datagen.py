@@ -0,0 +1,49 @@
+import random
+from sqlalchemy import func, select
+from database import Base
+from datagen import GeneratorOptions, generate, power_law_index
+from models import Favorite, Recipe, RecipeIngredient, User
+
+OPTIONS = GeneratorOptions(seed=7, users=40, recipes=300, ingredients=50, batch_size=64, password_hash="x")
+
+def snapshot(session):
+    return [
+        session.execute(select(Recipe.id, Recipe.title, Recipe.user_id, Recipe.category, Recipe.created_at).order_by(Recipe.id)).all(),
+        session.execute(select(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id).order_by(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id)).all(),
+        session.execute(select(Favorite.user_id, Favorite.recipe_id).order_by(Favorite.user_id, Favorite.recipe_id)).all(),
+    ]
+
+def regenerate(session, options):
+    engine = session.get_bind()
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    generate(engine, options, log=lambda message: None)
+    return snapshot(session)
+
+def test_generate_writes_requested_rows(session):
+    counts = generate(session.get_bind(), OPTIONS, log=lambda message: None)
+
+    assert counts["users"] == session.scalar(select(func.count()).select_from(User)) == 40
+    assert counts["recipes"] == session.scalar(select(func.count()).select_from(Recipe)) == 300
+    assert counts["favorites"] == session.scalar(select(func.count()).select_from(Favorite)) > 0
+    per_recipe = session.execute(
+        select(func.count()).select_from(RecipeIngredient).group_by(RecipeIngredient.recipe_id)
+    ).scalars().all()
+    assert len(per_recipe) == 300
+    assert min(per_recipe) >= 2
+    # Owners are skewed: the busiest user writes far more than an even share
+    busiest = session.scalar(select(func.count()).select_from(Recipe).group_by(Recipe.user_id).order_by(func.count().desc()).limit(1))
+    assert busiest > 300 / 40 * 3
+
+def test_generate_is_deterministic_per_seed(session):
+    first = regenerate(session, OPTIONS)
+    assert regenerate(session, OPTIONS) == first
+    assert regenerate(session, OPTIONS._replace(seed=8)) != first
+
+def test_power_law_index_is_skewed():
+    rng = random.Random(1)
+    samples = [power_law_index(rng, 1000) for _ in range(10000)]
+    assert min(samples) == 0 and max(samples) < 1000
+    # The ten most popular of a thousand take most of the draws
+    assert sum(sample < 10 for sample in samples) > len(samples) / 2
@@ -35,4 +35,17 @@ def test_remove_favorite(authorized_client, test_recipe):
 
 def test_remove_nonexistent_favorite(authorized_client):
     response = authorized_client.delete("/favorites/99999")
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404 
+
+def test_get_favorites_query_count_is_constant(authorized_client, session, max_queries, sample_recipes):
+    from models import Favorite, User
+
+    user = session.query(User).filter(User.email == "test@example.com").first()
+    session.add_all([Favorite(user_id=user.id, recipe_id=recipe.id) for recipe in sample_recipes])
+    session.commit()
+
+    with max_queries(4):
+        response = authorized_client.get("/api/favorites/")
+
+    assert response.status_code == 200
+    assert len(response.json()) == len(sample_recipes)
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from hashing import PasswordHasher
+from utils import BCRYPT_ROUNDS
+
+def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(hasher._run(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as excinfo:
+            await hasher.hash("password123")
+        release.set()
+        await blocked
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "1"
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["pending"] == 0
+
+def test_login_rehashes_password_with_changed_cost(client, session):
+    from models import User
+
+    old_rounds = 4 if BCRYPT_ROUNDS != 4 else 5
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=old_rounds).hash("password123")
+    session.add(User(email="old@example.com", password=old_hash, name="Old Hash"))
+    session.commit()
+
+    response = client.post("/api/login", data={"username": "old@example.com", "password": "password123"})
+    assert response.status_code == 200
+
+    session.expire_all()
+    new_hash = session.query(User).filter(User.email == "old@example.com").one().password
+    assert new_hash != old_hash
+    assert new_hash.split("$")[2] == f"{BCRYPT_ROUNDS:02d}"
+
+    # The upgraded hash still logs in, and is left alone this time
+    response = client.post("/api/login", data={"username": "old@example.com", "password": "password123"})
+    assert response.status_code == 200
+    session.expire_all()
+    assert session.query(User).filter(User.email == "old@example.com").one().password == new_hash
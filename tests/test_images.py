@@ -0,0 +1,225 @@
+import os
+import pytest
+import image_store
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from recipe_writes import touch_image_recipes
+from image_variants import IMAGE_VARIANT_WIDTHS, VariantGenerator, render_variants, srcset, variant_generator
+from router import recipes as recipes_router
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "IMAGE_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+def stored_files(upload_dir):
+    return [name for _, _, files in os.walk(upload_dir) for name in files]
+
+def test_upload_same_bytes_is_stored_once(authorized_client, upload_dir):
+    first = authorized_client.post("/api/images/upload", files={"file": ("a.png", PNG, "image/png")})
+    second = authorized_client.post("/api/images/upload", files={"file": ("b.bin", PNG, "application/octet-stream")})
+    assert first.status_code == 201
+    assert second.status_code == 201
+
+    image = second.json()
+    assert image["sha256"] == first.json()["sha256"]
+    assert image["content_type"] == "image/png"
+    assert image["size"] == len(PNG)
+    assert image["ref_count"] == 2
+    assert image["url"] == f"http://testserver/uploads/recipes/{image['sha256'][:2]}/{image['sha256']}.png"
+    assert stored_files(upload_dir) == [f"{image['sha256']}.png"]
+
+def test_delete_removes_file_with_last_reference(authorized_client, upload_dir):
+    for _ in range(2):
+        image = authorized_client.post("/api/images/upload", files={"file": ("a.png", PNG, "image/png")}).json()
+    sha256 = image["sha256"]
+    # A variant goes with the original
+    (upload_dir / image_store.variant_path(f"{sha256[:2]}/{sha256}.png", 320)).write_bytes(b"webp")
+
+    assert authorized_client.delete(f"/api/images/{sha256}").status_code == 204
+    assert len(stored_files(upload_dir)) == 2
+    assert authorized_client.delete(f"/api/images/{sha256}").status_code == 204
+    assert stored_files(upload_dir) == []
+    assert authorized_client.delete(f"/api/images/{sha256}").status_code == 404
+
+def test_deleting_a_user_drops_its_references(authorized_client, session, upload_dir):
+    for _ in range(2):
+        shared = authorized_client.post("/api/images/upload", files={"file": ("a.png", PNG, "image/png")}).json()
+    own = authorized_client.post("/api/images/upload", files={"file": ("b.png", PNG + b"\x01", "image/png")}).json()
+    # Also stored by a script, with no owner
+    session.execute(text("INSERT INTO image_references (sha256) VALUES (:sha256)"), {"sha256": shared["sha256"]})
+    session.execute(text("UPDATE images SET ref_count = ref_count + 1 WHERE sha256 = :sha256"), {"sha256": shared["sha256"]})
+    session.commit()
+
+    assert authorized_client.delete("/api/users/1").status_code == 204
+    counts = dict(session.execute(text("SELECT sha256, ref_count FROM images")).all())
+    assert counts == {shared["sha256"]: 1}
+    assert session.execute(text("SELECT count(*) FROM image_references")).scalar() == 1
+    assert stored_files(upload_dir) == [f"{shared['sha256']}.png"]
+
+def test_upload_rejects_non_images_and_oversized_files(authorized_client, upload_dir, monkeypatch):
+    response = authorized_client.post("/api/images/upload", files={"file": ("a.png", b"not an image", "image/png")})
+    assert response.status_code == 415
+
+    monkeypatch.setattr(image_store, "IMAGE_MAX_BYTES", 32)
+    monkeypatch.setattr(image_store, "WRITE_CHUNK_BYTES", 16)
+    response = authorized_client.post("/api/images/upload", files={"file": ("a.png", PNG, "image/png")})
+    assert response.status_code == 413
+    # Nothing is left behind, not even the temp file
+    assert stored_files(upload_dir) == []
+
+def test_upload_rejects_oversized_content_length_before_reading(authorized_client, upload_dir, monkeypatch):
+    monkeypatch.setattr(image_store, "MULTIPART_OVERHEAD_BYTES", 0)
+    monkeypatch.setattr(image_store, "IMAGE_MAX_BYTES", 32)
+    response = authorized_client.post("/api/images/upload", files={"file": ("a.png", PNG, "image/png")})
+    assert response.status_code == 413
+    assert stored_files(upload_dir) == []
+
+def test_srcset_lists_only_generated_variants(upload_dir):
+    (upload_dir / "ab").mkdir()
+    (upload_dir / "ab" / "abcd_w320.webp").write_bytes(b"webp")
+
+    assert srcset("http://cdn.example.com/uploads/recipes/ab/abcd.jpg?v=1") == {
+        "320w": "http://cdn.example.com/uploads/recipes/ab/abcd_w320.webp"
+    }
+    assert srcset("/uploads/recipes/ab/other.jpg") is None
+    assert srcset("https://unsplash.com/photos/abcd.jpg") is None
+    assert srcset(None) is None
+
+def test_srcset_checks_disk_only_after_the_recipe_changes(upload_dir, monkeypatch):
+    checks = []
+    exists = os.path.exists
+    monkeypatch.setattr(os.path, "exists", lambda path: checks.append(path) or exists(path))
+    url = "/uploads/recipes/ab/abcd.jpg"
+    updated_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    assert srcset(url, updated_at) is None
+    assert len(checks) == len(IMAGE_VARIANT_WIDTHS)
+    (upload_dir / "ab").mkdir()
+    (upload_dir / "ab" / "abcd_w320.webp").write_bytes(b"webp")
+    # Pending or never rendered: answered from memory
+    assert srcset(url, updated_at) is None
+    assert len(checks) == len(IMAGE_VARIANT_WIDTHS)
+    # Rendered by another worker, which bumped the recipe's updated_at
+    assert srcset(url, datetime.now(timezone.utc)) == {"320w": "/uploads/recipes/ab/abcd_w320.webp"}
+    assert len(checks) == 2 * len(IMAGE_VARIANT_WIDTHS)
+
+def test_recipe_image_changes_schedule_variants(authorized_client, upload_dir, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(variant_generator, "schedule", lambda path: scheduled.append(path) or True)
+    (upload_dir / "ab").mkdir()
+    (upload_dir / "ab" / "abcd_w640.webp").write_bytes(b"webp")
+    image = "http://testserver/uploads/recipes/ab/abcd.jpg"
+
+    response = authorized_client.post("/api/recipes/create", json={
+        "title": "Toast",
+        "description": "Buttered",
+        "cooking_time": 5,
+        "servings": 1,
+        "featured_image": image,
+        "ingredients": [],
+        "instructions": [{"step_number": 1, "description": "Toast it"}]
+    })
+    assert response.status_code == 201
+    recipe = response.json()
+    assert scheduled == ["ab/abcd.jpg"]
+    assert recipe["featured_image_srcset"] == {"640w": "http://testserver/uploads/recipes/ab/abcd_w640.webp"}
+
+    # Only saves that touch the images queue work
+    authorized_client.patch(f"/api/recipes/{recipe['id']}", json={"servings": 2})
+    authorized_client.patch(f"/api/recipes/{recipe['id']}", json={"additional_images": [image.replace("abcd", "ef01")]})
+    assert scheduled == ["ab/abcd.jpg", "ab/ef01.jpg"]
+
+    summaries = authorized_client.get("/api/recipes/", params={"view": "summary"}).json()
+    assert summaries[0]["featured_image_srcset"] == recipe["featured_image_srcset"]
+
+def test_render_variants_downscales_to_webp(upload_dir):
+    from PIL import Image as PILImage
+    (upload_dir / "ab").mkdir()
+    PILImage.new("RGB", (800, 400), "orange").save(upload_dir / "ab" / "abcd.jpg", "JPEG")
+
+    assert render_variants(str(upload_dir), "ab/abcd.jpg", [320, 640, 1280], 80) == [320, 640]
+    with PILImage.open(upload_dir / "ab" / "abcd_w320.webp") as variant:
+        assert variant.format == "WEBP"
+        assert variant.size == (320, 160)
+
+def test_listeners_hear_about_new_variants(upload_dir):
+    generator = VariantGenerator(workers=1, widths=[320])
+    heard = []
+    generator.add_listener(lambda path, widths: heard.append((path, widths)))
+    for outcome in ([320], [], RuntimeError("corrupt")):
+        future = Future()
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        else:
+            future.set_result(outcome)
+        generator._done("ab/abcd.jpg", future)
+    # Images too small to resize and failures change nothing
+    assert heard == [("ab/abcd.jpg", [320])]
+    assert (generator.completed, generator.failed) == (2, 1)
+    # Recorded, so srcset needs no file check
+    assert srcset("/uploads/recipes/ab/abcd.jpg") == {"320w": "/uploads/recipes/ab/abcd_w320.webp"}
+
+def test_finished_variants_refresh_recipe_validators(authorized_client, session, upload_dir, monkeypatch):
+    monkeypatch.setattr(variant_generator, "schedule", lambda path: True)
+    monkeypatch.setattr(recipes_router, "engine", session.get_bind())
+    image = "http://testserver/uploads/recipes/ab/abcd.jpg"
+    for title, images in (("Toast", {"featured_image": image}), ("Jam", {"additional_images": [image]}), ("Tea", {})):
+        response = authorized_client.post("/api/recipes/create", json={
+            "title": title,
+            "description": "Breakfast",
+            "cooking_time": 5,
+            "servings": 1,
+            "ingredients": [],
+            "instructions": [],
+            **images
+        })
+        assert response.status_code == 201
+    # Far enough back that the bump below is visible at SQLite's one-second resolution
+    session.execute(text("UPDATE recipes SET updated_at = '2020-01-01 00:00:00'"))
+    session.commit()
+
+    before = authorized_client.get("/api/recipes/1")
+    assert before.json()["featured_image_srcset"] is None
+    (upload_dir / "ab").mkdir()
+    (upload_dir / "ab" / "abcd_w320.webp").write_bytes(b"webp")
+    finished = Future()
+    finished.set_result([320])
+    variant_generator._done("ab/abcd.jpg", finished)
+
+    after = authorized_client.get("/api/recipes/1", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.json()["featured_image_srcset"] == {"320w": "http://testserver/uploads/recipes/ab/abcd_w320.webp"}
+    touched = session.execute(text("SELECT id FROM recipes WHERE updated_at > '2020-01-01 00:00:00' ORDER BY id"))
+    assert touched.scalars().all() == [1, 2]
+
+def test_recipe_images_track_saves(authorized_client, session, upload_dir, monkeypatch):
+    monkeypatch.setattr(variant_generator, "schedule", lambda path: True)
+    image = "http://testserver/uploads/recipes/ab/abcd.jpg"
+    response = authorized_client.post("/api/recipes/create", json={
+        "title": "Toast",
+        "description": "Breakfast",
+        "cooking_time": 5,
+        "servings": 1,
+        "featured_image": image,
+        "additional_images": [image, "https://unsplash.com/photos/ef01.jpg"],
+        "ingredients": [],
+        "instructions": []
+    })
+    recipe_id = response.json()["id"]
+    tracked = lambda: session.execute(text("SELECT sha256 FROM recipe_images ORDER BY sha256")).scalars().all()
+    assert tracked() == ["abcd"]
+
+    authorized_client.patch(f"/api/recipes/{recipe_id}", json={"additional_images": [image.replace("abcd", "ef01")]})
+    assert tracked() == ["abcd", "ef01"]
+    authorized_client.patch(f"/api/recipes/{recipe_id}", json={"featured_image": None})
+    assert tracked() == ["ef01"]
+
+    # Recipes saved before recipe_images existed are only found by the URL scan
+    session.execute(text("DELETE FROM recipe_images"))
+    session.commit()
+    assert touch_image_recipes(session.get_bind(), "ab/ef01.jpg") == []
+    assert touch_image_recipes(session.get_bind(), "ab/ef01.jpg", scan_urls=True) == [recipe_id]
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+from metrics import MetricsRegistry, merge, remove_stale, render
+
+def histogram(buckets, count, total):
+    return {"buckets": buckets, "count": count, "sum": total}
+
+def test_metrics_use_route_templates(client, sample_recipes):
+    for recipe in sample_recipes[:3]:
+        assert client.get(f"/api/recipes/{recipe.id}").status_code == 200
+    assert client.get("/api/recipes/999999").status_code == 404
+    assert client.get("/no-such-page").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/recipes/{recipe_id}",status="200"} 3' in body
+    assert 'http_requests_total{method="GET",route="/api/recipes/{recipe_id}",status="404"} 1' in body
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/recipes/{recipe_id}",le="+Inf"} 4' in body
+    assert "# TYPE http_requests_in_flight gauge" in body
+    assert 'db_pool_checkouts_total{pool="api"}' in body
+    # Two misses fill the cache; the third recipe was read once
+    assert 'cache_hit_ratio{cache="recipe"} 0.0' in body
+
+def test_merge_sums_workers_and_drops_gauges_of_exited_ones():
+    def worker(requests, in_flight, buckets):
+        return {
+            "http_requests_total": {"type": "counter", "help": "Requests.", "samples": [[{"route": "/a"}, requests]]},
+            "http_requests_in_flight": {"type": "gauge", "help": "In flight.", "samples": [[{"group": "read"}, in_flight]]},
+            "http_request_duration_seconds": {"type": "histogram", "help": "Latency.", "samples": [
+                [{"route": "/a"}, histogram(buckets, requests, 0.5 * requests)]
+            ]},
+        }
+
+    merged = merge([
+        (True, worker(3, 2, {"0.1": 1, "+Inf": 3})),
+        (False, worker(4, 5, {"0.1": 4, "+Inf": 4})),
+    ])
+    assert merged["http_requests_total"]["samples"] == [[{"route": "/a"}, 7]]
+    assert merged["http_requests_in_flight"]["samples"] == [[{"group": "read"}, 2]]
+    assert merged["http_request_duration_seconds"]["samples"] == [
+        [{"route": "/a"}, histogram({"0.1": 5, "+Inf": 7}, 7, 3.5)]
+    ]
+
+    text = render(merged)
+    assert 'http_request_duration_seconds_bucket{route="/a",le="0.1"} 5' in text
+    assert 'http_request_duration_seconds_count{route="/a"} 7' in text
+
+def test_remove_stale_keeps_running_workers(tmp_path):
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_pid = int(exited.stdout)
+    (tmp_path / f"{dead_pid}.json").write_text("{}")
+    (tmp_path / f"{dead_pid}.json.tmp").write_text("{")
+    MetricsRegistry().flush(str(tmp_path))
+
+    remove_stale(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == [f"{os.getpid()}.json"]
@@ -0,0 +1,68 @@
+import importlib.util
+import os
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, inspect, text
+
+VERSIONS = os.path.join(os.path.dirname(__file__), os.pardir, "alembic", "versions")
+
+def load_revision(filename):
+    spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(VERSIONS, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def upgrade(conn, *filenames):
+    with Operations.context(MigrationContext.configure(conn)):
+        for filename in filenames:
+            load_revision(filename).upgrade()
+
+def legacy_database(tmp_path):
+    """Tables as create_all made them before search and facet indexes existed."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE recipes (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, description TEXT, "
+            "cooking_time INTEGER NOT NULL, total_time INTEGER, servings INTEGER NOT NULL, difficulty VARCHAR, "
+            "category VARCHAR, cuisine VARCHAR, calories_per_serving INTEGER, is_featured BOOLEAN, "
+            "dietary_info VARCHAR, notes TEXT, user_id INTEGER NOT NULL)"
+        ))
+        conn.execute(text("CREATE TABLE instructions (id INTEGER PRIMARY KEY, recipe_id INTEGER, description TEXT)"))
+        conn.execute(text(
+            "INSERT INTO recipes (id, title, description, cooking_time, servings, user_id) "
+            "VALUES (1, 'Miso Soup', 'Warming', 10, 2, 1), (2, 'Lemon Tart', 'Sharp', 60, 8, 1)"
+        ))
+        conn.execute(text("INSERT INTO instructions (recipe_id, description) VALUES (1, 'Whisk in the dashi')"))
+    return engine
+
+def test_search_migration_adds_and_backfills_index(tmp_path):
+    engine = legacy_database(tmp_path)
+    with engine.begin() as conn:
+        upgrade(conn, "3f9c2a1d7b10_recipe_search.py")
+    with engine.begin() as conn:
+        # Running it again changes nothing
+        upgrade(conn, "3f9c2a1d7b10_recipe_search.py")
+        assert "search_vector" in {column["name"] for column in inspect(conn).get_columns("recipes")}
+        matches = conn.execute(text("SELECT rowid FROM recipe_search WHERE recipe_search MATCH 'dashi'")).all()
+        assert matches == [(1,)]
+        assert conn.execute(text("SELECT count(*) FROM recipe_search")).scalar() == 2
+
+def test_index_migration_creates_facet_indexes(tmp_path):
+    engine = legacy_database(tmp_path)
+    with engine.begin() as conn:
+        upgrade(conn, "3f9c2a1d7b10_recipe_search.py", "8b2e4d6a9c31_recipe_facet_indexes.py")
+        upgrade(conn, "8b2e4d6a9c31_recipe_facet_indexes.py")
+        names = {index["name"] for index in inspect(conn).get_indexes("recipes")}
+        assert {"ix_recipes_cuisine", "ix_recipes_dietary_info", "ix_recipes_user_id_id"} <= names
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT id FROM recipes WHERE user_id = 1 ORDER BY id")).all()
+        assert "ix_recipes_user_id_id" in " ".join(row[-1] for row in plan)
+        assert "ix_instructions_recipe_id" in {index["name"] for index in inspect(conn).get_indexes("instructions")}
+
+def test_recipe_images_migration_creates_table(tmp_path):
+    engine = legacy_database(tmp_path)
+    migrations = ("3f9c2a1d7b10_recipe_search.py", "8b2e4d6a9c31_recipe_facet_indexes.py", "5d1a7c3e8f42_recipe_images.py")
+    with engine.begin() as conn:
+        upgrade(conn, *migrations)
+        upgrade(conn, "5d1a7c3e8f42_recipe_images.py")
+        assert {column["name"] for column in inspect(conn).get_columns("recipe_images")} == {"recipe_id", "sha256"}
+        assert "ix_recipe_images_sha256" in {index["name"] for index in inspect(conn).get_indexes("recipe_images")}
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from pool_metrics import InstrumentedQueuePool, Histogram, instrument_pool, pool_registry, pool_stats
+
+
+@pytest.fixture
+def pooled_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    instrument_pool(engine, "test")
+    yield engine
+    pool_registry.pop("test", None)
+    engine.dispose()
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 5))
+    for value in (0.5, 2, 10):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 1, "5": 2, "+Inf": 3}
+    assert snapshot["count"] == 3
+    assert snapshot["sum"] == 12.5
+
+def test_pool_metrics_track_checkouts_overflow_and_timeouts(pooled_engine):
+    first = pooled_engine.connect()
+    second = pooled_engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        pooled_engine.connect()
+
+    stats = pool_stats()["test"]
+    assert stats["checked_out"] == 2
+    assert stats["overflow_events"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds"]["count"] == 2
+    assert stats["config"]["pool_size"] == 1
+
+    first.close()
+    second.close()
+    pooled_engine.dispose()
+    stats = pool_stats()["test"]
+    assert stats["checkins"] == 2
+    assert stats["connection_lifetime_seconds"]["count"] >= 1
+
+def test_pool_stats_endpoint(client, internal_headers):
+    assert client.get("/api/internal/pool").status_code == 404
+    assert client.get("/api/internal/pool", headers={"X-Internal-Token": "guess"}).status_code == 404
+    response = client.get("/api/internal/pool", headers=internal_headers)
+    assert response.status_code == 200
+    assert {"api", "sync"} <= set(response.json())
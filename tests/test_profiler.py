@@ -0,0 +1,84 @@
+import asyncio
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.util import greenlet_spawn
+from profiler import ProfilerMiddleware, list_profiles, profiled, read_profile
+
+def spin(seconds):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+def profiling_app(directory, **options):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        spin(0.05)
+        await asyncio.sleep(0.05)
+        return {"done": True}
+
+    @app.get("/offloaded")
+    async def offloaded():
+        # bcrypt's pool and SQLAlchemy's greenlets, in miniature
+        await asyncio.get_running_loop().run_in_executor(None, profiled(spin), 0.05)
+        await greenlet_spawn(spin, 0.05)
+        return {"done": True}
+
+    options = {"enabled": True, "token": "secret", "interval_ms": 1, "directory": str(directory), **options}
+    app.add_middleware(ProfilerMiddleware, **options)
+    return TestClient(app)
+
+def stacks_with(folded, name):
+    return [line for line in folded.splitlines() if f";{name} (" in line]
+
+def test_profile_is_returned_and_saved(tmp_path):
+    client = profiling_app(tmp_path)
+    response = client.get("/slow", headers={"X-Profile": "secret", "X-Profile-Response": "wall"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert stacks_with(response.text, "spin")
+    assert any(line.rsplit(" ", 1)[0].split(";")[-1].startswith("<await") for line in response.text.splitlines())
+    for line in response.text.splitlines():
+        stack, weight = line.rsplit(" ", 1)
+        assert stack and int(weight) > 0
+
+    [saved] = list_profiles(str(tmp_path))
+    assert saved["id"] == response.headers["X-Profile-Id"]
+    assert (saved["path"], saved["status"], saved["trigger"]) == ("/slow", 200, "header")
+    assert read_profile(saved["id"], "wall", str(tmp_path)) == response.text
+    assert read_profile("../etc/passwd", "wall", str(tmp_path)) is None
+
+def test_untriggered_requests_are_not_profiled(tmp_path):
+    client = profiling_app(tmp_path)
+    assert "X-Profile-Id" not in client.get("/slow").headers
+    assert "X-Profile-Id" not in client.get("/slow", headers={"X-Profile": "guess"}).headers
+    assert list_profiles(str(tmp_path)) == []
+
+    sampled = profiling_app(tmp_path, token="", sample_rate=1.0)
+    response = sampled.get("/slow", headers={"X-Profile-Response": "wall"})
+    assert response.json() == {"done": True}
+    assert list_profiles(str(tmp_path))[0]["trigger"] == "sampled"
+
+def test_threads_and_greenlets_are_attributed_to_the_request(tmp_path):
+    client = profiling_app(tmp_path)
+    response = client.get("/offloaded", headers={"X-Profile": "secret", "X-Profile-Response": "cpu"})
+
+    spinning = stacks_with(response.text, "spin")
+    # In the executor thread and in the greenlet, under the route handler
+    assert any("greenlet_spawn" not in line for line in spinning)
+    assert any("greenlet_spawn" in line for line in spinning)
+    assert all(";profiling_app.<locals>.offloaded (" in line for line in spinning)
+
+def test_profiles_are_served_only_with_the_token(client, monkeypatch):
+    import profiler
+
+    assert client.get("/api/internal/profiles").status_code == 404
+    monkeypatch.setattr(profiler, "PROFILING_TOKEN", "secret")
+    assert client.get("/api/internal/profiles").status_code == 404
+    assert client.get("/api/internal/profiles", headers={"X-Profile": "guess"}).status_code == 404
+    assert client.get("/api/internal/profiles", headers={"X-Profile": "secret"}).status_code == 200
+    response = client.get("/api/internal/profiles/1-deadbeef/wall", headers={"X-Profile": "secret"})
+    assert response.status_code == 404
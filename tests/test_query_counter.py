@@ -0,0 +1,52 @@
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from query_counter import QueryCounterMiddleware, instrument_queries, statement_shape, track_queries
+
+def test_statement_shape_collapses_placeholder_lists():
+    assert statement_shape("SELECT * FROM t\n  WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?)"
+    assert statement_shape("SELECT * FROM t WHERE id IN (%(id_1)s, %(id_2)s)") == "SELECT * FROM t WHERE id IN (?)"
+    assert statement_shape("SELECT * FROM t WHERE id IN ($1, $2, $3)") == statement_shape("SELECT * FROM t WHERE id IN ($1)")
+
+def test_responses_carry_query_count(client, sample_recipes, max_queries):
+    recipe_id = sample_recipes[0].id
+    with max_queries(3) as statements:
+        response = client.get(f"/api/recipes/{recipe_id}")
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) == len(statements) > 0
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+def test_repeated_statements_are_logged(caplog):
+    engine = create_engine("sqlite://")
+    instrument_queries(engine)
+    app = FastAPI()
+
+    @app.get("/n-plus-one")
+    def n_plus_one():
+        # Sync route: runs in the threadpool, which must still be counted
+        with engine.connect() as conn:
+            for recipe_id in range(4):
+                conn.execute(text("SELECT :id"), {"id": recipe_id})
+        return {}
+
+    app.add_middleware(QueryCounterMiddleware, repeat_threshold=3)
+    with caplog.at_level(logging.WARNING, logger="query_counter"):
+        response = TestClient(app).get("/n-plus-one")
+
+    assert response.headers["X-DB-Queries"] == "4"
+    assert "Possible N+1: GET /n-plus-one ran the same statement 4 times: SELECT ?" in caplog.text
+
+def test_failed_statements_keep_timings_paired():
+    engine = create_engine("sqlite://")
+    instrument_queries(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        with track_queries() as stats:
+            conn.execute(text("SELECT 1"))
+        assert conn.info["query_started"] == []
+    assert stats.count == 1
@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime
 
 @pytest.fixture
 def test_recipe(authorized_client, test_user, session):
@@ -96,4 +97,533 @@ def test_delete_recipe(authorized_client, test_recipe):
 
 def test_delete_nonexistent_recipe(authorized_client):
     response = authorized_client.delete("/recipes/99999")
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404 
+
+def test_get_recipes_query_count_is_constant(client, max_queries, sample_recipes):
+    with max_queries(3) as small_page:
+        client.get("/api/recipes/?limit=2")
+    with max_queries(3) as large_page:
+        client.get("/api/recipes/?limit=12")
+    assert len(small_page) == len(large_page)
+
+def test_get_recipe_loads_relationships_eagerly(client, max_queries, sample_recipes):
+    recipe_id = sample_recipes[0].id
+    with max_queries(3):
+        client.get(f"/api/recipes/{recipe_id}")
+    data = client.get(f"/api/recipes/{recipe_id}").json()
+    assert len(data["ingredients"]) == 3
+    assert len(data["instructions"]) == 2
+    assert data["user"]["email"] == "chef@example.com"
+
+def test_get_recipes_cursor_pagination(client, sample_recipes):
+    expected = sorted(recipe.id for recipe in sample_recipes)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/recipes/", params=params)
+        assert response.status_code == 200
+        seen.extend(recipe["id"] for recipe in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == expected
+
+def test_get_recipes_skip_limit_still_supported(client, sample_recipes):
+    expected = [sample_recipes[10].id, sample_recipes[11].id]
+    response = client.get("/api/recipes/", params={"skip": 10, "limit": 5})
+    assert response.status_code == 200
+    assert [recipe["id"] for recipe in response.json()] == expected
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_recipes_limit_bounds(client, authorized_client, sample_recipes):
+    for path in ("/api/recipes/", "/api/ingredients/"):
+        response = client.get(path, params={"limit": 0})
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+    assert authorized_client.get("/api/recipes/my-recipes", params={"limit": 0}).json() == []
+    for params in ({"limit": -1}, {"limit": 1001}, {"skip": -1}):
+        assert client.get("/api/recipes/", params=params).status_code == 422
+        assert client.get("/api/ingredients/", params=params).status_code == 422
+        assert authorized_client.get("/api/favorites/", params=params).status_code == 422
+
+def test_get_recipes_invalid_cursor(client):
+    response = client.get("/api/recipes/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_search_recipes_ranks_matches(client, session, sample_recipes):
+    from models import Recipe
+    from search import refresh_search_document
+
+    title_match = session.get(Recipe, sample_recipes[3].id)
+    title_match.title = "Spicy Ramen"
+    notes_match = session.get(Recipe, sample_recipes[7].id)
+    notes_match.notes = "Serve with ramen noodles on the side"
+    expected = [title_match.id, notes_match.id]
+    session.flush()
+    refresh_search_document(session, title_match.id)
+    refresh_search_document(session, notes_match.id)
+    session.commit()
+
+    response = client.get("/api/recipes/search", params={"q": "ramen"})
+    assert response.status_code == 200
+    assert [recipe["id"] for recipe in response.json()] == expected
+
+def test_search_recipes_matches_instructions(client, sample_recipes):
+    response = client.get("/api/recipes/search", params={"q": "Step", "limit": 5})
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+def test_search_recipes_ignores_query_syntax(client, sample_recipes):
+    response = client.get("/api/recipes/search", params={"q": "\"* OR NEAR("})
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_what_can_i_cook_ranks_by_missing_ingredients(client, session, sample_recipes):
+    from models import Ingredient, RecipeIngredient
+
+    ingredient_ids = [ingredient.id for ingredient in session.query(Ingredient).order_by(Ingredient.id)]
+    extra = Ingredient(name="Saffron", unit="grams")
+    session.add(extra)
+    session.flush()
+    session.add(RecipeIngredient(recipe_id=sample_recipes[5].id, ingredient_id=extra.id, quantity=1))
+    makeable = [recipe.id for recipe in sample_recipes if recipe.id != sample_recipes[5].id]
+    session.commit()
+
+    response = client.get("/api/recipes/what-can-i-cook", params={"ingredient_ids": ingredient_ids, "limit": 20})
+    assert response.status_code == 200
+    data = response.json()
+    assert [match["recipe"]["id"] for match in data[:-1]] == makeable
+    assert data[-1]["missing_ingredient_ids"] == [extra.id]
+
+    response = client.get(
+        "/api/recipes/what-can-i-cook",
+        params={"ingredient_ids": ingredient_ids[:2], "max_missing": 0}
+    )
+    assert response.json() == []
+
+def test_pantry_index_tracks_recipe_writes(session):
+    from pantry import PantryIndex
+
+    index = PantryIndex()
+    index.load(session)
+    index.set_recipe(1, [10, 11])
+    index.set_recipe(2, [10])
+    assert index.match([10]) == [(2, []), (1, [11])]
+
+    index.set_recipe(1, [10])
+    assert index.match([10]) == [(1, []), (2, [])]
+
+    index.remove_recipe(2)
+    assert index.match([10]) == [(1, [])]
+
+@pytest.fixture
+def faceted_recipes(session, sample_recipes):
+    from models import Recipe, CategoryEnum
+
+    for recipe in session.query(Recipe).order_by(Recipe.id):
+        index = int(recipe.title.split()[-1])
+        recipe.category = CategoryEnum.BREAKFAST if index % 2 else CategoryEnum.DINNER
+        recipe.cuisine = "Italian" if index < 4 else "Mexican"
+        recipe.is_featured = index == 0
+    session.commit()
+
+def test_get_recipes_filters(client, faceted_recipes):
+    response = client.get("/api/recipes/", params={"category": "breakfast", "cuisine": "Italian"})
+    assert response.status_code == 200
+    assert [recipe["title"] for recipe in response.json()] == ["Recipe 1", "Recipe 3"]
+
+    response = client.get("/api/recipes/", params={"min_cooking_time": 15, "max_cooking_time": 16})
+    assert [recipe["title"] for recipe in response.json()] == ["Recipe 5", "Recipe 6"]
+
+def test_get_recipe_facets(client, faceted_recipes):
+    response = client.get("/api/recipes/facets", params={"cuisine": "Italian"})
+    assert response.status_code == 200
+    data = response.json()
+    # Other facets are narrowed by the cuisine filter, cuisine itself is not
+    assert data["category"] == [{"value": "breakfast", "count": 2}, {"value": "dinner", "count": 2}]
+    assert data["cuisine"] == [{"value": "Mexican", "count": 8}, {"value": "Italian", "count": 4}]
+    assert data["is_featured"] == [{"value": False, "count": 3}, {"value": True, "count": 1}]
+
+def test_get_recipe_conditional_get(client, session, sample_recipes):
+    from models import Recipe
+    from cache import recipe_cache
+
+    recipe_id = sample_recipes[0].id
+    response = client.get(f"/api/recipes/{recipe_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+
+    response = client.get(f"/api/recipes/{recipe_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(
+        f"/api/recipes/{recipe_id}",
+        headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    )
+    assert response.status_code == 304
+
+    recipe = session.get(Recipe, recipe_id)
+    recipe.title = "Renamed"
+    recipe.updated_at = datetime(2030, 1, 1)
+    session.commit()
+    recipe_cache.invalidate(recipe_id)
+    response = client.get(f"/api/recipes/{recipe_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_get_recipes_conditional_get(client, sample_recipes):
+    response = client.get("/api/recipes/", params={"limit": 5})
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/recipes/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert "X-Next-Cursor" in response.headers
+
+    response = client.get("/api/recipes/", params={"limit": 6}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 6
+
+def test_get_recipes_summary_view(client, max_queries, faceted_recipes):
+    with max_queries(1):
+        response = client.get("/api/recipes/", params={"view": "summary", "limit": 3})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 3
+    assert data[0]["title"] == "Recipe 0"
+    assert data[0]["author_name"] == "Chef"
+    assert data[0]["category"] == "dinner"
+    assert "ingredients" not in data[0]
+    assert "X-Next-Cursor" in response.headers
+
+def test_get_recipes_invalid_view(client):
+    response = client.get("/api/recipes/", params={"view": "compact"})
+    assert response.status_code == 422
+
+def test_import_recipes_ndjson(authorized_client, session, sample_recipes):
+    import json
+    from models import Ingredient, Recipe
+
+    ingredient_ids = [ingredient.id for ingredient in session.query(Ingredient).order_by(Ingredient.id)]
+    def recipe_line(title, ingredient_id=ingredient_ids[0], **extra):
+        return json.dumps({
+            "title": title,
+            "description": "Imported recipe",
+            "cooking_time": 20,
+            "servings": 2,
+            "category": "lunch",
+            "featured_image": "https://example.com/image.jpg",
+            "ingredients": [{"ingredient_id": ingredient_id, "quantity": 1}],
+            "instructions": [{"step_number": 1, "description": "Simmer the broth"}],
+            **extra
+        })
+
+    body = "\n".join([
+        recipe_line("Imported Pho"),
+        "{not json",
+        recipe_line("Imported Laksa"),
+        "",
+        recipe_line("Missing Ingredient", ingredient_id=9999),
+        recipe_line("Bad Category", category="brunch"),
+        recipe_line("Imported Ramen", ingredient_id=ingredient_ids[1]),
+        recipe_line("Same Ingredient Twice", ingredients=[
+            {"ingredient_id": ingredient_ids[0], "quantity": 1},
+            {"name": "Ingredient 0", "unit": "grams", "quantity": 2},
+        ]),
+    ])
+
+    response = authorized_client.post(
+        "/api/recipes/import", params={"batch_size": 2}, content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 3
+    assert report["failed"] == 4
+    assert [error["line"] for error in report["errors"]] == [2, 5, 6, 8]
+    assert report["errors"][-1]["errors"][0]["msg"] == \
+        f"Ingredients listed more than once: name 'Ingredient 0' repeats id {ingredient_ids[0]}"
+
+    imported = session.query(Recipe).filter(Recipe.title.like("Imported %")).order_by(Recipe.id).all()
+    assert [recipe.title for recipe in imported] == ["Imported Pho", "Imported Laksa", "Imported Ramen"]
+
+    response = authorized_client.get(f"/api/recipes/{imported[2].id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ingredients"][0]["ingredient"]["id"] == ingredient_ids[1]
+    assert data["instructions"][0]["description"] == "Simmer the broth"
+    assert data["category"] == "lunch"
+
+    response = authorized_client.get("/api/recipes/search", params={"q": "broth"})
+    assert [recipe["id"] for recipe in response.json()] == [recipe.id for recipe in imported]
+
+def test_export_recipes_ndjson(client, sample_recipes):
+    import json
+
+    response = client.get("/api/recipes/export", params={"batch_size": 5})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["id"] for record in records] == [recipe.id for recipe in sample_recipes]
+    assert [i["name"] for i in records[0]["ingredients"]] == ["Ingredient 0", "Ingredient 1", "Ingredient 2"]
+    assert [i["step_number"] for i in records[-1]["instructions"]] == [1, 2]
+
+def test_export_recipes_csv(client, session, sample_recipes):
+    import csv
+    import io
+    import json
+    from export import ExportFormat, write_export
+
+    response = client.get("/api/recipes/export", params={"format": "csv", "batch_size": 5})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == len(sample_recipes)
+    assert rows[0]["title"] == "Recipe 0"
+    assert len(json.loads(rows[0]["ingredients"])) == 3
+
+    # The offline dump writes the same bytes
+    out = io.StringIO()
+    write_export(session, ExportFormat.CSV, out, batch_size=5)
+    assert out.getvalue() == response.text
+
+def test_create_recipe_statement_count(authorized_client, max_queries, session, sample_recipes):
+    from models import Ingredient
+
+    ingredient_ids = [ingredient.id for ingredient in session.query(Ingredient).order_by(Ingredient.id)]
+    def create(ingredient_ids, steps):
+        response = authorized_client.post("/api/recipes/create", json={
+            "title": "Counted Recipe",
+            "description": "Description",
+            "cooking_time": 30,
+            "servings": 4,
+            "category": "dinner",
+            "ingredients": [
+                {"ingredient_id": i, "quantity": 1, "notes": "chopped" if n % 2 else None}
+                for n, i in enumerate(ingredient_ids)
+            ],
+            "instructions": [{"step_number": step, "description": f"Step {step}"} for step in range(1, steps + 1)],
+        })
+        assert response.status_code == 201
+        assert len(response.json()["ingredients"]) == len(ingredient_ids)
+
+    authorized_client.get("/api/users/me")  # resolve and cache the principal
+    # ingredient check, 3 inserts, 2 search-index writes, 3 loads
+    with max_queries(9) as small:
+        create(ingredient_ids[:1], 1)
+    with max_queries(9) as large:
+        create(ingredient_ids, 10)
+    assert len(small) == len(large) == 9
+
+def test_create_recipe_reports_all_missing_ingredients(authorized_client, session, sample_recipes):
+    from models import Ingredient
+
+    ingredient_id = session.query(Ingredient.id).first()[0]
+    response = authorized_client.post("/api/recipes/create", json={
+        "title": "Missing Ingredients",
+        "description": "Description",
+        "cooking_time": 30,
+        "servings": 4,
+        "ingredients": [
+            {"ingredient_id": ingredient_id, "quantity": 1},
+            {"ingredient_id": 9998, "quantity": 1},
+            {"ingredient_id": 9999, "quantity": 1},
+            {"name": "Saffron", "unit": "grams", "quantity": 1},
+        ],
+        "instructions": [],
+    })
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Ingredients not found: id 9998, id 9999, name 'Saffron'"
+
+def test_create_recipe_creates_missing_ingredients(authorized_client, session, sample_recipes):
+    from models import Ingredient
+
+    response = authorized_client.post("/api/recipes/create", params={"create_missing_ingredients": True}, json={
+        "title": "Saffron Rice",
+        "description": "Description",
+        "cooking_time": 30,
+        "servings": 4,
+        "ingredients": [
+            {"name": "Ingredient 0", "unit": "grams", "quantity": 1},
+            {"name": "Saffron", "unit": "pinches", "quantity": 1},
+        ],
+        "instructions": [],
+    })
+    assert response.status_code == 201
+    names = {i["ingredient"]["name"]: i["ingredient"]["unit"] for i in response.json()["ingredients"]}
+    assert names == {"Ingredient 0": "grams", "Saffron": "pinches"}
+    assert session.query(Ingredient).count() == 4
+
+@pytest.fixture
+def editable_recipe(authorized_client, session):
+    from models import Ingredient
+
+    session.add_all([Ingredient(name="Flour", unit="cups"), Ingredient(name="Salt", unit="grams")])
+    session.commit()
+    recipe_data = {
+        "title": "Bread",
+        "description": "Plain loaf",
+        "cooking_time": 40,
+        "servings": 4,
+        "ingredients": [{"ingredient_id": 1, "quantity": 3}, {"ingredient_id": 2, "quantity": 1, "notes": "fine"}],
+        "instructions": [{"step_number": step, "description": f"Step {step}"} for step in (1, 2, 3)]
+    }
+    response = authorized_client.post("/api/recipes/create", json=recipe_data)
+    assert response.status_code == 201
+    return recipe_data, response.json()
+
+def write_statements(statements):
+    return [statement for statement in statements
+            if statement.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE")]
+
+def test_put_unchanged_recipe_writes_nothing(authorized_client, max_queries, session, editable_recipe):
+    from models import Recipe
+
+    recipe_data, created = editable_recipe
+    session.get(Recipe, created["id"]).updated_at = datetime(2030, 1, 1)
+    session.commit()
+
+    with max_queries(10) as statements:
+        response = authorized_client.put(f"/api/recipes/{created['id']}", json=recipe_data)
+    assert response.status_code == 200
+    assert write_statements(statements) == []
+    assert response.json()["updated_at"].startswith("2030-01-01")
+
+def test_patch_recipe_diffs_children(authorized_client, max_queries, session, editable_recipe):
+    from models import Recipe
+
+    _, created = editable_recipe
+    session.get(Recipe, created["id"]).updated_at = datetime(2030, 1, 1)
+    session.commit()
+    step_ids = {step["step_number"]: step["id"] for step in created["instructions"]}
+
+    with max_queries(20) as statements:
+        response = authorized_client.patch(
+            f"/api/recipes/{created['id']}",
+            json={"instructions": [
+                {"step_number": 1, "description": "Step 1"},
+                {"step_number": 2, "description": "Knead well"},
+                {"step_number": 4, "description": "Cool"},
+            ]}
+        )
+    writes = write_statements(statements)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["title"] == "Bread"
+    assert len(data["ingredients"]) == 2
+    steps = {step["step_number"]: step for step in data["instructions"]}
+    assert sorted(steps) == [1, 2, 4]
+    assert steps[1]["id"] == step_ids[1]
+    assert steps[2]["id"] == step_ids[2]
+    assert steps[2]["description"] == "Knead well"
+    assert not data["updated_at"].startswith("2030-01-01")
+    # delete step 3, insert step 4, update step 2, bump the recipe, reindex
+    assert [w.split()[0].upper() for w in writes[:4]] == ["DELETE", "INSERT", "UPDATE", "UPDATE"]
+
+    response = authorized_client.patch(f"/api/recipes/{created['id']}", json={"servings": 6})
+    assert response.json()["servings"] == 6
+    assert response.json()["description"] == "Plain loaf"
+
+def test_patch_recipe_rejects_null_required_fields(authorized_client, editable_recipe):
+    _, created = editable_recipe
+    response = authorized_client.patch(f"/api/recipes/{created['id']}", json={"title": None})
+    assert response.status_code == 422
+
+def test_create_recipe_rejects_same_ingredient_by_id_and_name(authorized_client, session, sample_recipes):
+    from models import Ingredient
+
+    ingredient = session.query(Ingredient).filter(Ingredient.name == "Ingredient 0").one()
+    response = authorized_client.post("/api/recipes/create", json={
+        "title": "Twice",
+        "description": "Description",
+        "cooking_time": 30,
+        "servings": 4,
+        "ingredients": [
+            {"ingredient_id": ingredient.id, "quantity": 1},
+            {"name": "Ingredient 0", "unit": "grams", "quantity": 2},
+        ],
+        "instructions": [],
+    })
+    assert response.status_code == 422
+    assert response.json()["detail"] == f"Ingredients listed more than once: name 'Ingredient 0' repeats id {ingredient.id}"
+
+def test_update_recipe_rejects_same_ingredient_by_id_and_name(authorized_client, editable_recipe):
+    recipe_data, created = editable_recipe
+    ingredients = [{"ingredient_id": 1, "quantity": 3}, {"name": "Flour", "unit": "cups", "quantity": 5}]
+
+    response = authorized_client.patch(f"/api/recipes/{created['id']}", json={"ingredients": ingredients})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Ingredients listed more than once: name 'Flour' repeats id 1"
+    response = authorized_client.put(f"/api/recipes/{created['id']}", json={**recipe_data, "ingredients": ingredients})
+    assert response.status_code == 422
+
+    data = authorized_client.get(f"/api/recipes/{created['id']}").json()
+    assert sorted((i["ingredient"]["id"], i["quantity"]) for i in data["ingredients"]) == [(1, 3), (2, 1)]
+
+def test_import_reports_driver_errors_per_batch(authorized_client, session, sample_recipes, monkeypatch):
+    import json
+    import bulk_import
+    from asyncpg.exceptions import UniqueViolationError
+    from models import Ingredient
+
+    ingredient_id = session.query(Ingredient.id).first()[0]
+    insert_rows = bulk_import._insert_rows
+    calls = []
+
+    async def failing_first_copy(db, model, rows):
+        # What COPY raises on Postgres: an asyncpg error, not a SQLAlchemy one
+        calls.append(model)
+        if len(calls) == 1:
+            raise UniqueViolationError("duplicate key value violates unique constraint")
+        await insert_rows(db, model, rows)
+
+    monkeypatch.setattr(bulk_import, "_insert_rows", failing_first_copy)
+    body = "\n".join(json.dumps({
+        "title": f"Batch {n}", "description": "Imported", "cooking_time": 5, "servings": 1,
+        "ingredients": [{"ingredient_id": ingredient_id, "quantity": 1}], "instructions": [],
+    }) for n in range(4))
+    response = authorized_client.post(
+        "/api/recipes/import", params={"batch_size": 2}, content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 2
+    assert [error["line"] for error in report["errors"]] == [1, 2]
+
+def test_deletes_clear_search_and_pantry_indexes(authorized_client, session, sample_recipes):
+    from sqlalchemy import text
+    from models import Ingredient
+
+    ingredient_id = session.query(Ingredient.id).first()[0]
+    def create(title):
+        response = authorized_client.post("/api/recipes/create", json={
+            "title": title, "description": "Slow braise", "cooking_time": 30, "servings": 4,
+            "ingredients": [{"ingredient_id": ingredient_id, "quantity": 1}], "instructions": [],
+        })
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    def indexed(recipe_id):
+        in_search = session.execute(text("SELECT 1 FROM recipe_search WHERE rowid = :id"), {"id": recipe_id}).first()
+        response = authorized_client.get(
+            "/api/recipes/what-can-i-cook", params={"ingredient_ids": [ingredient_id], "limit": 100}
+        )
+        in_pantry = recipe_id in [match["recipe"]["id"] for match in response.json()]
+        return in_search is not None, in_pantry
+
+    kept, deleted = create("Braise One"), create("Braise Two")
+    assert indexed(kept) == indexed(deleted) == (True, True)
+
+    assert authorized_client.delete(f"/api/recipes/{deleted}").status_code == 204
+    assert indexed(deleted) == (False, False)
+
+    me = authorized_client.get("/api/users/me").json()
+    assert authorized_client.delete(f"/api/users/{me['id']}").status_code == 204
+    assert indexed(kept) == (False, False)
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+import hashlib
+import threading
+import time
+import os
+
+load_dotenv()
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TokenCache:
+    """Decoded JWT claims keyed by a digest of the token, kept until `exp`.
+
+    Also holds per-user revocation cutoffs: tokens issued (iat) before a
+    user's cutoff are rejected whether or not they are cached. Both live in
+    the worker's memory, so a revocation only applies to the worker that
+    handled it; the short token lifetime bounds the gap on the others.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()  # digest -> claims
+            self._revoked = {}             # user id -> (revoked_at, expires_at)
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None or claims["exp"] <= time.time():
+                if claims is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def set(self, token: str, claims: dict):
+        if self.max_entries <= 0 or "exp" not in claims:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke_user(self, user_id: int, token_lifetime: float):
+        """Reject every token issued to `user_id` up to now."""
+        now = time.time()
+        with self._lock:
+            self._revoked = {
+                revoked_id: entry for revoked_id, entry in self._revoked.items() if entry[1] > now
+            }
+            self._revoked[user_id] = (now, now + token_lifetime)
+            for key in [key for key, claims in self._entries.items() if claims.get("uid") == user_id]:
+                del self._entries[key]
+
+    def is_revoked(self, claims: dict) -> bool:
+        entry = self._revoked.get(claims.get("uid"))
+        return entry is not None and claims.get("iat", 0) <= entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "revoked_users": len(self._revoked),
+            }
+
+
+token_cache = TokenCache()
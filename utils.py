@@ -4,9 +4,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+from token_cache import token_cache
+from image_store import image_url, store_file
 import os
-from uuid import uuid4
-import shutil
+import time
 
 load_dotenv()
 
@@ -15,8 +16,10 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Stored hashes with a different cost are rehashed on the
+# next successful login (see hashing.PasswordHasher.verify_and_update).
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -27,46 +30,54 @@ def hash_pass(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Return (valid, new_hash); new_hash is set when the stored hash needs upgrading."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Sub-second iat so a token issued right after a revocation stays valid
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_token(token: str) -> dict:
+    # Tokens are reused for their whole lifetime, so the signature is only
+    # checked the first time a worker sees one
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise credentials_exception()
+        if payload.get("sub") is None:
+            raise credentials_exception()
+        token_cache.set(token, payload)
+    if token_cache.is_revoked(payload):
+        raise credentials_exception()
+    return payload
+
+def revoke_user_tokens(user_id: int):
+    """Invalidate every token issued to the user so far (password change, deletion)."""
+    token_cache.revoke_user(user_id, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return email
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    return decode_token(token)["sub"]
 
-def copy_sample_image(image_name: str) -> str:
-    """Copy a sample image from assets to uploads directory"""
-    UPLOAD_DIR = "uploads/recipes"
+def copy_sample_image(image_name: str, db) -> str:
+    """Store a sample image from assets in the image store; returns its URL"""
     ASSETS_DIR = "assets/sample_images"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    # Generate unique filename while keeping the extension
-    file_extension = os.path.splitext(image_name)[1].lower()
-    unique_filename = f"{uuid4()}{file_extension}"
-    
-    source_path = os.path.join(ASSETS_DIR, image_name)
-    destination_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    shutil.copy2(source_path, destination_path)
-    return destination_path
+    stored = store_file(db, os.path.join(ASSETS_DIR, image_name))
+    return image_url(stored.path)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# async so FastAPI resolves it on the event loop instead of a threadpool slot
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     return verify_token(token)
\ No newline at end of file